@@ -0,0 +1,185 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from main import (arith, column_values, compare, concat, filter_rows, get_rows_by_index, load_table, merge_tables,
+                  row_count, save_table, set_column_types, take_rows, to_columnar)
+
+# виды столбцов синтетической таблицы и их типы
+COLUMN_TYPES = {'int': int, 'float': float, 'datetime': 'datetime', 'str': str}
+
+# форматы файлов, для которых замеряются загрузка и сохранение
+FORMATS = ('csv', 'pkl', 'tbl')
+
+# допустимое замедление относительно базового прогона (0.2 - на 20%)
+DEFAULT_THRESHOLD = 0.2
+
+# синтетическая таблица: rows строк, столбцы видов columns, доля пропусков null_ratio
+# первый столбец - ключ (номер строки вперемешку), чтобы было по чему искать и сливать
+def generate_table(rows, columns=('int', 'float', 'datetime', 'str'), null_ratio=0.0, seed=0, columnar=False):
+    rnd = random.Random(seed)
+    keys = list(range(rows))
+    rnd.shuffle(keys)
+    cols = ['key']
+    types = {'key': int}
+    data = [keys]
+    start = datetime(2020, 1, 1)
+    for i, kind in enumerate(columns):
+        if kind not in COLUMN_TYPES:
+            raise Exception(f'Неизвестный вид столбца: {kind}')
+        name = f'{kind}{i}'
+        cols.append(name)
+        types[name] = COLUMN_TYPES[kind]
+        if kind == 'int':
+            vals = [rnd.randint(-10 ** 6, 10 ** 6) for _ in range(rows)]
+        elif kind == 'float':
+            vals = [round(rnd.uniform(-1000, 1000), 3) for _ in range(rows)]
+        elif kind == 'datetime':
+            vals = [start + timedelta(seconds=rnd.randrange(10 ** 8)) for _ in range(rows)]
+        else:
+            # строки с повторами, как в реальных данных (города, категории)
+            vals = [f'value{rnd.randrange(1000)}' for _ in range(rows)]
+        if null_ratio:
+            for j in range(rows):
+                if rnd.random() < null_ratio:
+                    vals[j] = None
+        data.append(vals)
+    t = {'cols': cols, 'types': types, 'rows': [list(r) for r in zip(*data)]}
+    return to_columnar(t) if columnar else t
+
+# замер операции: лучшее время из repeat запусков и пиковая память отдельного запуска под tracemalloc
+# setup() готовит аргументы заново для каждого запуска (операции могут менять таблицу)
+def measure(fn, setup, rows, repeat=3):
+    best = None
+    for _ in range(repeat):
+        args = setup()
+        t0 = time.perf_counter()
+        result = fn(*args)
+        elapsed = time.perf_counter() - t0
+        if result is None:
+            raise Exception('операция завершилась с ошибкой')
+        best = elapsed if best is None else min(best, elapsed)
+    args = setup()
+    tracemalloc.start()
+    try:
+        fn(*args)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {'seconds': best, 'rows_per_sec': rows / best if best else None, 'peak_bytes': peak}
+
+# копия таблицы для операций, меняющих её на месте
+def _copy(t):
+    return take_rows(t, range(row_count(t)))
+
+# набор замеров для одной таблицы (directory - папка для файлов загрузки и сохранения)
+def _cases(t, directory):
+    n = row_count(t)
+    cols = t['cols']
+    num = [c for c in cols[1:] if t['types'][c] in (int, float)]
+    first = num[0] if num else cols[0]
+    second = num[1] if len(num) > 1 else first
+    # сто ключей вразброс по таблице
+    keys = list(column_values(t, 0))[::max(n // 100, 1)]
+    mask = [i % 2 == 0 for i in range(n)]
+    other = take_rows(t, range(n - 1, -1, -1))
+    cases = {}
+    for fmt in FORMATS:
+        path = os.path.join(directory, f'bench.{fmt}')
+        save_table(t, path)
+        cases[f'load_table_{fmt}'] = (load_table, lambda path=path: (path,), n)
+        out = os.path.join(directory, f'out.{fmt}')
+        cases[f'save_table_{fmt}'] = (lambda t, f: save_table(t, f) or True, lambda out=out: (t, out), n)
+    cases['get_rows_by_index'] = (lambda t, keys: get_rows_by_index(t, *keys, column=0), lambda: (_copy(t), keys), n)
+    cases['set_column_types'] = (lambda t: set_column_types(t, {first: float}, by_number=False) or True,
+                                 lambda: (_copy(t),), n)
+    cases['arith'] = (lambda t: arith(t, first, second, 'add'), lambda: (t,), n)
+    cases['compare'] = (lambda t: compare(t, first, second, 'gr'), lambda: (t,), n)
+    cases['filter_rows'] = (lambda t: filter_rows(t, mask, copy_table=True), lambda: (t,), n)
+    cases['concat'] = (concat, lambda: (t, t), 2 * n)
+    cases['merge_tables_by_number'] = (lambda a, b: merge_tables(a, b, by_number=True), lambda: (t, other), 2 * n)
+    cases['merge_tables_by_index'] = (lambda a, b: merge_tables(a, b, by_number=False), lambda: (t, other), 2 * n)
+    return cases
+
+# прогон всех замеров для таблиц каждого размера из sizes
+def run_benchmarks(sizes=(10 ** 3, 10 ** 4, 10 ** 5), columns=('int', 'float', 'datetime', 'str'), null_ratio=0.1,
+                   repeat=3, seed=0, columnar=False, only=None):
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for n in sizes:
+            t = generate_table(n, columns, null_ratio, seed, columnar)
+            for name, (fn, setup, rows) in _cases(t, directory).items():
+                if only and name not in only:
+                    continue
+                key = f'{name}/{n}'
+                try:
+                    results[key] = measure(fn, setup, rows, repeat)
+                    r = results[key]
+                    print(f"{key:32} {r['seconds'] * 1000:10.2f} мс {r['rows_per_sec']:14.0f} строк/с "
+                          f"{r['peak_bytes'] / 2 ** 20:9.2f} МБ")
+                except Exception as e:
+                    print(f'{key}: ошибка: {e}')
+    return {
+        'meta': {'python': platform.python_version(), 'machine': platform.machine(), 'columns': list(columns),
+                 'null_ratio': null_ratio, 'repeat': repeat, 'seed': seed, 'columnar': columnar,
+                 'date': datetime.now().strftime('%Y-%m-%d %H:%M:%S')},
+        'results': results,
+    }
+
+# сохранение результатов в JSON
+def save_results(results, f):
+    with open(f, 'w', encoding='utf-8') as file:
+        json.dump(results, file, ensure_ascii=False, indent=2)
+
+# сравнение с базовым прогоном: список замеров, замедлившихся больше чем на threshold
+def compare_results(current, baseline, threshold=DEFAULT_THRESHOLD):
+    regressions = []
+    for k in ('columns', 'null_ratio', 'columnar'):
+        if current['meta'].get(k) != baseline['meta'].get(k):
+            print(f"внимание: {k} отличается от базового прогона ({baseline['meta'].get(k)} -> {current['meta'].get(k)})")
+    for key, r in current['results'].items():
+        base = baseline['results'].get(key)
+        if not base or not base['seconds']:
+            continue
+        ratio = r['seconds'] / base['seconds']
+        mem = r['peak_bytes'] / base['peak_bytes'] if base['peak_bytes'] else 1.0
+        mark = ' <- регрессия' if ratio > 1 + threshold else ''
+        print(f'{key:32} время x{ratio:.2f} память x{mem:.2f}{mark}')
+        if mark:
+            regressions.append(key)
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='замеры операций с таблицами lab3')
+    parser.add_argument('--rows', type=int, nargs='+', default=[10 ** 3, 10 ** 4, 10 ** 5],
+                        help='размеры таблиц (от 10^3 до 10^7)')
+    parser.add_argument('--columns', nargs='+', default=list(COLUMN_TYPES), choices=list(COLUMN_TYPES),
+                        help='виды столбцов')
+    parser.add_argument('--nulls', type=float, default=0.1, help='доля пропусков')
+    parser.add_argument('--repeat', type=int, default=3, help='число запусков каждой операции')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--columnar', action='store_true', help='хранение по столбцам')
+    parser.add_argument('--only', nargs='+', help='только указанные замеры')
+    parser.add_argument('--out', help='файл для результатов (JSON)')
+    parser.add_argument('--baseline', help='файл базового прогона для сравнения')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help='допустимое замедление')
+    args = parser.parse_args(argv)
+    results = run_benchmarks(args.rows, args.columns, args.nulls, args.repeat, args.seed, args.columnar, args.only)
+    if args.out:
+        save_results(results, args.out)
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as file:
+            baseline = json.load(file)
+        if compare_results(results, baseline, args.threshold):
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
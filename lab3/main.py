@@ -1,14 +1,785 @@
+import bz2
 import csv
+import gzip
+import hashlib
+import heapq
+import io
+import json
+import logging
+import lzma
+import math
+import mmap
+import operator
+import os
 import pickle
-from datetime import datetime
+import queue
+import struct
+import sys
+import tempfile
+import threading
+import time
+import weakref
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from functools import lru_cache, partial
+from itertools import chain, compress, islice, repeat
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# начало отсчёта для хранения дат в столбцах
+_EPOCH = datetime(1970, 1, 1)
+_US = timedelta(microseconds=1)
+
+# формат дат в файлах и размер кэша разобранных дат
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+DATETIME_CACHE_SIZE = 1 << 16
+
+# телеметрия операций: каждая операция отправляет событие (имя, строки на входе и выходе,
+# затронутые столбцы, время, байты чтения/записи) во все приёмники из SINKS;
+# таблицы и значения печатаются только в режиме отладки DEBUG
+DEBUG = False
+SINKS = []
+
+# приёмник, отбрасывающий события
+class NullSink:
+    def emit(self, event):
+        pass
+
+# приёмник, пишущий события в logging
+class LoggerSink:
+    def __init__(self, logger=None, level=logging.INFO):
+        self.logger = logger or logging.getLogger('lab3')
+        self.level = level
+
+    def emit(self, event):
+        self.logger.log(self.level, '%(op)s: %(rows_in)s -> %(rows_out)s строк, %(seconds).6f с, %(bytes)s байт', event)
+
+# приёмник, накапливающий счётчики по операциям
+class CounterSink:
+    def __init__(self):
+        self.counters = {}
+
+    def emit(self, event):
+        c = self.counters.get(event['op'])
+        if c is None:
+            c = self.counters[event['op']] = {'calls': 0, 'rows_in': 0, 'rows_out': 0, 'seconds': 0.0, 'bytes': 0}
+        c['calls'] += 1
+        c['rows_in'] += event['rows_in']
+        c['rows_out'] += event['rows_out']
+        c['seconds'] += event['seconds']
+        c['bytes'] += event['bytes']
+
+    def reset(self):
+        self.counters.clear()
+
+# приёмник, дописывающий события в файл по одному JSON на строку
+class JsonLinesSink:
+    def __init__(self, f):
+        self.file = open(f, 'a', encoding='utf-8') if isinstance(f, str) else f
+
+    def emit(self, event):
+        self.file.write(json.dumps(event, ensure_ascii=False) + '\n')
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+# настройка приёмников событий и режима отладки
+def set_telemetry(*sinks, debug=None):
+    SINKS[:] = sinks
+    if debug is not None:
+        global DEBUG
+        DEBUG = debug
+
+# отправка события операции (start - значение time.perf_counter() в начале операции)
+def _emit(op, start, rows_in=0, rows_out=0, columns=(), nbytes=0):
+    if not SINKS:
+        return
+    event = {'op': op, 'rows_in': rows_in, 'rows_out': rows_out, 'columns': list(columns),
+             'seconds': time.perf_counter() - start, 'bytes': nbytes}
+    for sink in SINKS:
+        sink.emit(event)
+
+# событие операции и печать её результата (только в режиме отладки)
+# fmt - шаблон str.format для shown: строка собирается только при печати, а не при каждом вызове
+def _report(op, start, rows_in, rows_out, columns, *shown, nbytes=0, fmt=None):
+    _emit(op, start, rows_in, rows_out, columns, nbytes)
+    if DEBUG:
+        if fmt is None:
+            print(*shown)
+        else:
+            print(fmt.format(*shown))
+
+# суммарный размер файлов (для байтов чтения/записи)
+def _files_size(files):
+    return sum(os.path.getsize(f) for f in files if os.path.exists(f))
+
+# вид хранения для типа столбца: 'q' - int64, 'd' - float64, 't' - дата (микросекунды от эпохи), 'o' - объекты
+def _kind_of(typ):
+    if typ == int:
+        return 'q'
+    if typ == float:
+        return 'd'
+    if typ == 'datetime':
+        return 't'
+    return 'o'
+
+# доля различных значений строкового столбца, при которой он хранится как словарь и коды
+DICT_ENCODE_RATIO = 0.5
+
+# типизированный столбец: компактный массив значений и битовая маска заполненности (None - пропусков нет)
+# вид 'c' - строки со словарём: categories - список различных строк, data - коды int32 (-1 - пропуск);
+# словарь упорядочен при построении, новые строки дописываются в конец (коды остальных не меняются),
+# порядок восстанавливается sort_categories там, где сравниваются коды
+class Column:
+    __slots__ = ('kind', 'data', 'valid', 'categories', 'lookup')
+
+    def __init__(self, kind, data, valid=None, categories=None):
+        self.kind = kind
+        self.data = data
+        self.valid = valid
+        self.categories = categories
+        self.lookup = None  # {строка: код} для записи; есть только у собственного (не общего) словаря
+
+    # построение столбца из уже сконвертированных значений (None - пропуск)
+    @classmethod
+    def from_values(cls, values, typ=None):
+        kind = _kind_of(typ)
+        if not isinstance(values, list):
+            values = list(values)
+        if kind == 'o':
+            return cls.from_strings(values) if typ == str else cls('o', values)
+        data = array('q' if kind == 't' else kind)
+        append = data.append
+        nulls = []
+        try:
+            for i, v in enumerate(values):
+                if v is None:
+                    nulls.append(i)
+                    append(0)
+                elif kind == 't':
+                    append((v - _EPOCH) // _US)
+                else:
+                    append(v)
+        except (OverflowError, TypeError, ValueError):
+            # значения не помещаются в массив (большие int, даты с часовым поясом и т.п.)
+            return cls('o', values)
+        return cls(kind, data, _bitmap(len(data), nulls))
+
+    # строковый столбец: со словарём, если различных значений не больше max_ratio от заполненных
+    @classmethod
+    def from_strings(cls, values, max_ratio=None):
+        max_ratio = DICT_ENCODE_RATIO if max_ratio is None else max_ratio
+        distinct = set(values)
+        distinct.discard(None)
+        filled = len(values) - values.count(None)
+        if not filled or len(distinct) > filled * max_ratio or not all(isinstance(v, str) for v in distinct):
+            return cls('o', values)
+        categories = sorted(distinct)
+        codes = {v: i for i, v in enumerate(categories)}
+        codes[None] = -1
+        return cls('c', array('i', map(codes.__getitem__, values)), None, categories)
+
+    # построение столбца из массива и списка позиций пропусков
+    @classmethod
+    def from_raw(cls, kind, data, nulls=()):
+        if kind == 'o':
+            return cls('o', data)
+        return cls(kind, data, _bitmap(len(data), nulls))
+
+    def __len__(self):
+        return len(self.data)
+
+    def __iter__(self):
+        if self.kind == 'o':
+            return iter(self.data)
+        if self.kind == 'c':
+            # код -1 попадает на последний элемент - None
+            return map((self.categories + [None]).__getitem__, self.data)
+        if self.valid is None:
+            if self.kind == 't':
+                return (_EPOCH + timedelta(microseconds=v) for v in self.data)
+            return iter(self.data)
+        return (self[i] for i in range(len(self.data)))
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return self.take(range(len(self.data))[i])
+        if self.kind == 'o':
+            return self.data[i]
+        if self.kind == 'c':
+            k = self.data[i]
+            return self.categories[k] if k >= 0 else None
+        if i < 0:
+            i += len(self.data)
+        v = self.data[i]
+        if self.valid is not None and not self.valid[i >> 3] >> (i & 7) & 1:
+            return None
+        if self.kind == 't':
+            return _EPOCH + timedelta(microseconds=v)
+        return v
+
+    def __setitem__(self, i, v):
+        self._make_writable()
+        if self.kind == 'o':
+            self.data[i] = v
+            return
+        if self.kind == 'c':
+            self._set_code(i, v)
+            return
+        if i < 0:
+            i += len(self.data)
+        if i < 0 or i >= len(self.data):
+            raise IndexError('номер строки вне диапазона')
+        if v is None:
+            if self.valid is None:
+                self.valid = _bitmap(len(self.data), ())
+            self.valid[i >> 3] &= ~(1 << (i & 7)) & 0xff
+            self.data[i] = 0
+            return
+        try:
+            self.data[i] = (v - _EPOCH) // _US if self.kind == 't' else v
+        except (OverflowError, TypeError, ValueError):
+            # значение не помещается в массив - переход к хранению объектов
+            values = list(self)
+            values[i] = v
+            self.kind, self.data, self.valid = 'o', values, None
+            return
+        if self.valid is not None:
+            self.valid[i >> 3] |= 1 << (i & 7)
+
+    def __repr__(self):
+        return f'Column({list(self)!r})'
+
+    # запись в столбец со словарём: новая строка дописывается в конец словаря
+    # (при первой записи словарь копируется - он может быть общим с другими столбцами)
+    def _set_code(self, i, v):
+        if v is None:
+            self.data[i] = -1
+            return
+        if not isinstance(v, str):
+            values = list(self)
+            values[i] = v
+            self.kind, self.data, self.categories, self.lookup = 'o', values, None, None
+            return
+        lookup = self.lookup
+        if lookup is None:
+            self.categories = list(self.categories)
+            lookup = self.lookup = {c: k for k, c in enumerate(self.categories)}
+        k = lookup.get(v)
+        if k is None:
+            k = lookup[v] = len(self.categories)
+            self.categories.append(v)
+        self.data[i] = k
+
+    # упорядочение словаря после дописанных строк: коды пересчитываются один раз за O(n)
+    def sort_categories(self):
+        cats = self.categories
+        if all(map(operator.lt, cats, cats[1:])):
+            return
+        categories = sorted(cats)
+        pos = {c: k for k, c in enumerate(categories)}
+        recode = [pos[c] for c in cats] + [-1]
+        self.data = array('i', map(recode.__getitem__, self.data))
+        self.categories = categories
+        self.lookup = None
+
+    # столбец из файла (.tbl) только для чтения: копирование в память перед первой записью
+    def _make_writable(self):
+        if self.kind == 'o':
+            if not isinstance(self.data, list):
+                self.data = list(self.data)
+            return
+        if self.kind == 'c' and not isinstance(self.categories, list):
+            self.categories = list(self.categories)
+        self.data = _as_array(self.data)
+        if self.valid is not None and not isinstance(self.valid, bytearray):
+            self.valid = bytearray(self.valid)
+
+    # при сериализации данные из файла копируются в память
+    def __reduce__(self):
+        if self.kind == 'o':
+            return Column, (self.kind, list(self.data))
+        if self.kind == 'c':
+            return Column, (self.kind, _as_array(self.data), None, list(self.categories))
+        valid = None if self.valid is None else bytearray(self.valid)
+        return Column, (self.kind, _as_array(self.data), valid)
+
+    # является ли значение в строке i заполненным
+    def is_valid(self, i):
+        if self.kind == 'o':
+            return self.data[i] is not None
+        if self.kind == 'c':
+            return self.data[i] >= 0
+        return self.valid is None or bool(self.valid[i >> 3] >> (i & 7) & 1)
+
+    # позиции пропусков
+    def null_positions(self):
+        if self.kind == 'o':
+            return [i for i, v in enumerate(self.data) if v is None]
+        if self.kind == 'c':
+            return [i for i, k in enumerate(self.data) if k < 0]
+        if self.valid is None:
+            return []
+        valid = self.valid
+        return [i for i in range(len(self.data)) if not valid[i >> 3] >> (i & 7) & 1]
+
+    # выборка строк по позициям (-1 - пустая строка)
+    def take(self, positions):
+        if self.kind == 'c':
+            src = self.data
+            if isinstance(positions, range) and positions.step == 1:
+                return Column('c', src[positions.start:positions.stop], None, self.categories)
+            return Column('c', array('i', [src[i] if i >= 0 else -1 for i in positions]), None, self.categories)
+        if isinstance(positions, range) and positions.step == 1:
+            if self.kind == 'o':
+                return Column('o', self.data[positions.start:positions.stop])
+            data = self.data[positions.start:positions.stop]
+            if self.valid is None:
+                return Column(self.kind, data)
+            valid = self.valid
+            nulls = [j for j, i in enumerate(positions) if not valid[i >> 3] >> (i & 7) & 1]
+            return Column.from_raw(self.kind, data, nulls)
+        src = self.data
+        if self.kind == 'o':
+            return Column('o', [src[i] if i >= 0 else None for i in positions])
+        data = array(_typecode(src), [src[i] if i >= 0 else 0 for i in positions])
+        valid = self.valid
+        if valid is None:
+            nulls = [j for j, i in enumerate(positions) if i < 0]
+        else:
+            nulls = [j for j, i in enumerate(positions) if i < 0 or not valid[i >> 3] >> (i & 7) & 1]
+        return Column.from_raw(self.kind, data, nulls)
+
+    # объединение двух столбцов
+    def concat(self, other):
+        if self.kind == 'c' and other.kind == 'c':
+            return Column.concat_all([self, other])
+        if self.kind != other.kind:
+            return Column('o', list(self) + list(other))
+        if self.kind == 'o':
+            return Column('o', list(self.data) + list(other.data))
+        data = self.data[:] if isinstance(self.data, array) else _as_array(self.data)
+        data.frombytes(memoryview(other.data).cast('B'))
+        if self.valid is None and other.valid is None:
+            return Column(self.kind, data)
+        n = len(self.data)
+        nulls = self.null_positions() + [n + i for i in other.null_positions()]
+        return Column.from_raw(self.kind, data, nulls)
+
+    # объединение нескольких столбцов за одно копирование
+    @staticmethod
+    def concat_all(columns):
+        if not columns:
+            return Column('o', [])
+        kind = columns[0].kind
+        if any(c.kind != kind for c in columns):
+            return Column('o', [v for c in columns for v in c])
+        if kind == 'o':
+            data = []
+            for c in columns:
+                data.extend(c.data)
+            return Column('o', data)
+        if kind == 'c':
+            categories, codes = _common_categories(columns)
+            data = array('i')
+            for c, recode in zip(columns, codes):
+                data.extend(c.data if recode is None else [recode[k] for k in c.data])
+            return Column('c', data, None, categories)
+        data = array(_typecode(columns[0].data))
+        nulls = []
+        for c in columns:
+            if c.valid is not None:
+                n = len(data)
+                nulls.extend(n + i for i in c.null_positions())
+            data.frombytes(memoryview(c.data).cast('B'))
+        return Column.from_raw(kind, data, nulls)
+
+    def copy(self):
+        if self.kind == 'o':
+            return Column('o', list(self.data))
+        if self.kind == 'c':
+            return Column('c', array('i', self.data), None, self.categories)
+        data = self.data[:] if isinstance(self.data, array) else _as_array(self.data)
+        return Column(self.kind, data, None if self.valid is None else bytearray(self.valid))
+
+    # объём данных столбца в байтах (для 'o' - только ссылки)
+    @property
+    def nbytes(self):
+        if self.kind == 'o':
+            return len(self.data) * 8
+        if self.kind == 'c':
+            return len(self.data) * 4 + sum(len(v) for v in self.categories) + len(self.categories) * 8
+        return len(self.data) * self.data.itemsize + (len(self.valid) if self.valid is not None else 0)
+
+# общий упорядоченный словарь для столбцов со словарями и перекодировка каждого
+# (None - коды столбца не меняются; код -1 остаётся пропуском)
+def _common_categories(columns):
+    first = columns[0].categories
+    if all(c.categories is first or c.categories == first for c in columns):
+        return first, [None] * len(columns)
+    categories = sorted(set().union(*[c.categories for c in columns]))
+    pos = {v: i for i, v in enumerate(categories)}
+    codes = []
+    for c in columns:
+        recode = [pos[v] for v in c.categories] + [-1]
+        codes.append(None if recode[:-1] == list(range(len(c.categories))) else recode)
+    return categories, codes
+
+# код типа элементов массива или memoryview
+def _typecode(data):
+    return data.typecode if isinstance(data, array) else data.format
+
+# массив из данных столбца (memoryview над файлом копируется)
+def _as_array(data):
+    if isinstance(data, array):
+        return data
+    a = array(data.format)
+    a.frombytes(memoryview(data).cast('B'))
+    return a
+
+# битовая маска заполненности длины n (None, если пропусков нет)
+def _bitmap(n, nulls):
+    if not nulls:
+        return None
+    valid = bytearray(b'\xff' * ((n + 7) // 8))
+    for i in nulls:
+        valid[i >> 3] &= ~(1 << (i & 7)) & 0xff
+    return valid
+
+# хранится ли таблица по столбцам
+def is_columnar(t):
+    return 'columns' in t
+
+# количество строк таблицы
+def row_count(t):
+    if is_view(t):
+        return len(t['sel'])
+    if is_chunked(t):
+        return sum(map(row_count, t['chunks']))
+    if is_columnar(t):
+        return len(t['columns'][0]) if t['columns'] else 0
+    return len(t['rows'])
+
+# значения столбца по номеру (список или Column)
+def column_values(t, idx):
+    if is_view(t):
+        base, sel = _view_base(t), t['sel']
+        if is_chunked(base):
+            return column_values(_chunk_part(base, sel), idx)
+        if is_columnar(base):
+            return base['columns'][idx].take(sel)
+        rows = base['rows']
+        return [rows[i][idx] for i in sel]
+    if is_chunked(t):
+        parts = [column_values(c, idx) for c in t['chunks']]
+        if parts and all(isinstance(p, Column) for p in parts):
+            return Column.concat_all(parts)
+        return list(chain.from_iterable(parts))
+    if is_columnar(t):
+        return t['columns'][idx]
+    return list(map(operator.itemgetter(idx), t['rows']))
+
+# перебор строк таблицы в виде списков
+def iter_rows(t):
+    if is_view(t):
+        base, sel = _view_base(t), t['sel']
+        if is_chunked(base):
+            return iter_rows(_chunk_part(base, sel))
+        if is_columnar(base):
+            return (list(r) for r in zip(*[c.take(sel) for c in base['columns']]))
+        rows = base['rows']
+        return (rows[i] for i in sel)
+    if is_chunked(t):
+        return chain.from_iterable(map(iter_rows, t['chunks']))
+    if is_columnar(t):
+        return (list(r) for r in zip(*t['columns']))
+    return iter(t['rows'])
+
+# выборка строк по позициям (-1 - строка из None) с сохранением способа хранения
+def take_rows(t, positions, copy_table=True):
+    if is_view(t):
+        base, sel = _view_base(t), t['sel']
+        if is_chunked(base):
+            return take_rows(_chunk_part(base, sel), positions, copy_table)
+        positions = [sel[i] if i >= 0 else -1 for i in positions]
+        t = base
+    elif is_chunked(t):
+        t = _unchunk(t)
+    cols = t['cols'][:] if copy_table else t['cols']
+    types = t['types'].copy() if copy_table else t['types']
+    if is_columnar(t):
+        return {'cols': cols, 'types': types, 'columns': [c.take(positions) for c in t['columns']]}
+    rows = t['rows']
+    width = len(t['cols'])
+    if copy_table:
+        new_rows = [rows[i][:] if i >= 0 else [None]*width for i in positions]
+    else:
+        new_rows = [rows[i] if i >= 0 else [None]*width for i in positions]
+    return {'cols': cols, 'types': types, 'rows': new_rows}
+
+# перевод таблицы в хранение по столбцам
+def to_columnar(t):
+    if is_view(t):
+        t = _unview(t)
+    if is_chunked(t):
+        t = _unchunk(t)
+    if is_columnar(t):
+        return t
+    cols = t['cols']
+    columns = [Column.from_values([r[i] for r in t['rows']], t['types'].get(c)) for i, c in enumerate(cols)]
+    return {'cols': cols, 'types': t['types'], 'columns': columns}
+
+# перевод таблицы в хранение по строкам
+def to_rows(t):
+    if is_view(t):
+        t = _unview(t)
+    if is_chunked(t):
+        t = _unchunk(t)
+    if not is_columnar(t):
+        return t
+    return {'cols': t['cols'], 'types': t['types'], 'rows': [list(r) for r in iter_rows(t)]}
+
+# представление: строки базовой таблицы t['base'] с номерами t['sel'] (range или array)
+# строки не копируются, изменения через представление попадают в базовую таблицу
+# номера действительны, пока строки базовой таблицы не удалены и не переставлены: у базовой таблицы есть счётчик
+# t['version'], который увеличивают такие изменения, и представление с другим номером версии не читается
+class TableView(dict):
+    # t['rows'] у представления (как у таблицы по строкам): список строк собирается при каждом обращении;
+    # у базовой таблицы по строкам это её же строки, и изменения в них попадают в базовую таблицу
+    def __missing__(self, key):
+        if key == 'rows':
+            return list(iter_rows(self))
+        raise KeyError(key)
+
+    def __repr__(self):
+        return f"TableView({len(self['sel'])} строк из {row_count(self['base'])}, столбцы: {self['cols']})"
+
+# является ли таблица представлением
+def is_view(t):
+    return 'sel' in t
+
+# представление строк sel таблицы t (для представления номера пересчитываются в номера базовой таблицы)
+# у таблицы из частей базовой остаётся сама таблица: представление читает её части,
+# а запись через него заменяет части таблицы собственной копией и попадает в неё
+def make_view(t, sel):
+    if not isinstance(sel, range) and not isinstance(sel, array):
+        sel = array('q', sel)
+    if is_view(t):
+        parent = t['sel']
+        if isinstance(sel, range):
+            sel = parent[sel.start:sel.stop:sel.step] if sel.step > 0 else array('q', [parent[i] for i in sel])
+        else:
+            sel = array('q', [parent[i] for i in sel])
+        t = _view_base(t)
+    version = t.setdefault('version', 0)
+    return TableView(cols=t['cols'], types=t['types'], base=t, sel=sel, version=version, size=row_count(t))
+
+# базовая таблица представления; ошибка, если её строки удалены или переставлены после создания представления
+def _view_base(t):
+    base = t['base']
+    if base.get('version') != t['version'] or row_count(base) != t['size']:
+        raise Exception('строки базовой таблицы представления изменились (удалены или переставлены), '
+                        'представление нужно создать заново')
+    return base
+
+# изменение набора или порядка строк таблицы на месте: представления таблицы становятся недействительными
+def _bump_version(t):
+    if 'version' in t:
+        t['version'] += 1
+
+# строки представления в способе хранения базовой таблицы (строки общие с базовой)
+def _unview(t):
+    base = _view_base(t)
+    if is_chunked(base):
+        return _chunk_part(base, t['sel'])
+    return take_rows(base, t['sel'], copy_table=False)
+
+# строки sel таблицы из частей: подряд идущие - таблица из общих частей, остальные - таблица с общими строками
+def _chunk_part(t, sel):
+    if isinstance(sel, range) and sel.step == 1:
+        return {'cols': t['cols'], 'types': t['types'], 'chunks': _slice_chunks(t['chunks'], sel.start, sel.stop)}
+    return take_rows(_unchunk(t), sel, copy_table=False)
+
+# независимая копия строк представления
+def materialize(t):
+    try:
+        started = time.perf_counter()
+        if not is_view(t):
+            return t
+        new_table = take_rows(_view_base(t), t['sel'])
+        _report('materialize', started, row_count(t), row_count(new_table), t['cols'], 'представление материализовано:', new_table)
+        return new_table
+    except Exception as e:
+        print('ошибка при материализации представления:', e)
+
+# таблица из частей: t['chunks'] - список неизменяемых частей (таблиц по строкам, по столбцам или представлений),
+# строки таблицы - строки частей подряд; concat связывает части, не копируя строки, представления таблицы
+# (split_table, get_rows_by_number) читают её части, а изменение таблицы (и запись через её представления)
+# сначала заменяет её части собственной копией
+# части меньше CHUNK_MIN_ROWS строк считаются мелкими; когда мелких частей в конце таблицы больше
+# CHUNK_MAX_SMALL, concat сливает их в одну (каждая строка переписывается не чаще раза на CHUNK_MAX_SMALL добавлений)
+CHUNK_MIN_ROWS = 65536
+CHUNK_MAX_SMALL = 16
+
+# блокировка подмены частей (фоновое уплотнение и изменения таблицы)
+_CHUNKS_LOCK = threading.Lock()
+
+# является ли таблица таблицей из частей
+def is_chunked(t):
+    return 'chunks' in t
+
+# таблица из частей с теми же строками, что у tables (copy_table=False - обычные таблицы становятся частями
+# без копирования и не должны меняться после этого)
+def make_chunked(*tables, copy_table=True):
+    if not tables:
+        raise Exception('нет таблиц для объединения')
+    cols = tables[0]['cols']
+    chunks = []
+    for t in tables:
+        if t['cols'] != cols:
+            raise Exception('Таблицы имеют разные колонки')
+        chunks.extend(_chunks_of(t, copy_table))
+    return {'cols': cols[:], 'types': tables[0]['types'].copy(), 'chunks': chunks}
+
+# части таблицы (обычная таблица - одна часть, пустые части отбрасываются)
+def _chunks_of(t, copy_table=True):
+    if is_view(t) and is_chunked(t['base']):
+        t = _unview(t)
+    if is_chunked(t):
+        return t['chunks']
+    if not row_count(t):
+        return []
+    return [take_rows(t, range(row_count(t))) if copy_table else t]
+
+# части, покрывающие строки start..stop: целые части общие, крайние - представления своих частей
+def _slice_chunks(chunks, start, stop):
+    result = []
+    base = 0
+    for c in chunks:
+        n = row_count(c)
+        lo, hi = max(start - base, 0), min(stop - base, n)
+        if lo < hi:
+            result.append(c if lo == 0 and hi == n else make_view(c, range(lo, hi)))
+        base += n
+        if base >= stop:
+            break
+    return result
+
+# хранится ли часть (или базовая таблица представления) по столбцам
+def _columnar_chunk(c):
+    return is_columnar(c['base'] if is_view(c) else c)
+
+# части одной таблицей (строки по строкам общие с частями, столбцы собираются заново)
+def _unchunk(t):
+    chunks = t['chunks']
+    cols = t['cols']
+    if chunks and all(map(_columnar_chunk, chunks)):
+        columns = [Column.concat_all([column_values(c, i) for c in chunks]) for i in range(len(cols))]
+        return {'cols': cols, 'types': t['types'], 'columns': columns}
+    if len(chunks) == 1 and not is_view(chunks[0]):
+        return {'cols': cols, 'types': t['types'], 'rows': chunks[0]['rows']}
+    return {'cols': cols, 'types': t['types'], 'rows': list(chain.from_iterable(map(iter_rows, chunks)))}
+
+# замена частей таблицы одной собственной копией перед изменением на месте; возвращает эту копию
+# (названия и типы столбцов у копии общие с таблицей)
+def _own_chunks(t):
+    with _CHUNKS_LOCK:
+        own = take_rows(_unchunk(t), range(row_count(t)))
+        own['cols'] = t['cols']
+        own['types'] = t['types']
+        t['chunks'] = [own]
+    return own
+
+# уплотнение: подряд идущие мелкие части (меньше min_rows строк) сливаются в части не меньше min_rows строк
+def _compacted(chunks, cols, types, min_rows):
+    result = []
+    run = []
+    size = 0
+    for c in chunks:
+        n = row_count(c)
+        if n >= min_rows:
+            result.extend(run if len(run) < 2 else [_unchunk({'cols': cols, 'types': types, 'chunks': run})])
+            result.append(c)
+            run, size = [], 0
+            continue
+        run.append(c)
+        size += n
+        if size >= min_rows:
+            result.append(_unchunk({'cols': cols, 'types': types, 'chunks': run}) if len(run) > 1 else c)
+            run, size = [], 0
+    result.extend(run if len(run) < 2 else [_unchunk({'cols': cols, 'types': types, 'chunks': run})])
+    return result
+
+# уплотнение таблицы из частей
+# background=True - уплотнение в фоновом потоке (возвращается поток); части подменяются,
+# только если таблицу не изменили, пока шло уплотнение
+def compact(t, min_rows=None, background=False):
+    try:
+        started = time.perf_counter()
+        if not is_chunked(t):
+            raise Exception('таблица не состоит из частей')
+        min_rows = min_rows or CHUNK_MIN_ROWS
+        chunks = t['chunks']
+
+        def run():
+            new = _compacted(chunks, t['cols'], t['types'], min_rows)
+            with _CHUNKS_LOCK:
+                if t['chunks'] is chunks:
+                    t['chunks'] = new
+            _report('compact', started, row_count(t), row_count(t), t['cols'],
+                    f'части уплотнены: {len(chunks)} -> {len(t["chunks"])}')
+
+        if background:
+            thread = threading.Thread(target=run, daemon=True)
+            thread.start()
+            return thread
+        run()
+        return t
+    except Exception as e:
+        print('ошибка при уплотнении таблицы:', e)
+
+# слияние мелких частей в конце таблицы, если их накопилось больше CHUNK_MAX_SMALL
+def _compact_tail(t):
+    chunks = t['chunks']
+    i = len(chunks)
+    while i and row_count(chunks[i - 1]) < CHUNK_MIN_ROWS:
+        i -= 1
+    if len(chunks) - i > CHUNK_MAX_SMALL:
+        t['chunks'] = chunks[:i] + _compacted(chunks[i:], t['cols'], t['types'], CHUNK_MIN_ROWS)
 
 # загрузка таблицы из файлов
-def load_table(*files, auto_detect=True):
+# parallel=True - разбор и конвертация файлов в пуле из workers процессов;
+# chunk_bytes - дополнительно делить большие csv на части такого размера (поля не должны содержать переводов строк)
+# zones=True - сразу приложить карты зон для столбцов чисел и дат (из файла .tbl/.pkl, если сохранены, иначе строятся);
+# без этого карта строится при первом сравнении столбца с константой (для таблиц от ZONE_MIN_ROWS строк)
+def load_table(*files, auto_detect=True, columnar=False, parallel=False, workers=None, chunk_bytes=None, zones=False):
+    started = time.perf_counter()
+    if files and all(_file_format(f) == '.tbl' for f in files):
+        t, saved = _load_tbl_files(files, columnar)
+        if zones:
+            _attach_zones(t, saved)
+        _report('load_table', started, 0, row_count(t), t['cols'], 'загружено:', t, nbytes=_files_size(files))
+        return t
+    if parallel:
+        t = _load_parallel(files, auto_detect, columnar, workers, chunk_bytes)
+        if zones:
+            _attach_zones(t)
+        _report('load_table', started, 0, row_count(t), t['cols'], 'загружено:', t, nbytes=_files_size(files))
+        return t
     t = {'cols': [], 'types': {}, 'rows': []}
+    # готовые карты зон (только если таблица взята из одного файла)
+    saved = None
     for f in files:
         try:
-            if f.endswith('.csv'):
-                with open(f, 'r', encoding='utf-8') as file:
+            if _file_format(f) == '.csv':
+                with open_file(f, 'r') as file:
                     reader = csv.reader(file)
                     cols = next(reader)
                     if not t['cols']:
@@ -17,15 +788,31 @@ def load_table(*files, auto_detect=True):
                         raise Exception(f'Файл {f} имеет разные колонки')
                     for row in reader:
                         t['rows'].append(row)
-            elif f.endswith('.pkl'):
-                with open(f, 'rb') as file:
-                    data = pickle.load(file)
-                    if not t['cols']:
-                        t = data
-                    else:
-                        if t['cols'] != data['cols']:
-                            raise Exception(f'Файл {f} имеет разные колонки')
-                        t['rows'].extend(data['rows'])
+            elif _file_format(f) == '.pkl':
+                data = _load_pkl(f)
+                data.pop('indexes', None)
+                found = {int(k): ZoneMap.load(v) for k, v in data.pop('zones', {}).items()}
+                data = to_rows(data)
+                if not t['cols']:
+                    t = data
+                    saved = found
+                else:
+                    if t['cols'] != data['cols']:
+                        raise Exception(f'Файл {f} имеет разные колонки')
+                    t['rows'].extend(data['rows'])
+                    saved = None
+            elif _file_format(f) == '.tbl':
+                data = open_table(f)
+                found = _saved_zones(data)
+                data = to_rows(data)
+                if not t['cols']:
+                    t = data
+                    saved = found
+                else:
+                    if t['cols'] != data['cols']:
+                        raise Exception(f'Файл {f} имеет разные колонки')
+                    t['rows'].extend(data['rows'])
+                    saved = None
             else:
                 raise Exception(f'Неподдерживаемый формат файла: {f}')
         except FileNotFoundError:
@@ -33,104 +820,1059 @@ def load_table(*files, auto_detect=True):
         except Exception as e:
             print(f'Ошибка при загрузке {f}: {e}')
     if auto_detect:
-        for c in t['cols']:
-            idx = t['cols'].index(c)
-            vals = [row[idx] for row in t['rows'] if row[idx] != '']
-            t['types'][c] = auto_type(vals)
-        t['rows'] = [convert_row(r, t['cols'], t['types']) for r in t['rows']]
-    print('загружено:', t)
+        # определение типа и конвертация за один проход по каждому столбцу
+        columns = []
+        for idx, c in enumerate(t['cols']):
+            typ, vals = parse_column([r[idx] if idx < len(r) else '' for r in t['rows']])
+            t['types'][c] = typ
+            if columnar:
+                columns.append(Column.from_values(vals, typ))
+            else:
+                columns.append(_shared_strings(vals) if typ == str else vals)
+        if columnar:
+            t = {'cols': t['cols'], 'types': t['types'], 'columns': columns}
+        else:
+            t['rows'] = [list(r) for r in zip(*columns)] if columns else []
+    if columnar:
+        t = to_columnar(t)
+    if zones:
+        _attach_zones(t, saved)
+    _report('load_table', started, 0, row_count(t), t['cols'], 'загружено:', t, nbytes=_files_size(files))
     return t
 
+# параллельная загрузка: каждый файл (или часть большого csv) разбирается в отдельном процессе,
+# типы частей объединяются, части склеиваются в исходном порядке
+def _load_parallel(files, auto_detect, columnar, workers, chunk_bytes):
+    tasks = []
+    for f in files:
+        try:
+            # сжатые файлы не делятся на части (в них нельзя перейти к смещению)
+            if chunk_bytes and f.endswith('.csv'):
+                tasks.extend((f, a, b) for a, b in _csv_ranges(f, chunk_bytes))
+            else:
+                tasks.append((f, None, None))
+        except FileNotFoundError:
+            print(f'Файл {f} не найден')
+    parts = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_load_part, f, a, b, auto_detect, columnar) for f, a, b in tasks]
+        cols = None
+        for (f, a, b), fut in zip(tasks, futures):
+            try:
+                part = fut.result()
+                if cols is None:
+                    cols = part['cols']
+                elif cols != part['cols']:
+                    raise Exception(f'Файл {f} имеет разные колонки')
+                parts.append(((f, a, b), part))
+            except FileNotFoundError:
+                print(f'Файл {f} не найден')
+            except Exception as e:
+                print(f'Ошибка при загрузке {f}: {e}')
+        if cols is None:
+            return {'cols': [], 'types': {}, 'rows': []}
+        types = {}
+        if auto_detect:
+            for c in cols:
+                typ = None
+                for _, part in parts:
+                    pt = part['types'][c]
+                    if pt is not None:
+                        typ = pt if typ is None else widen_type(typ, pt)
+                types[c] = typ or int
+            # части, где значения приходится превращать в строки, перечитываются с общими типами
+            redo = [i for i, (_, part) in enumerate(parts)
+                    if any(types[c] == str and part['types'][c] not in (None, str) for c in cols)]
+            futures = {i: pool.submit(_load_part, *parts[i][0], auto_detect, columnar, types) for i in redo}
+            for i, fut in futures.items():
+                parts[i] = (parts[i][0], fut.result())
+    columns = []
+    for idx, c in enumerate(cols):
+        pieces = [_cast_part(part['columns'][idx], part['types'].get(c), types.get(c), columnar) for _, part in parts]
+        if columnar:
+            columns.append(Column.concat_all(pieces))
+        else:
+            vals = []
+            for piece in pieces:
+                vals.extend(piece)
+            columns.append(vals)
+    if columnar:
+        return {'cols': cols, 'types': types, 'columns': columns}
+    return {'cols': cols, 'types': types, 'rows': [list(r) for r in zip(*columns)] if columns else []}
+
+# границы частей csv-файла (после заголовка) по chunk_bytes байт, выровненные по концу строки
+def _csv_ranges(f, chunk_bytes):
+    with open(f, 'rb') as file:
+        file.readline()
+        pos = file.tell()
+        size = os.fstat(file.fileno()).st_size
+        ranges = []
+        while pos < size:
+            file.seek(min(pos + chunk_bytes, size))
+            file.readline()
+            end = min(file.tell(), size)
+            ranges.append((pos, end))
+            pos = end
+    return ranges or [(pos, pos)]
+
+# разбор одного файла или части csv (start..end в байтах) в процессе пула
+# types - заранее известные типы (при повторном чтении); тип None - в части нет значений
+def _load_part(f, start=None, end=None, auto_detect=True, columnar=False, types=None):
+    if _file_format(f) == '.csv':
+        if start is None:
+            with open_file(f, 'r') as file:
+                reader = csv.reader(file)
+                cols = next(reader)
+                rows = list(reader)
+        else:
+            with open(f, 'rb') as file:
+                cols = next(csv.reader([file.readline().decode('utf-8')]))
+                file.seek(start)
+                data = file.read(end - start)
+            rows = list(csv.reader(io.StringIO(data.decode('utf-8'), newline='')))
+    elif _file_format(f) in ('.pkl', '.tbl'):
+        if _file_format(f) == '.tbl':
+            data = to_rows(open_table(f))
+        else:
+            data = to_rows(_load_pkl(f))
+        cols = data['cols']
+        rows = data['rows']
+    else:
+        raise Exception(f'Неподдерживаемый формат файла: {f}')
+    part_types = {}
+    columns = []
+    for idx, c in enumerate(cols):
+        raw = [r[idx] if idx < len(r) else '' for r in rows]
+        if not auto_detect:
+            columns.append(raw)
+            continue
+        if types is not None:
+            typ = types[c]
+            vals = _parse_strict(raw, typ)
+        else:
+            typ, vals = parse_column(raw)
+            if all(v is None for v in vals):
+                typ = None
+        part_types[c] = typ
+        columns.append(Column.from_values(vals, typ) if columnar else vals)
+    return {'cols': cols, 'types': part_types, 'columns': columns}
+
+# приведение значений части к общему типу столбца (расширение int -> float, пустые части)
+def _cast_part(values, from_type, to_type, columnar):
+    if from_type == to_type or to_type is None:
+        return values
+    if from_type is not None and to_type == float:
+        values = [float(v) if v is not None else None for v in values]
+    return Column.from_values(values, to_type) if columnar else list(values)
+
 # определение типа
 def auto_type(vals):
-    for typ in [int, float]:
-        try:
-            [typ(v) for v in vals]
-            return typ
-        except:
+    return parse_column(vals)[0]
+
+# повторяющиеся строки столбца заменяются одним объектом (хранение по строкам)
+def _shared_strings(vals, max_ratio=None):
+    max_ratio = DICT_ENCODE_RATIO if max_ratio is None else max_ratio
+    seen = {}
+    shared = [seen.setdefault(v, v) for v in vals]
+    if len(seen) > len(vals) * max_ratio:
+        return vals
+    return shared
+
+# определение типа столбца и конвертация значений за один проход ('' - пропуск)
+# тип расширяется по ходу чтения: int -> float -> datetime -> str
+def parse_column(vals):
+    typ = int
+    new = []
+    append = new.append
+    for v in vals:
+        if v == '' or v is None:
+            append(None)
             continue
-    try:
-        [datetime.strptime(v, '%Y-%m-%d %H:%M:%S') for v in vals]
-        return 'datetime'
-    except:
-        return str
+        if typ is int:
+            try:
+                append(_int_value(v))
+                continue
+            except (ValueError, TypeError):
+                typ = float
+                new = [float(x) if x is not None else None for x in new]
+                append = new.append
+        if typ is float:
+            try:
+                append(float(v))
+                continue
+            except (ValueError, TypeError):
+                # числа не могут быть датами: если числа уже были, столбец строковый
+                if any(x is not None for x in new):
+                    break
+                typ = 'datetime'
+        try:
+            append(parse_datetime(v))
+        except (ValueError, TypeError):
+            break
+    else:
+        return typ, new
+    return str, [v if v != '' else None for v in vals]
+
+# целое значение (дробные числа из pkl не обрезаются)
+def _int_value(v):
+    if isinstance(v, float):
+        raise ValueError(v)
+    return int(v)
+
+# разбор даты: быстрый путь для формата '%Y-%m-%d %H:%M:%S' и кэш повторяющихся строк
+@lru_cache(maxsize=DATETIME_CACHE_SIZE)
+def parse_datetime(v):
+    if isinstance(v, datetime):
+        return v
+    if (len(v) == 19 and v[4] == '-' and v[7] == '-' and v[10] == ' ' and v[13] == ':' and v[16] == ':'
+            and (v[:4] + v[5:7] + v[8:10] + v[11:13] + v[14:16] + v[17:]).isdigit()):
+        return datetime(int(v[:4]), int(v[5:7]), int(v[8:10]), int(v[11:13]), int(v[14:16]), int(v[17:]))
+    return datetime.strptime(v, DATETIME_FORMAT)
 
 # конвертация строки
 def convert_row(row, cols, types):
     new = []
-    for i, v in enumerate(row):
-        c = cols[i]
-        typ = types[c]
+    for v, fn in zip(row, _row_converters(tuple(cols), tuple(types.get(c) for c in cols))):
         if v == '':
             new.append(None)
             continue
         try:
-            if typ == int:
-                new.append(int(v))
-            elif typ == float:
-                new.append(float(v))
-            elif typ == 'datetime':
-                new.append(datetime.strptime(v, '%Y-%m-%d %H:%M:%S'))
-            else:
-                new.append(v)
-        except:
+            new.append(fn(v))
+        except (ValueError, TypeError, OverflowError):
             new.append(None)
     return new
 
-# сохранение таблицы в файлы
-def save_table(t, *files, max_rows=None):
+# преобразователи для строки таблицы (строится один раз для набора столбцов)
+@lru_cache(maxsize=64)
+def _row_converters(cols, types):
+    return [_converter(typ) if typ in (int, float, 'datetime') else _keep for typ in types]
+
+def _keep(v):
+    return v
+
+# потоковая загрузка таблиц частями по chunk_size строк
+# типы определяются по первым sample_size строкам и расширяются, если следующие части в них не помещаются;
+# .pkl хранит таблицу целиком, поэтому такой файл читается полностью и отдаётся частями
+def load_table_iter(*files, chunk_size=100000, sample_size=1000, auto_detect=True, columnar=False):
+    if chunk_size < 1:
+        raise ValueError('размер части должен быть положительным')
+    cols = []
+    types = {}
+    for f in files:
+        try:
+            if _file_format(f) == '.csv':
+                with open_file(f, 'r') as file:
+                    reader = csv.reader(file)
+                    file_cols = next(reader)
+                    if not cols:
+                        cols = file_cols
+                    elif cols != file_cols:
+                        raise Exception(f'Файл {f} имеет разные колонки')
+                    if auto_detect and not types:
+                        # определение типов по ограниченной выборке
+                        sample = list(islice(reader, max(sample_size, 1)))
+                        for i, c in enumerate(cols):
+                            types[c] = auto_type([r[i] for r in sample if i < len(r)])
+                        pending = sample
+                    else:
+                        pending = []
+                    while True:
+                        if len(pending) < chunk_size:
+                            pending.extend(islice(reader, chunk_size - len(pending)))
+                        if not pending:
+                            break
+                        chunk, pending = pending[:chunk_size], pending[chunk_size:]
+                        yield _typed_chunk(chunk, cols, types, auto_detect, columnar)
+            elif _file_format(f) == '.pkl':
+                data = _load_pkl(f)
+                if not cols:
+                    cols = data['cols']
+                elif cols != data['cols']:
+                    raise Exception(f'Файл {f} имеет разные колонки')
+                for c, typ in data['types'].items():
+                    types[c] = widen_type(types[c], typ) if c in types else typ
+                n = row_count(data)
+                for start in range(0, n, chunk_size):
+                    chunk = take_rows(data, range(start, min(start + chunk_size, n)), copy_table=False)
+                    yield to_columnar(chunk) if columnar else to_rows(chunk)
+                del data
+            elif _file_format(f) == '.tbl':
+                # файл отображается в память, читаются только байты очередной части
+                data = open_table(f)
+                if not cols:
+                    cols = data['cols']
+                elif cols != data['cols']:
+                    raise Exception(f'Файл {f} имеет разные колонки')
+                for c, typ in data['types'].items():
+                    types[c] = widen_type(types[c], typ) if c in types else typ
+                n = row_count(data)
+                for start in range(0, n, chunk_size):
+                    chunk = take_rows(data, range(start, min(start + chunk_size, n)), copy_table=False)
+                    yield chunk if columnar else to_rows(chunk)
+                del data
+            else:
+                raise Exception(f'Неподдерживаемый формат файла: {f}')
+        except FileNotFoundError:
+            print(f'Файл {f} не найден')
+        except Exception as e:
+            print(f'Ошибка при загрузке {f}: {e}')
+
+# конвертация части строк из csv с расширением типов, если значения в них не помещаются
+def _typed_chunk(rows, cols, types, auto_detect=True, columnar=False):
+    columns = []
+    for i, c in enumerate(cols):
+        raw = [r[i] if i < len(r) else '' for r in rows]
+        if not auto_detect:
+            columns.append(raw)
+            continue
+        try:
+            vals = _parse_strict(raw, types[c])
+        except (ValueError, TypeError):
+            typ, vals = parse_column(raw)
+            types[c] = widen_type(types[c], typ)
+            if types[c] != typ:
+                vals = _parse_strict(raw, types[c])
+        columns.append(vals)
+    chunk_types = types.copy()
+    if columnar:
+        return {'cols': cols[:], 'types': chunk_types,
+                'columns': [Column.from_values(v, chunk_types.get(c)) for v, c in zip(columns, cols)]}
+    return {'cols': cols[:], 'types': chunk_types, 'rows': [list(r) for r in zip(*columns)]}
+
+# строгая конвертация значений столбца (ошибка, если значение не подходит к типу)
+def _parse_strict(raw, typ):
+    if typ not in (int, float, 'datetime'):
+        return [v if v != '' else None for v in raw]
+    conv = _converter(typ)
+    return [conv(v) if v != '' else None for v in raw]
+
+# расширение типа столбца до типа, в который помещаются оба
+def widen_type(a, b):
+    if a == b:
+        return a
+    if a in (int, float) and b in (int, float):
+        return float
+    return str
+
+# бинарный формат .tbl: метка, блоки столбцов фиксированной ширины (выровнены по 8 байт),
+# заголовок JSON со схемой и расположением блоков и хвост (длина заголовка, crc32, метка)
+TBL_MAGIC = b'TBL1\0\0\0\0'
+_TBL_TRAILER = struct.Struct('<QI4s')
+_TBL_END = b'TBLF'
+_TYPE_NAMES = {int: 'int', float: 'float', str: 'str', 'datetime': 'datetime', 'bool': 'bool'}
+_TYPE_BY_NAME = {v: k for k, v in _TYPE_NAMES.items()}
+
+# строки столбца из файла .tbl: декодируются только при обращении
+class StrData:
+    __slots__ = ('blob', 'offsets', 'valid', 'base')
+
+    def __init__(self, blob, offsets, valid=None, base=0):
+        self.blob = blob
+        self.offsets = offsets
+        self.valid = valid
+        self.base = base
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        n = len(self.offsets) - 1
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError('номер строки вне диапазона')
+        if self.valid is not None:
+            j = self.base + i
+            if not self.valid[j >> 3] >> (j & 7) & 1:
+                return None
+        return str(self.blob[self.offsets[i]:self.offsets[i + 1]], 'utf-8')
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+# открытие файла .tbl без чтения данных: столбцы ссылаются на отображённый в память файл
+# columns - имена или номера нужных столбцов, start/stop - диапазон строк
+def open_table(f, columns=None, start=0, stop=None):
+    if os.path.splitext(f)[1] in _COMPRESSORS:
+        raise Exception(f'файлы .tbl не сжимаются (читаются через отображение в память): {f}')
+    with open(f, 'rb') as file:
+        mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    header = _read_tbl_header(mm)
+    cols = header['cols']
+    if columns is None:
+        idxs = range(len(cols))
+    else:
+        idxs = [c if isinstance(c, int) else cols.index(c) for c in columns]
+    swap = header.get('byteorder', sys.byteorder) != sys.byteorder
+    segments = header['segments']
+    rows = range(sum(seg['rows'] for seg in segments))[start:stop]
+    types = {cols[i]: _TYPE_BY_NAME.get(header['types'][i], str) for i in idxs}
+    columns_out = []
+    for idx in idxs:
+        col = None
+        base = 0
+        for seg in segments:
+            lo = max(rows.start - base, 0)
+            hi = min(rows.stop - base, seg['rows'])
+            if lo < hi:
+                part = _tbl_column(mm, seg['columns'][idx], lo, hi, swap)
+                col = part if col is None else col.concat(part)
+            base += seg['rows']
+        if col is None:
+            col = Column.from_values([], types[cols[idx]])
+        columns_out.append(col)
+    t = {'cols': [cols[i] for i in idxs], 'types': types, 'columns': columns_out}
+    if len(rows) == sum(seg['rows'] for seg in segments):
+        zones = _tbl_zones(header)
+        for j, idx in enumerate(idxs):
+            if idx in zones:
+                t.setdefault('indexes', {})[(j, 'zone')] = zones[idx]
+    return t
+
+# загрузка только файлов .tbl: типы уже известны, определение типов не нужно
+# возвращает таблицу и сохранённые в файле карты зон (для одного файла)
+def _load_tbl_files(files, columnar):
+    t = None
+    saved = None
+    for f in files:
+        try:
+            data = open_table(f)
+            if t is None:
+                t = data
+                saved = _saved_zones(data)
+            elif t['cols'] != data['cols']:
+                raise Exception(f'Файл {f} имеет разные колонки')
+            else:
+                columns = [a.concat(b) for a, b in zip(t['columns'], data['columns'])]
+                t = {'cols': t['cols'], 'types': t['types'], 'columns': columns}
+                saved = None
+        except FileNotFoundError:
+            print(f'Файл {f} не найден')
+        except Exception as e:
+            print(f'Ошибка при загрузке {f}: {e}')
+    if t is None:
+        t = {'cols': [], 'types': {}, 'rows': []}
+    else:
+        t.pop('indexes', None)
+        if not columnar:
+            t = to_rows(t)
+    return t, saved
+
+# заголовок файла .tbl (из конца файла)
+# если дозапись прервалась, в конце остаются неполные данные: тогда берётся последний целый заголовок
+# (каждая дозапись оставляет прежний заголовок на месте и пишет новый после своих сегментов)
+def _read_tbl_header(mm):
+    if mm[:len(TBL_MAGIC)] != TBL_MAGIC:
+        raise Exception('файл не в формате .tbl')
+    pos = len(mm)
+    while pos >= len(TBL_MAGIC) + _TBL_TRAILER.size:
+        header = _tbl_footer(mm, pos)
+        if header is not None:
+            if pos != len(mm):
+                print('файл .tbl дописан не полностью: прочитано последнее целое состояние')
+            return header
+        mark = mm.rfind(_TBL_END, len(TBL_MAGIC), pos - 1)
+        if mark < 0:
+            break
+        pos = mark + len(_TBL_END)
+    raise Exception('повреждённый файл .tbl')
+
+# заголовок, хвост которого заканчивается в позиции pos (None - хвоста там нет или он повреждён)
+def _tbl_footer(mm, pos):
+    end = pos - _TBL_TRAILER.size
+    length, crc, mark = _TBL_TRAILER.unpack_from(mm, end)
+    start = end - length
+    if mark != _TBL_END or not length or start < len(TBL_MAGIC) or zlib.crc32(mm[start:end]) != crc:
+        return None
+    try:
+        return json.loads(mm[start:end])
+    except ValueError:
+        return None
+
+# заголовок файла .tbl по имени
+def _tbl_header_of(f):
+    with open(f, 'rb') as file:
+        mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
     try:
+        return _read_tbl_header(mm)
+    finally:
+        mm.close()
+
+# столбец одного сегмента файла .tbl (строки lo..hi)
+def _tbl_column(mm, meta, lo, hi, swap):
+    kind = meta['kind']
+    if kind == 'p':
+        off, nb = meta['data']
+        return Column('o', pickle.loads(mm[off:off + nb])[lo:hi])
+    if kind == 'c':
+        off, nb = meta['data']
+        categories = list(_tbl_column(mm, meta['categories'], 0, meta['size'], swap))
+        return Column('c', _tbl_array(mm, off, nb, 'i', swap)[lo:hi], None, categories)
+    valid = None
+    if meta.get('valid'):
+        off, nb = meta['valid']
+        valid = memoryview(mm)[off:off + nb]
+    if kind == 's':
+        off, nb = meta['offsets']
+        offsets = _tbl_array(mm, off, nb, 'q', swap)[lo:hi + 1]
+        off, nb = meta['data']
+        return Column('o', StrData(memoryview(mm)[off:off + nb], offsets, valid, lo))
+    off, nb = meta['data']
+    data = _tbl_array(mm, off, nb, 'd' if kind == 'd' else 'q', swap)[lo:hi]
+    if valid is None:
+        return Column(kind, data)
+    if lo % 8 == 0:
+        return Column(kind, data, valid[lo >> 3:])
+    nulls = [j for j, i in enumerate(range(lo, hi)) if not valid[i >> 3] >> (i & 7) & 1]
+    return Column.from_raw(kind, data, nulls)
+
+# блок чисел файла: memoryview без копирования (или копия при другом порядке байт)
+def _tbl_array(mm, off, nb, typecode, swap):
+    data = memoryview(mm)[off:off + nb].cast(typecode)
+    if swap:
+        data = _as_array(data)
+        data.byteswap()
+    return data
+
+# схема таблицы для заголовка .tbl
+def _tbl_schema(t):
+    return {'cols': list(t['cols']), 'types': [_TYPE_NAMES.get(t['types'].get(c), 'str') for c in t['cols']],
+            'byteorder': sys.byteorder}
+
+# запись блоков всех столбцов таблицы
+def _write_tbl_segment(file, t):
+    columns = []
+    zones = _table_zones(t)
+    for idx, c in enumerate(t['cols']):
+        col = t['columns'][idx] if is_columnar(t) else Column.from_values(column_values(t, idx), t['types'].get(c))
+        meta = _write_tbl_column(file, col)
+        if idx in zones:
+            meta['zones'] = _tbl_zones_meta(zones[idx], t['types'].get(c) == 'datetime')
+        columns.append(meta)
+    return {'rows': row_count(t), 'columns': columns}
+
+# карта зон для заголовка .tbl (даты - микросекунды от _EPOCH)
+def _tbl_zones_meta(zm, dt):
+    d = zm.dump()
+    if dt:
+        d['min'] = [None if v is None else (v - _EPOCH) // _US for v in d['min']]
+        d['max'] = [None if v is None else (v - _EPOCH) // _US for v in d['max']]
+    return d
+
+# карты зон столбцов файла .tbl: {номер столбца: карта}; карты сегментов склеиваются,
+# если все сегменты, кроме последнего, состоят из целых блоков
+def _tbl_zones(header):
+    segments = header['segments']
+    zones = {}
+    for idx, name in enumerate(header['types']):
+        metas = [seg['columns'][idx].get('zones') for seg in segments]
+        if not metas or None in metas:
+            continue
+        block = metas[0]['block']
+        if any(m['block'] != block for m in metas) or any(seg['rows'] % block for seg in segments[:-1]):
+            continue
+        zm = ZoneMap(block=block)
+        for m in metas:
+            zm.mins.extend(m['min'])
+            zm.maxs.extend(m['max'])
+            zm.nulls.extend(m['nulls'])
+            zm.n += m['n']
+        if name == 'datetime':
+            zm.mins = [None if v is None else _EPOCH + timedelta(microseconds=v) for v in zm.mins]
+            zm.maxs = [None if v is None else _EPOCH + timedelta(microseconds=v) for v in zm.maxs]
+        zones[idx] = zm
+    return zones
+
+# запись одного столбца: числа и даты - как есть, строки - смещения и utf-8, прочее - pickle
+def _write_tbl_column(file, col):
+    if col.kind == 'c':
+        categories = _write_tbl_column(file, Column('o', list(col.categories)))
+        return {'kind': 'c', 'data': _write_tbl_block(file, col.data), 'categories': categories,
+                'size': len(col.categories)}
+    if col.kind != 'o':
+        valid = _write_tbl_block(file, col.valid) if col.valid is not None else None
+        return {'kind': col.kind, 'data': _write_tbl_block(file, col.data), 'valid': valid}
+    values = col.data
+    if not all(v is None or isinstance(v, str) for v in values):
+        return {'kind': 'p', 'data': _write_tbl_block(file, pickle.dumps(list(values)))}
+    offsets = array('q', [0])
+    parts = []
+    nulls = []
+    pos = 0
+    for i, v in enumerate(values):
+        if v is None:
+            nulls.append(i)
+        else:
+            b = v.encode('utf-8')
+            parts.append(b)
+            pos += len(b)
+        offsets.append(pos)
+    valid = _bitmap(len(offsets) - 1, nulls)
+    return {'kind': 's', 'offsets': _write_tbl_block(file, offsets), 'data': _write_tbl_block(file, b''.join(parts)),
+            'valid': _write_tbl_block(file, valid) if valid is not None else None}
+
+# запись блока с выравниванием по 8 байт; возвращает [смещение, длина]
+def _write_tbl_block(file, data):
+    pad = -file.tell() % 8
+    if pad:
+        file.write(b'\0' * pad)
+    off = file.tell()
+    raw = memoryview(data).cast('B')
+    file.write(raw)
+    return [off, raw.nbytes]
+
+# запись заголовка и хвоста
+def _write_tbl_header(file, header):
+    raw = json.dumps(header).encode('utf-8')
+    file.write(raw)
+    file.write(_TBL_TRAILER.pack(len(raw), zlib.crc32(raw), _TBL_END))
+
+# сохранение таблицы в файлы (расширения .gz, .bz2, .xz после формата - сжатие)
+# t может быть последовательностью таблиц-частей (load_table_iter, sort_table с выгрузкой на диск)
+# все файлы пишутся за один проход: каждая часть форматируется один раз, запись идёт в фоновом потоке
+# append=True - строки дописываются к существующим файлам той же схемы: в csv/txt - строки,
+# в .pkl - ещё одна таблица в поток pickle, в .tbl - сегменты и новый заголовок; при ошибке файлы
+# обрезаются до прежнего размера
+def save_table(t, *files, max_rows=None, append=False):
+    try:
+        started = time.perf_counter()
         if not files:
             raise Exception('Нет файлов для сохранения')
-        rows = t['rows']
-        if max_rows:
-            rows = rows[:max_rows]
-        for f in files:
-            if f.endswith('.csv'):
-                with open(f, 'w', newline='', encoding='utf-8') as file:
-                    writer = csv.writer(file)
-                    writer.writerow(t['cols'])
-                    for r in rows:
-                        rw = [v.strftime('%Y-%m-%d %H:%M:%S') if isinstance(v, datetime) else v for v in r]
-                        writer.writerow(rw)
-            elif f.endswith('.pkl'):
-                with open(f, 'wb') as file:
-                    pickle.dump(t, file)
-            elif f.endswith('.txt'):
-                with open(f, 'w', encoding='utf-8') as file:
-                    file.write('\t'.join(t['cols']) + '\n')
-                    for r in rows:
-                        rw = '\t'.join([v.strftime('%Y-%m-%d %H:%M:%S') if isinstance(v, datetime) else str(v) for v in r])
-                        file.write(rw + '\n')
-            else:
-                print(f'Неподдерживаемый формат файла {f}')
-        print('сохранено в', files)
+        if isinstance(t, dict):
+            n = row_count(t)
+            if max_rows:
+                n = min(n, max_rows)
+            if is_chunked(t):
+                t = _unchunk(t)
+            whole = t if n == row_count(t) and not is_view(t) else take_rows(t, range(n), copy_table=False)
+            chunks = (take_rows(whole, range(i, min(i + SAVE_CHUNK_ROWS, n)), copy_table=False)
+                      for i in range(0, n, SAVE_CHUNK_ROWS))
+            n, cols = _save_chunks(chunks, files, whole=whole, append=append)
+        else:
+            n, cols = _save_chunks(t, files, max_rows, append=append)
+        _report('save_table', started, n, n, cols, 'сохранено в', files, nbytes=_files_size(files))
     except Exception as e:
         print('ошибка при сохранении:', e)
 
+# строк в одной части при записи и глубина очереди фоновой записи (в частях)
+SAVE_CHUNK_ROWS = 50000
+SAVE_QUEUE_DEPTH = 4
+
+# сжатие по расширению файла
+_COMPRESSORS = {'.gz': gzip.open, '.bz2': bz2.open, '.xz': lzma.open, '.lzma': lzma.open}
+
+# формат файла без расширения сжатия ('data.csv.gz' -> '.csv')
+def _file_format(f):
+    base, ext = os.path.splitext(f)
+    if ext in _COMPRESSORS:
+        ext = os.path.splitext(base)[1]
+    return ext
+
+# открытие файла с учётом сжатия
+def open_file(f, mode='r', **kwargs):
+    opener = _COMPRESSORS.get(os.path.splitext(f)[1], open)
+    if 'b' not in mode:
+        kwargs.setdefault('encoding', 'utf-8')
+        if opener is not open and 't' not in mode:
+            mode += 't'
+    return opener(f, mode, **kwargs)
+
+# ключ записи о части .pkl: после каждой таблицы в файле пишется словарь {PKL_SEGMENT: байты} постоянной длины
+# с размером таблицы в байтах и хэшем схемы; первый объект файла - по-прежнему сама таблица (pickle.load даёт её),
+# а по записям с конца файла проверяются схема и целостность, не распаковывая строки
+PKL_SEGMENT = '_segment'
+
+# хэш схемы таблицы для записи о части
+def _pkl_schema_digest(t):
+    schema = repr((list(t['cols']), sorted((c, repr(typ)) for c, typ in t['types'].items())))
+    return hashlib.sha1(schema.encode('utf-8')).digest()[:8]
+
+# запись о части: pickle словаря с 16 байтами (размер таблицы, хэш схемы)
+def _pkl_trailer(size, digest):
+    return pickle.dumps({PKL_SEGMENT: struct.pack('<Q', size) + digest}, pickle.HIGHEST_PROTOCOL)
+
+# длина записи о части и её неизменные начало и конец
+_PKL_TRAILER = _pkl_trailer(0, bytes(8))
+PKL_TRAILER_SIZE = len(_PKL_TRAILER)
+_PKL_TRAILER_HEAD = _PKL_TRAILER[:_PKL_TRAILER.index(bytes(16))]
+_PKL_TRAILER_TAIL = _PKL_TRAILER[len(_PKL_TRAILER_HEAD) + 16:]
+
+# разбор записи о части: (размер таблицы, хэш схемы) или None, если это не запись
+def _parse_pkl_trailer(raw):
+    head = len(_PKL_TRAILER_HEAD)
+    if len(raw) != PKL_TRAILER_SIZE or not raw.startswith(_PKL_TRAILER_HEAD) or not raw.endswith(_PKL_TRAILER_TAIL):
+        return None
+    return struct.unpack_from('<Q', raw, head)[0], raw[head + 8:head + 16]
+
+# запись таблицы data в поток .pkl с записью о части
+def _write_pkl_segment(file, data):
+    payload = pickle.dumps(data, pickle.HIGHEST_PROTOCOL)
+    file.write(payload)
+    file.write(_pkl_trailer(len(payload), _pkl_schema_digest(data)))
+
+# чтение файла .pkl: поток из одной или нескольких таблиц (дозаписи save_table(..., append=True)) одной таблицей
+# (записи о частях PKL_SEGMENT пропускаются; в старых файлах их нет); оборванная последняя таблица пропускается
+def _load_pkl(f):
+    parts = []
+    with open_file(f, 'rb') as file:
+        while True:
+            try:
+                data = pickle.load(file)
+                if PKL_SEGMENT in data:
+                    continue
+            except EOFError:
+                break
+            except (pickle.UnpicklingError, ValueError, AttributeError, IndexError) as e:
+                if not parts:
+                    raise
+                print(f'файл {f} дописан не полностью, последняя часть пропущена: {e}')
+                break
+            if parts and data['cols'] != parts[0]['cols']:
+                raise Exception(f'части файла {f} имеют разные колонки')
+            parts.append(data)
+    if not parts:
+        raise Exception(f'файл {f} пуст')
+    if len(parts) == 1:
+        return parts[0]
+    for data in parts:
+        data.pop('indexes', None)
+        data.pop('zones', None)
+    if all(map(is_columnar, parts)):
+        columns = [Column.concat_all([data['columns'][i] for data in parts]) for i in range(len(parts[0]['cols']))]
+        return {'cols': parts[0]['cols'], 'types': parts[0]['types'], 'columns': columns}
+    return {'cols': parts[0]['cols'], 'types': parts[0]['types'],
+            'rows': [r for data in parts for r in to_rows(data)['rows']]}
+
+# фоновая запись: задания (функции без аргументов) выполняются по порядку в отдельном потоке,
+# пока основной поток форматирует следующую часть; первая ошибка записи передаётся в основной поток
+class _Writer:
+    def __init__(self, depth=SAVE_QUEUE_DEPTH):
+        self.queue = queue.Queue(depth)
+        self.error = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            if self.error is None:
+                try:
+                    job()
+                except Exception as e:
+                    self.error = e
+
+    def put(self, job):
+        if self.error is not None:
+            raise self.error
+        self.queue.put(job)
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+# запись потока частей во все файлы; whole - вся таблица, если она есть в памяти
+# (тогда .pkl и .tbl пишутся из неё целиком, иначе .tbl получает сегмент на часть, а .pkl собирается в памяти)
+def _save_chunks(chunks, files, max_rows=None, whole=None, append=False):
+    chunks = iter(chunks)
+    first = next(chunks, None)
+    if first is None:
+        if whole is None:
+            raise Exception('нет данных для сохранения')
+        first = whole
+    cols = first['cols']
+    types = first['types']
+    outs = {}
+    # дописываемые файлы и их размер до записи (к нему файл возвращается при ошибке)
+    sizes = {}
+    segments = {}
+    done = False
+    writer = _Writer()
+    try:
+        for f in files:
+            fmt = _file_format(f)
+            if fmt == '.tbl' and fmt != os.path.splitext(f)[1]:
+                raise Exception(f'файлы .tbl не сжимаются (читаются через отображение в память): {f}')
+            if fmt not in ('.csv', '.txt', '.tbl', '.pkl'):
+                print(f'Неподдерживаемый формат файла {f}')
+                continue
+            old = _append_check(f, fmt, first) if append and os.path.exists(f) and os.path.getsize(f) else None
+            if old is not None:
+                sizes[f] = os.path.getsize(f)
+            if fmt in ('.csv', '.txt'):
+                mode = 'a' if old is not None else 'w'
+                file = open_file(f, mode, newline='') if fmt == '.csv' else open_file(f, mode)
+                outs[f] = file
+                if old is None:
+                    head = _csv_text([cols]) if fmt == '.csv' else '\t'.join(cols) + '\n'
+                    writer.put(lambda file=file, head=head: file.write(head))
+            elif fmt == '.tbl':
+                if old is not None:
+                    # прежние сегменты и заголовок остаются на месте, новые пишутся после них
+                    file = outs[f] = open(f, 'ab')
+                    segments[f] = old
+                else:
+                    file = outs[f] = open(f, 'wb')
+                    writer.put(lambda file=file: file.write(TBL_MAGIC))
+            else:
+                outs[f] = open_file(f, 'ab' if old is not None else 'wb')
+        fmts = {f: _file_format(f) for f in outs}
+        need = set(fmts.values())
+        for f in outs:
+            segments.setdefault(f, [])
+        parts = []
+        # столбцы, где могут встретиться даты (остальные не проверяются при форматировании)
+        dt = [i for i, c in enumerate(cols) if types.get(c) in ('datetime', None)]
+        n = 0
+        for t in chain([first] if first is not whole else [], chunks):
+            if t['cols'] != cols:
+                raise Exception('части имеют разные колонки')
+            if max_rows is not None and n + row_count(t) > max_rows:
+                t = take_rows(t, range(max(max_rows - n, 0)), copy_table=False)
+            if not row_count(t):
+                break
+            n += row_count(t)
+            if '.csv' in need or '.txt' in need:
+                rows = _format_rows(t, dt)
+                csv_text = _csv_text(rows) if '.csv' in need else None
+                txt_text = '\n'.join(['\t'.join(map(str, r)) for r in rows]) + '\n' if '.txt' in need else None
+            for f, file in outs.items():
+                fmt = fmts[f]
+                if fmt == '.csv':
+                    writer.put(lambda file=file, data=csv_text: file.write(data))
+                elif fmt == '.txt':
+                    writer.put(lambda file=file, data=txt_text: file.write(data))
+                elif fmt == '.tbl' and whole is None:
+                    writer.put(lambda f=f, file=file, t=t: segments[f].append(_write_tbl_segment(file, t)))
+            if whole is None and '.pkl' in need:
+                parts.append(to_rows(t)['rows'])
+        for f, file in outs.items():
+            fmt = fmts[f]
+            if fmt == '.tbl':
+                if whole is not None:
+                    writer.put(lambda f=f, file=file: segments[f].append(_write_tbl_segment(file, whole)))
+
+                def finish(f=f, file=file):
+                    if f in sizes:
+                        # сегменты должны оказаться на диске раньше заголовка, который на них ссылается
+                        file.flush()
+                        os.fsync(file.fileno())
+                    header = _tbl_schema(first)
+                    header['segments'] = segments[f]
+                    _write_tbl_header(file, header)
+                writer.put(finish)
+            elif fmt == '.pkl':
+                if whole is not None:
+                    data = {k: v for k, v in whole.items() if k not in ('indexes', 'version')}
+                    zones = _table_zones(whole) if f not in sizes else None
+                    if zones:
+                        data['zones'] = {idx: zm.dump() for idx, zm in zones.items()}
+                else:
+                    data = {'cols': cols, 'types': types, 'rows': [r for part in parts for r in part]}
+                writer.put(lambda file=file, data=data: _write_pkl_segment(file, data))
+        writer.close()
+        done = True
+        return n if whole is None else row_count(whole), cols
+    finally:
+        if writer.thread.is_alive():
+            writer.queue.put(None)
+            writer.thread.join()
+        for file in outs.values():
+            file.close()
+        if not done:
+            # прерванная дозапись не должна портить прежние данные
+            for f, size in sizes.items():
+                os.truncate(f, size)
+
+# проверка схемы файла перед дозаписью таблицы t
+# возвращает для .tbl прежние сегменты, для .pkl и csv/txt - True
+def _append_check(f, fmt, t):
+    if fmt == '.tbl':
+        header = _tbl_header_of(f)
+        schema = _tbl_schema(t)
+        if any(header.get(k) != v for k, v in schema.items()):
+            raise Exception(f'схема файла {f} не совпадает с таблицей')
+        return header['segments']
+    if fmt == '.pkl':
+        plain = f.endswith(fmt)
+        digest = _pkl_schema_digest(t)
+        end, digests, size = _pkl_plain_end(f) if plain else _pkl_stream_end(f)
+        legacy = end is None
+        if legacy:
+            # файл без записей о частях (записан до их появления): таблицы один раз распаковываются целиком,
+            # а после них пишется запись, которая покрывает их все
+            end = _pkl_legacy_end(f, t)
+        elif any(d != digest for d in digests):
+            raise Exception(f'схема файла {f} не совпадает с таблицей')
+        if not end:
+            raise Exception(f'файл {f} повреждён')
+        if end != size:
+            # после оборванной дозаписи в конце остаётся неполная таблица: новые данные пишутся вместо неё
+            if not plain:
+                raise Exception(f'сжатый файл {f} повреждён в конце, дозапись невозможна')
+            os.truncate(f, end)
+        if legacy:
+            with open_file(f, 'ab') as file:
+                file.write(_pkl_trailer(end, digest))
+        return True
+    with open_file(f, 'r', newline='') as file:
+        line = file.readline()
+    head = next(csv.reader([line])) if fmt == '.csv' else line.rstrip('\r\n').split('\t')
+    if head != list(t['cols']):
+        raise Exception(f'столбцы файла {f} не совпадают с таблицей')
+    if f.endswith(fmt):
+        with open(f, 'rb') as file:
+            file.seek(-1, os.SEEK_END)
+            if file.read(1) != b'\n':
+                # save_table заканчивает каждую строку переводом строки: без него последняя строка
+                # оборвана при записи (или файл записан не save_table), и её нельзя отличить от полной
+                raise Exception(f'файл {f} не заканчивается переводом строки: последняя строка, возможно, '
+                                f'оборвана; проверьте её и допишите перевод строки или удалите её')
+    return True
+
+# конец последней целой части .pkl по цепочке записей о частях: от конца end к началу файла записи стоят
+# в конце каждой части; записи - {конец части: (размер, хэш схемы)}; возвращает хэши частей или None
+def _pkl_chain(records, end):
+    digests = []
+    while end > 0:
+        rec = records(end)
+        if rec is None:
+            return None
+        size, digest = rec
+        digests.append(digest)
+        end -= PKL_TRAILER_SIZE + size
+    return digests if end == 0 else None
+
+# конец целых частей несжатого .pkl, хэши их схем и размер файла; конец None - в файле нет записей о частях
+# обычно цепочка сходится от конца файла за одно чтение на часть; после оборванной дозаписи
+# последняя целая запись ищется с конца файла
+def _pkl_plain_end(f):
+    with open(f, 'rb') as file:
+        size = os.fstat(file.fileno()).st_size
+
+        def records(end):
+            if end < PKL_TRAILER_SIZE:
+                return None
+            file.seek(end - PKL_TRAILER_SIZE)
+            return _parse_pkl_trailer(file.read(PKL_TRAILER_SIZE))
+
+        digests = _pkl_chain(records, size)
+        if digests is not None:
+            return size, digests, size
+        if not size:
+            return None, None, size
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            pos = size
+            while True:
+                pos = m.rfind(_PKL_TRAILER_HEAD, 0, pos)
+                if pos < 0:
+                    return None, None, size
+                end = pos + PKL_TRAILER_SIZE
+                digests = _pkl_chain(records, end) if end <= size else None
+                if digests is not None:
+                    return end, digests, size
+
+# то же для сжатого .pkl: поток распаковывается один раз, записи о частях находятся по их началу
+# (размер оборванного сжатого потока - None)
+def _pkl_stream_end(f):
+    found = {}
+    pos = 0
+    keep = b''
+    with open_file(f, 'rb') as file:
+        while True:
+            try:
+                block = file.read(1 << 20)
+            except EOFError:
+                pos = None
+                break
+            if not block:
+                break
+            buf = keep + block
+            base = pos - len(keep)
+            i = buf.find(_PKL_TRAILER_HEAD)
+            while i >= 0:
+                rec = _parse_pkl_trailer(buf[i:i + PKL_TRAILER_SIZE])
+                if rec is not None:
+                    found[base + i + PKL_TRAILER_SIZE] = rec
+                i = buf.find(_PKL_TRAILER_HEAD, i + 1)
+            keep = buf[-(PKL_TRAILER_SIZE - 1):]
+            pos += len(block)
+    for end in sorted(found, reverse=True):
+        digests = _pkl_chain(found.get, end)
+        if digests is not None:
+            return end, digests, pos
+    return None, None, pos
+
+# конец целых таблиц .pkl без записей о частях (таблицы распаковываются по очереди)
+def _pkl_legacy_end(f, t):
+    end = 0
+    with open_file(f, 'rb') as file:
+        while True:
+            try:
+                head = pickle.load(file)
+            except EOFError:
+                break
+            except (pickle.UnpicklingError, ValueError, AttributeError, IndexError):
+                break
+            if list(head['cols']) != list(t['cols']) or head['types'] != t['types']:
+                raise Exception(f'схема файла {f} не совпадает с таблицей')
+            end = file.tell()
+    if not end:
+        raise Exception(f'файл {f} повреждён')
+    return end
+
+# строки части с датами, переведёнными в текст (один раз для всех текстовых файлов)
+def _format_rows(t, dt):
+    if not dt:
+        return list(iter_rows(t))
+    rows = [list(r) for r in iter_rows(t)] if not is_columnar(t) else list(iter_rows(t))
+    fast = DATETIME_FORMAT == '%Y-%m-%d %H:%M:%S'
+    for i in dt:
+        for r in rows:
+            v = r[i]
+            if isinstance(v, datetime):
+                # isoformat заметно быстрее strftime и для дат без микросекунд и пояса даёт тот же текст
+                if fast and not v.microsecond and v.tzinfo is None:
+                    r[i] = v.isoformat(' ')
+                else:
+                    r[i] = v.strftime(DATETIME_FORMAT)
+    return rows
+
+# текст csv для набора строк
+def _csv_text(rows):
+    buf = io.StringIO()
+    csv.writer(buf).writerows(rows)
+    return buf.getvalue()
+
 # вывод таблицы
 def print_table(t):
     print('таблица:')
     print('\t'.join(t['cols']))
-    for r in t['rows']:
+    for r in iter_rows(t):
         rw = [v.strftime('%Y-%m-%d %H:%M:%S') if isinstance(v, datetime) else str(v) for v in r]
         print('\t'.join(rw))
 
 # получение строк по номерам
 def get_rows_by_number(t, start, stop=None, copy_table=False):
     try:
+        started = time.perf_counter()
         if stop is not None:
-            selected = t['rows'][start:stop]
+            selected = range(row_count(t))[start:stop]
         else:
-            selected = [t['rows'][start]]
+            i = range(row_count(t))[start]
+            selected = range(i, i + 1)
         if copy_table:
-            new_table = {'cols': t['cols'][:], 'types': t['types'].copy(), 'rows': [r[:] for r in selected]}
-            print('получена копия строк:', new_table)
+            new_table = take_rows(t, selected)
+            _report('get_rows_by_number', started, row_count(t), len(selected), (), 'получена копия строк:', new_table)
             return new_table
         else:
-            # создание представления (зависит от требований, здесь просто возвращаем ссылки)
-            view_table = {'cols': t['cols'], 'types': t['types'], 'rows': selected}
-            print('получены строки:', view_table)
+            view_table = make_view(t, selected)
+            _report('get_rows_by_number', started, row_count(t), len(selected), (), 'получены строки:', view_table)
             return view_table
     except IndexError:
         print('номер строки вне диапазона')
@@ -138,95 +1880,442 @@ def get_rows_by_number(t, start, stop=None, copy_table=False):
         print('ошибка при получении строк:', e)
 
 # получение строк по индексам первого столбца
-def get_rows_by_index(t, *vals, copy_table=False):
+def get_rows_by_index(t, *vals, copy_table=False, column=0):
     try:
-        idx = t['cols'][0]
-        selected = [r for r in t['rows'] if r[0] in vals]
+        started = time.perf_counter()
+        idx = _column_index(t, column)
+        selected = get_index(t, idx).lookup(vals)
         if copy_table:
-            new_table = {'cols': t['cols'][:], 'types': t['types'].copy(), 'rows': [r[:] for r in selected]}
-            print('получена копия строк:', new_table)
+            new_table = take_rows(t, selected)
+            _report('get_rows_by_index', started, row_count(t), len(selected), [t['cols'][idx]], 'получена копия строк:', new_table)
             return new_table
         else:
-            view_table = {'cols': t['cols'], 'types': t['types'], 'rows': selected}
-            print('получены строки:', view_table)
+            view_table = take_rows(t, selected, copy_table=False)
+            _report('get_rows_by_index', started, row_count(t), len(selected), [t['cols'][idx]], 'получены строки:', view_table)
             return view_table
     except Exception as e:
         print('ошибка при получении строк по индексам:', e)
 
+# получение строк по диапазону значений столбца lo <= v <= hi (границы None - без ограничения)
+def get_rows_by_range(t, lo=None, hi=None, column=0, copy_table=False, include_hi=True):
+    try:
+        started = time.perf_counter()
+        idx = _column_index(t, column)
+        selected = get_index(t, idx, 'sorted').range(lo, hi, include_hi)
+        new_table = take_rows(t, selected, copy_table=copy_table)
+        _report('get_rows_by_range', started, row_count(t), len(selected), [t['cols'][idx]], 'получены строки по диапазону:', new_table)
+        return new_table
+    except Exception as e:
+        print('ошибка при получении строк по диапазону:', e)
+
+# номер столбца по номеру или имени
+def _column_index(t, column):
+    if isinstance(column, int):
+        t['cols'][column]
+        return column
+    return t['cols'].index(column)
+
+# хэш-индекс столбца: значение -> номера строк (для поиска на равенство)
+class HashIndex:
+    __slots__ = ('map', 'n')
+
+    def __init__(self, values=(), n=0):
+        self.map = {}
+        self.n = n
+        m = self.map
+        for i, v in enumerate(values):
+            pos = m.get(v)
+            if pos is None:
+                m[v] = [i]
+            else:
+                pos.append(i)
+
+    # номера строк с любым из значений vals в порядке таблицы
+    def lookup(self, vals):
+        m = self.map
+        found = [m[v] for v in set(vals) if v in m]
+        if len(found) == 1:
+            return found[0][:]
+        return sorted(i for pos in found for i in pos)
+
+    # копия индекса с добавленными строками (списки копируются только для затронутых значений)
+    def extended(self, values, offset):
+        new = HashIndex()
+        new.map = dict(self.map)
+        new.n = self.n
+        m = new.map
+        for i, v in enumerate(values, offset):
+            m[v] = m[v] + [i] if v in m else [i]
+        new.n = offset + len(values)
+        return new
+
+# упорядоченный индекс столбца (для поиска по диапазону): отсортированные значения и номера строк
+class SortedIndex:
+    __slots__ = ('keys', 'positions', 'n')
+
+    def __init__(self, values=(), n=0):
+        pairs = sorted((v, i) for i, v in enumerate(values) if v is not None)
+        self.keys = [v for v, _ in pairs]
+        self.positions = [i for _, i in pairs]
+        self.n = n
+
+    # номера строк с lo <= v <= hi (или v < hi) в порядке таблицы
+    def range(self, lo=None, hi=None, include_hi=True):
+        start = 0 if lo is None else bisect_left(self.keys, lo)
+        if hi is None:
+            stop = len(self.keys)
+        else:
+            stop = bisect_right(self.keys, hi) if include_hi else bisect_left(self.keys, hi)
+        return sorted(self.positions[start:stop])
+
+    def lookup(self, vals):
+        res = []
+        for v in set(vals):
+            if v is not None:
+                res.extend(self.range(v, v))
+        return sorted(res)
+
+# строк в блоке карты зон и типы столбцов, для которых строятся карты
+# ZONE_MIN_ROWS - с какого числа строк карта строится при первом сравнении с константой (меньшие таблицы
+# просматриваются целиком, и карты в них не хранятся)
+ZONE_ROWS = 8192
+ZONE_TYPES = (int, float, 'datetime')
+ZONE_MIN_ROWS = 4 * ZONE_ROWS
+
+# карта зон столбца: минимум, максимум и число пропусков в каждом блоке из block строк
+# (минимум None - блок целиком из пропусков или его значения несравнимы между собой)
+class ZoneMap:
+    __slots__ = ('mins', 'maxs', 'nulls', 'n', 'block')
+
+    def __init__(self, values=(), n=0, block=None):
+        self.n = n
+        self.block = block or ZONE_ROWS
+        self.mins = []
+        self.maxs = []
+        self.nulls = []
+        for lo in range(0, n, self.block):
+            mn, mx, nulls = _zone_block(values, lo, min(lo + self.block, n))
+            self.mins.append(mn)
+            self.maxs.append(mx)
+            self.nulls.append(nulls)
+
+    def __repr__(self):
+        return f'ZoneMap({self.n} строк, блоков: {len(self.mins)})'
+
+    # пересчёт блоков с номерами blocks по новым значениям столбца
+    def refresh(self, values, blocks):
+        for b in blocks:
+            lo = b * self.block
+            self.mins[b], self.maxs[b], self.nulls[b] = _zone_block(values, lo, min(lo + self.block, self.n))
+
+    # состояния блоков для сравнения столбца с константой: 0 - не подходит ни одна строка,
+    # 1 - подходят все, 2 - строки нужно проверить; None - константа несравнима со значениями
+    def states(self, op, value):
+        domain = _zone_domain(value)
+        if domain is None:
+            return None
+        none, whole = _ZONE_TESTS[op]
+        res = []
+        for b, (mn, mx, nulls) in enumerate(zip(self.mins, self.maxs, self.nulls)):
+            size = min(self.block, self.n - b * self.block)
+            if nulls == size:
+                res.append(0)
+            elif mn is None or _zone_domain(mn) != domain:
+                res.append(2)
+            elif none(mn, mx, value):
+                res.append(0)
+            else:
+                res.append(1 if not nulls and whole(mn, mx, value) else 2)
+        return res
+
+    # карта в виде словаря из простых значений (для сохранения в файлы)
+    def dump(self):
+        return {'n': self.n, 'block': self.block, 'min': self.mins, 'max': self.maxs, 'nulls': self.nulls}
+
+    @classmethod
+    def load(cls, d):
+        zm = cls(n=0, block=d['block'])
+        zm.n = d['n']
+        zm.mins, zm.maxs, zm.nulls = list(d['min']), list(d['max']), list(d['nulls'])
+        return zm
+
+# для каждой операции: ни одно значение из [mn, mx] не подходит / подходят все
+_ZONE_TESTS = {
+    'eq': (lambda mn, mx, v: v < mn or v > mx, lambda mn, mx, v: mn == mx == v),
+    'ne': (lambda mn, mx, v: mn == mx == v, lambda mn, mx, v: v < mn or v > mx),
+    'gr': (lambda mn, mx, v: mx <= v, lambda mn, mx, v: mn > v),
+    'ge': (lambda mn, mx, v: mx < v, lambda mn, mx, v: mn >= v),
+    'ls': (lambda mn, mx, v: mn >= v, lambda mn, mx, v: mx < v),
+    'le': (lambda mn, mx, v: mn > v, lambda mn, mx, v: mx <= v),
+}
+
+# биты байта маски значений (младший бит - первая строка)
+_BITS = [tuple(b >> k & 1 for k in range(8)) for b in range(256)]
+
+# область сравнения значения по правилам compare: даты, числа, строки (прочее сравнивается как текст)
+def _zone_domain(v):
+    if isinstance(v, datetime):
+        return 't'
+    if isinstance(v, (int, float)):
+        return 'n'
+    if isinstance(v, str):
+        return 's'
+    return None
+
+# минимум, максимум и число пропусков строк lo..hi столбца
+def _zone_block(values, lo, hi):
+    if isinstance(values, Column) and values.kind in ('q', 'd', 't'):
+        vals = values.data[lo:hi]
+        if values.valid is not None:
+            # lo кратно размеру блока, поэтому маска начинается с целого байта
+            vals = list(compress(vals, chain.from_iterable(map(_BITS.__getitem__, values.valid[lo >> 3:(hi + 7) >> 3]))))
+        nulls = hi - lo - len(vals)
+        if not vals or (values.kind == 'd' and math.isnan(sum(vals))):
+            return None, None, nulls
+        mn, mx = min(vals), max(vals)
+        if values.kind == 't':
+            return _EPOCH + timedelta(microseconds=mn), _EPOCH + timedelta(microseconds=mx), nulls
+        return mn, mx, nulls
+    vals = values[lo:hi]
+    if isinstance(vals, Column):
+        vals = list(vals)
+    nulls = vals.count(None)
+    if nulls:
+        vals = list(filter(partial(operator.is_not, None), vals))
+    if not vals:
+        return None, None, nulls
+    try:
+        mn, mx = min(vals), max(vals)
+        # NaN не сравнивается ни с чем, такой блок проверяется построчно
+        if _zone_domain(mn) == 'n' and sum(vals) != sum(vals):
+            return None, None, nulls
+    except TypeError:
+        return None, None, nulls
+    return mn, mx, nulls
+
+# готовая карта зон столбца (None - карты нет, таблица изменилась или это представление)
+# build=True - для большой таблицы карта строится и сохраняется, как индекс в get_index
+def _zone_map(t, idx, build=False):
+    if is_view(t):
+        return None
+    zm = t.get('indexes', {}).get((idx, 'zone'))
+    if zm is not None and zm.n == row_count(t):
+        return zm
+    if build and t['types'].get(t['cols'][idx]) in ZONE_TYPES and row_count(t) >= ZONE_MIN_ROWS:
+        return get_index(t, idx, 'zone')
+    return None
+
+# карты зон из индексов таблицы: {номер столбца: карта}
+def _saved_zones(t):
+    return {idx: index for (idx, kind), index in t.get('indexes', {}).items() if kind == 'zone'}
+
+# карты зон столбцов типов ZONE_TYPES: готовые из saved ({номер столбца: карта}) или построенные заново
+def _attach_zones(t, saved=None):
+    n = row_count(t)
+    for idx, c in enumerate(t['cols']):
+        if t['types'].get(c) not in ZONE_TYPES:
+            continue
+        zm = (saved or {}).get(idx)
+        if zm is None or zm.n != n:
+            zm = ZoneMap(column_values(t, idx), n)
+        t.setdefault('indexes', {})[(idx, 'zone')] = zm
+    return t
+
+# карты зон таблицы для сохранения: {номер столбца: карта}
+def _table_zones(t):
+    if is_view(t) or is_chunked(t):
+        return {}
+    n = row_count(t)
+    return {idx: _zone_map(t, idx) or ZoneMap(column_values(t, idx), n)
+            for idx, c in enumerate(t['cols']) if t['types'].get(c) in ZONE_TYPES}
+
+_INDEX_KINDS = {'hash': HashIndex, 'sorted': SortedIndex, 'zone': ZoneMap}
+
+# индекс столбца (строится при первом обращении и хранится в t['indexes'])
+def get_index(t, column=0, kind='hash'):
+    if kind not in _INDEX_KINDS:
+        raise Exception(f'Неизвестный вид индекса: {kind}')
+    idx = _column_index(t, column)
+    if is_view(t):
+        # базовая таблица может меняться, поэтому индекс представления не хранится
+        return _INDEX_KINDS[kind](column_values(t, idx), row_count(t))
+    indexes = t.setdefault('indexes', {})
+    index = indexes.get((idx, kind))
+    n = row_count(t)
+    if index is None or index.n != n:
+        index = _INDEX_KINDS[kind](column_values(t, idx), n)
+        indexes[(idx, kind)] = index
+    return index
+
+# построение индекса заранее
+def create_index(t, column=0, kind='hash'):
+    try:
+        started = time.perf_counter()
+        index = get_index(t, column, kind)
+        _report('create_index', started, row_count(t), 0, [t['cols'][_column_index(t, column)]], f'индекс {kind} по столбцу {column} построен')
+        return index
+    except Exception as e:
+        print('ошибка при построении индекса:', e)
+
+# удаление индексов столбца (или всех)
+def drop_index(t, column=None):
+    _invalidate_indexes(t, None if column is None else _column_index(t, column))
+
+# сброс индексов после изменения таблицы
+def _invalidate_indexes(t, idx=None):
+    indexes = t.get('indexes')
+    if not indexes:
+        return
+    if idx is None:
+        indexes.clear()
+    else:
+        for key in [k for k in indexes if k[0] == idx]:
+            del indexes[key]
+
 # получение типов столбцов
 def get_column_types(t, by_number=True):
     try:
+        started = time.perf_counter()
         if by_number:
             types = list(t['types'].values())
         else:
             types = t['types'].copy()
-        print('типы столбцов:', types)
+        _report('get_column_types', started, 0, 0, t['cols'], 'типы столбцов:', types)
         return types
     except Exception as e:
         print('ошибка при получении типов столбцов:', e)
 
-# установка типов столбцов
-def set_column_types(t, types_dict, by_number=True):
+# установка типов столбцов (ключи types_dict - номера при by_number=True, иначе имена)
+# errors: 'null' - непреобразуемые значения становятся None, 'raise' - ошибка без изменения таблицы
+# возвращает отчёт об ошибках по столбцам: {столбец: {'count': количество, 'sample': примеры}}
+def set_column_types(t, types_dict, by_number=True, errors='null'):
     try:
-        if by_number:
-            for idx, typ in types_dict.items():
-                col = t['cols'][idx]
-                t['types'][col] = typ
-                # конвертация типов
-                for r in t['rows']:
-                    v = r[idx]
-                    if v is not None:
-                        try:
-                            if typ == int:
-                                r[idx] = int(v)
-                            elif typ == float:
-                                r[idx] = float(v)
-                            elif typ == 'datetime':
-                                if isinstance(v, datetime):
-                                    continue
-                                r[idx] = datetime.strptime(v, '%Y-%m-%d %H:%M:%S')
-                            else:
-                                r[idx] = str(v)
-                        except:
-                            r[idx] = None
-        else:
-            for col, typ in types_dict.items():
-                if col in t['types']:
-                    t['types'][col] = typ
-                    idx = t['cols'].index(col)
-                    for r in t['rows']:
-                        v = r[idx]
-                        if v is not None:
-                            try:
-                                if typ == int:
-                                    r[idx] = int(v)
-                                elif typ == float:
-                                    r[idx] = float(v)
-                                elif typ == 'datetime':
-                                    if isinstance(v, datetime):
-                                        continue
-                                    r[idx] = datetime.strptime(v, '%Y-%m-%d %H:%M:%S')
-                                else:
-                                    r[idx] = str(v)
-                            except:
-                                r[idx] = None
-                else:
-                    raise Exception(f'Столбец {col} не найден')
-        print('типы столбцов обновлены:', t['types'])
+        started = time.perf_counter()
+        if is_view(t):
+            raise Exception('типы столбцов представления меняются через базовую таблицу')
+        targets = []
+        for key, typ in types_dict.items():
+            if by_number:
+                targets.append((key, t['cols'][key], typ))
+            elif key in t['types']:
+                targets.append((t['cols'].index(key), key, typ))
+            else:
+                raise Exception(f'Столбец {key} не найден')
+        converted = []
+        report = {}
+        for idx, col, typ in targets:
+            vals = column_values(t, idx)
+            new, bad = convert_values(vals, typ)
+            if bad:
+                report[col] = bad
+            converted.append((idx, col, typ, vals, new))
+        if report and errors == 'raise':
+            raise Exception(_conversion_message(report))
+        if is_chunked(t) and any(new is not vals for _, _, _, vals, new in converted):
+            _invalidate_indexes(t)
+            t = _own_chunks(t)
+        for idx, col, typ, vals, new in converted:
+            t['types'][col] = typ
+            if new is vals:
+                # значения уже нужного типа
+                continue
+            _invalidate_indexes(t, idx)
+            if is_columnar(t):
+                t['columns'][idx] = new if isinstance(new, Column) else Column.from_values(new, typ)
+            else:
+                for r, v in zip(t['rows'], new):
+                    r[idx] = v
+        if report:
+            print('не удалось преобразовать значения:', _conversion_message(report))
+        _report('set_column_types', started, row_count(t), row_count(t), [col for _, col, _ in targets],
+                'типы столбцов обновлены:', t['types'])
+        return report
     except Exception as e:
         print('ошибка при установке типов столбцов:', e)
 
+# преобразователи значений по типу столбца (значение не None); неизвестные типы приводятся к str
+_CONVERTERS = {}
+
+# регистрация преобразователя: fn(значение) -> значение типа typ (ошибка - ValueError/TypeError/OverflowError);
+# ready - типы значений, которые уже подходят столбцу (для быстрого пути без преобразования)
+def register_converter(typ, fn, ready=()):
+    _CONVERTERS[typ] = (fn, frozenset(ready))
+
+register_converter(int, int, (int,))
+register_converter(float, float, (float,))
+register_converter('datetime', parse_datetime, (datetime,))
+register_converter(str, str, (str,))
+
+# преобразователь для типа
+def _converter(typ):
+    return _CONVERTERS.get(typ, _CONVERTERS[str])[0]
+
+# уже ли столбец (список или Column) нужного типа
+def _has_type(vals, typ):
+    if isinstance(vals, Column):
+        if vals.kind != 'o':
+            return vals.kind == _kind_of(typ) or (vals.kind == 'c' and typ == str)
+        vals = vals.data
+    ready = _CONVERTERS.get(typ, _CONVERTERS[str])[1]
+    if not ready:
+        return False
+    # первое значение отсекает большинство случаев, остальное - одним проходом на уровне C
+    for v in vals:
+        if v is not None:
+            if type(v) not in ready:
+                return False
+            break
+    kinds = set(map(type, vals))
+    kinds.discard(type(None))
+    return kinds <= ready
+
+# преобразование значений столбца к типу целиком
+# возвращает новые значения (или те же vals, если преобразование не нужно) и отчёт об ошибках (None - без ошибок)
+def convert_values(vals, typ, sample_size=5):
+    if _has_type(vals, typ):
+        return vals, None
+    fn = _converter(typ)
+    if not isinstance(vals, list):
+        vals = list(vals)
+    if None not in vals:
+        try:
+            # без пропусков и ошибок - преобразование одним map
+            return list(map(fn, vals)), None
+        except (ValueError, TypeError, OverflowError):
+            pass
+    new = []
+    append = new.append
+    count = 0
+    sample = []
+    for v in vals:
+        if v is None:
+            append(None)
+            continue
+        try:
+            append(fn(v))
+        except (ValueError, TypeError, OverflowError):
+            count += 1
+            if len(sample) < sample_size:
+                sample.append(v)
+            append(None)
+    return new, ({'count': count, 'sample': sample} if count else None)
+
+# текст отчёта об ошибках преобразования
+def _conversion_message(report):
+    return '; '.join(f"{col}: {r['count']} знач., например {r['sample']!r}" for col, r in report.items())
+
 # получение значений столбца
 def get_values(t, column=0):
     try:
+        started = time.perf_counter()
         if isinstance(column, int):
             idx = column
             col = t['cols'][idx]
         else:
             col = column
             idx = t['cols'].index(col)
-        vals = [r[idx] for r in t['rows']]
-        print(f'значения столбца {col}: {vals}')
+        vals = list(column_values(t, idx))
+        _report('get_values', started, row_count(t), len(vals), [col], col, vals, fmt='значения столбца {}: {}')
         return vals
     except IndexError:
         print('номер столбца вне диапазона')
@@ -238,44 +2327,64 @@ def get_values(t, column=0):
 # получение одного значения из столбца (для таблицы с одной строкой)
 def get_value(t, column=0):
     try:
-        if len(t['rows']) != 1:
+        if row_count(t) != 1:
             raise Exception('таблица должна содержать ровно одну строку')
         return get_values(t, column)[0]
     except Exception as e:
         print('ошибка при получении значения:', e)
 
 # установка значений столбца
-def set_values(t, values, column=0):
+# errors: 'null' - непреобразуемые значения становятся None (с сообщением), 'raise' - ошибка без изменений
+def set_values(t, values, column=0, errors='null'):
     try:
+        started = time.perf_counter()
         if isinstance(column, int):
             idx = column
             col = t['cols'][idx]
         else:
             col = column
             idx = t['cols'].index(col)
-        if len(values) != len(t['rows']):
+        if len(values) != row_count(t):
             raise Exception('длина значений не совпадает с количеством строк')
         typ = t['types'][col]
-        for i in range(len(t['rows'])):
-            v = values[i]
-            if v is not None:
-                try:
-                    if typ == int:
-                        t['rows'][i][idx] = int(v)
-                    elif typ == float:
-                        t['rows'][i][idx] = float(v)
-                    elif typ == 'datetime':
-                        if isinstance(v, datetime):
-                            t['rows'][i][idx] = v
-                        else:
-                            t['rows'][i][idx] = datetime.strptime(v, '%Y-%m-%d %H:%M:%S')
-                    else:
-                        t['rows'][i][idx] = str(v)
-                except:
-                    t['rows'][i][idx] = None
+        new, bad = convert_values(values, typ)
+        if bad:
+            if errors == 'raise':
+                raise Exception(_conversion_message({col: bad}))
+            print('не удалось преобразовать значения:', _conversion_message({col: bad}))
+        new = list(new)
+        # карта зон не сбрасывается, а пересчитывается для блоков с изменившимися значениями
+        owner = _view_base(t) if is_view(t) else t
+        zm = _zone_map(owner, idx)
+        if zm is not None:
+            sel = t['sel'] if is_view(t) else range(len(new))
+            changed = sorted({p // zm.block for p, a, b in zip(sel, column_values(t, idx), new) if a != b})
+        _invalidate_indexes(t, idx)
+        if is_chunked(t):
+            t = _own_chunks(t)
+        if is_view(t):
+            # запись в строки базовой таблицы
+            base = t['base']
+            _invalidate_indexes(base, idx)
+            if is_chunked(base):
+                base = _own_chunks(base)
+            if is_columnar(base):
+                target = base['columns'][idx]
+                for p, v in zip(t['sel'], new):
+                    target[p] = v
             else:
-                t['rows'][i][idx] = None
-        print(f'значения столбца {col} обновлены')
+                rows = base['rows']
+                for p, v in zip(t['sel'], new):
+                    rows[p][idx] = v
+        elif is_columnar(t):
+            t['columns'][idx] = Column.from_values(new, typ)
+        else:
+            for r, v in zip(t['rows'], new):
+                r[idx] = v
+        if zm is not None:
+            zm.refresh(new if owner is t else column_values(owner, idx), changed)
+            owner.setdefault('indexes', {})[(idx, 'zone')] = zm
+        _report('set_values', started, len(values), row_count(t), [col], f'значения столбца {col} обновлены')
     except ValueError:
         print('столбец не найден')
     except Exception as e:
@@ -284,62 +2393,111 @@ def set_values(t, values, column=0):
 # установка одного значения (для таблицы с одной строкой)
 def set_value(t, value, column=0):
     try:
-        if len(t['rows']) != 1:
+        if row_count(t) != 1:
             raise Exception('таблица должна содержать ровно одну строку')
         set_values(t, [value], column)
     except Exception as e:
         print('ошибка при установке значения:', e)
 
 # конкатенация таблиц
+# если одна из таблиц состоит из частей, результат - таблица из частей обеих (строки не копируются)
 def concat(t1, t2):
     try:
+        started = time.perf_counter()
         if t1['cols'] != t2['cols']:
             raise Exception('Таблицы имеют разные колонки')
-        new = {'cols': t1['cols'], 'types': t1['types'].copy(), 'rows': t1['rows'] + t2['rows']}
-        print('таблицы сконкатенированы:', new)
+        if is_view(t1):
+            t1 = _unview(t1)
+        if is_chunked(t1) or is_chunked(t2):
+            new = {'cols': t1['cols'], 'types': t1['types'].copy(), 'chunks': _chunks_of(t1) + _chunks_of(t2)}
+            _compact_tail(new)
+        elif is_columnar(t1):
+            columns = [a.concat(b) for a, b in zip(t1['columns'], to_columnar(t2)['columns'])]
+            new = {'cols': t1['cols'], 'types': t1['types'].copy(), 'columns': columns}
+        else:
+            new = {'cols': t1['cols'], 'types': t1['types'].copy(), 'rows': t1['rows'] + to_rows(t2)['rows']}
+        # хэш-индексы первой таблицы дополняются строками второй
+        n1 = row_count(t1)
+        for (idx, kind), index in t1.get('indexes', {}).items():
+            if kind == 'hash' and index.n == n1:
+                new.setdefault('indexes', {})[(idx, kind)] = index.extended(column_values(t2, idx), n1)
+        _report('concat', started, n1 + row_count(t2), row_count(new), t1['cols'], 'таблицы сконкатенированы:', new)
         return new
     except Exception as e:
         print('ошибка при конкатенации таблиц:', e)
 
-# разбиение таблицы на две
+# разбиение таблицы на две: половины - представления таблицы (изменения через них попадают в неё)
 def split_table(t, row_number):
     try:
-        if row_number < 0 or row_number > len(t['rows']):
+        started = time.perf_counter()
+        n = row_count(t)
+        if row_number < 0 or row_number > n:
             raise Exception('номер строки для разбиения вне диапазона')
-        t1 = {'cols': t['cols'], 'types': t['types'].copy(), 'rows': t['rows'][:row_number]}
-        t2 = {'cols': t['cols'], 'types': t['types'].copy(), 'rows': t['rows'][row_number:]}
-        print('таблица разбита на две:', t1, t2)
+        t1 = make_view(t, range(0, row_number))
+        t2 = make_view(t, range(row_number, n))
+        _report('split_table', started, n, n, (), 'таблица разбита на две:', t1, t2)
         return t1, t2
     except Exception as e:
         print('ошибка при разбиении таблицы:', e)
 
 # арифметические операции
-def add(t, col1, col2):
-    return arith(t, col1, col2, 'add')
+def add(t, col1, col2, use_numpy=None):
+    return arith(t, col1, col2, 'add', use_numpy)
 
-def sub(t, col1, col2):
-    return arith(t, col1, col2, 'sub')
+def sub(t, col1, col2, use_numpy=None):
+    return arith(t, col1, col2, 'sub', use_numpy)
 
-def mul(t, col1, col2):
-    return arith(t, col1, col2, 'mul')
+def mul(t, col1, col2, use_numpy=None):
+    return arith(t, col1, col2, 'mul', use_numpy)
 
-def div(t, col1, col2):
-    return arith(t, col1, col2, 'div')
+def div(t, col1, col2, use_numpy=None):
+    return arith(t, col1, col2, 'div', use_numpy)
 
-def arith(t, col1, col2, op):
+# сообщения о результатах арифметических операций и сравнений (при DEBUG)
+_ARITH_FORMAT = 'результат {} столбцов {} и {}: {}'
+_CMP_FORMAT = 'результат сравнения {} столбцов {} и {}: {}'
+
+# отчёт об операции col1 op col2 (scalar - col2 значение, а не столбец)
+def _report_binop(op, started, res, col1, col2, scalar, fmt):
+    _report(op, started, len(res), len(res), [col1] if scalar else [col1, col2], op, col1, col2, res, fmt=fmt)
+
+# col2 - имя столбца или число (операция со скаляром)
+def arith(t, col1, col2, op, use_numpy=None):
     try:
+        started = time.perf_counter()
         idx1 = t['cols'].index(col1)
-        idx2 = t['cols'].index(col2)
         typ1 = t['types'][col1]
-        typ2 = t['types'][col2]
         if typ1 not in [int, float] and typ1 != 'bool':
             raise Exception(f'Столбец {col1} не поддерживает арифметические операции')
-        if typ2 not in [int, float] and typ2 != 'bool':
-            raise Exception(f'Столбец {col2} не поддерживает арифметические операции')
+        c1 = column_values(t, idx1)
+        scalar = not isinstance(col2, str)
+        if not scalar:
+            idx2 = t['cols'].index(col2)
+            typ2 = t['types'][col2]
+            if typ2 not in [int, float] and typ2 != 'bool':
+                raise Exception(f'Столбец {col2} не поддерживает арифметические операции')
+            c2 = column_values(t, idx2)
+        elif isinstance(col2, (int, float)):
+            c2 = repeat(col2, len(c1))
+        else:
+            raise Exception(f'Значение {col2!r} не поддерживает арифметические операции')
+        if _use_numpy(use_numpy, len(c1)):
+            res = _np_arith(_np_operand(c1), _np_operand(col2 if scalar else c2), op)
+            if res is not None:
+                _report_binop(op, started, res, col1, col2, scalar, _ARITH_FORMAT)
+                return res
+        if _dense_numeric(c1) and _dense_numeric(c2):
+            # числовые столбцы без пропусков: операция сразу над массивами
+            if op == 'div':
+                res = [a / b if b != 0 else None for a, b in zip(c1.data, c2.data)]
+            elif op in _ARITH_OPS:
+                res = list(map(_ARITH_OPS[op], c1.data, c2.data))
+            else:
+                res = [None] * len(c1)
+            _report_binop(op, started, res, col1, col2, scalar, _ARITH_FORMAT)
+            return res
         res = []
-        for r in t['rows']:
-            a = r[idx1]
-            b = r[idx2]
+        for a, b in zip(c1, c2):
             if a is None or b is None:
                 res.append(None)
                 continue
@@ -356,42 +2514,80 @@ def arith(t, col1, col2, op):
                     res.append(None)
             except:
                 res.append(None)
-        print(f'результат {op} столбцов {col1} и {col2}: {res}')
+        _report_binop(op, started, res, col1, col2, scalar, _ARITH_FORMAT)
         return res
     except ValueError:
         print('один из столбцов не найден')
     except Exception as e:
         print('ошибка при выполнении арифметической операции:', e)
 
+_ARITH_OPS = {'add': operator.add, 'sub': operator.sub, 'mul': operator.mul}
+
+# числовой типизированный столбец без пропусков
+def _dense_numeric(c):
+    return isinstance(c, Column) and c.kind in ('q', 'd') and c.valid is None
+
 # функции сравнения
-def eq(t, col1, col2):
-    return compare(t, col1, col2, 'eq')
+def eq(t, col1, col2=None, use_numpy=None, value=None):
+    return compare(t, col1, col2, 'eq', use_numpy, value)
 
-def gr(t, col1, col2):
-    return compare(t, col1, col2, 'gr')
+def gr(t, col1, col2=None, use_numpy=None, value=None):
+    return compare(t, col1, col2, 'gr', use_numpy, value)
 
-def ls(t, col1, col2):
-    return compare(t, col1, col2, 'ls')
+def ls(t, col1, col2=None, use_numpy=None, value=None):
+    return compare(t, col1, col2, 'ls', use_numpy, value)
 
-def ge(t, col1, col2):
-    return compare(t, col1, col2, 'ge')
+def ge(t, col1, col2=None, use_numpy=None, value=None):
+    return compare(t, col1, col2, 'ge', use_numpy, value)
 
-def le(t, col1, col2):
-    return compare(t, col1, col2, 'le')
+def le(t, col1, col2=None, use_numpy=None, value=None):
+    return compare(t, col1, col2, 'le', use_numpy, value)
 
-def ne(t, col1, col2):
-    return compare(t, col1, col2, 'ne')
+def ne(t, col1, col2=None, use_numpy=None, value=None):
+    return compare(t, col1, col2, 'ne', use_numpy, value)
 
-def compare(t, col1, col2, op):
+# col2 - имя столбца или значение (число, дата) для сравнения со скаляром
+# value - значение для сравнения при col2=None (в том числе строка: строковый col2 - всегда имя столбца)
+def compare(t, col1, col2, op, use_numpy=None, value=None):
     try:
+        started = time.perf_counter()
         idx1 = t['cols'].index(col1)
-        idx2 = t['cols'].index(col2)
         typ1 = t['types'][col1]
-        typ2 = t['types'][col2]
+        c1 = column_values(t, idx1)
+        if col2 is None:
+            col2 = value
+            scalar = True
+        else:
+            scalar = not isinstance(col2, str)
+        if scalar:
+            c2 = repeat(col2, len(c1))
+        else:
+            idx2 = t['cols'].index(col2)
+            typ2 = t['types'][col2]
+            c2 = column_values(t, idx2)
+        if isinstance(c1, Column) and c1.kind == 'c' and op in _CMP_OPS:
+            res = _compare_codes(c1, col2 if scalar else c2, op, scalar)
+            if res is not None:
+                _report_binop(op, started, res, col1, col2, scalar, _CMP_FORMAT)
+                return res
+        zm = _zone_map(t, idx1, build=True) if scalar and op in _CMP_OPS else None
+        if zm is not None:
+            res = _zone_compare(zm, c1, col2, op)
+            if res is not None:
+                _report_binop(op, started, res, col1, col2, scalar, _CMP_FORMAT)
+                return res
+        if _use_numpy(use_numpy, len(c1)) and op in _CMP_OPS:
+            res = _np_compare(_np_operand(c1), _np_operand(col2 if scalar else c2), op)
+            if res is not None:
+                _report_binop(op, started, res, col1, col2, scalar, _CMP_FORMAT)
+                return res
+        if _comparable_arrays(c1, c2) and op in _CMP_OPS:
+            # однотипные столбцы без пропусков: сравнение сразу над массивами
+            res = list(map(_CMP_OPS[op], c1.data, c2.data))
+            _report_binop(op, started, res, col1, col2, scalar, _CMP_FORMAT)
+            return res
         res = []
-        for r in t['rows']:
-            a = r[idx1]
-            b = r[idx2]
+        for a, b in zip(c1, c2):
             if a is None or b is None:
                 res.append(False)
                 continue
@@ -417,69 +2613,1287 @@ def compare(t, col1, col2, op):
                     res.append(a != b)
             except:
                 res.append(False)
-        print(f'результат сравнения {op} столбцов {col1} и {col2}: {res}')
+        _report_binop(op, started, res, col1, col2, scalar, _CMP_FORMAT)
         return res
     except ValueError:
         print('один из столбцов не найден')
     except Exception as e:
         print('ошибка при выполнении сравнения:', e)
 
+_CMP_OPS = {'eq': operator.eq, 'gr': operator.gt, 'ls': operator.lt,
+            'ge': operator.ge, 'le': operator.le, 'ne': operator.ne}
+
+# сравнение столбца со словарём по кодам: словарь упорядочивается, и порядок кодов совпадает с порядком строк
+# (со строкой или другим столбцом со словарём); None - сравнение по кодам невозможно
+def _compare_codes(c1, other, op, scalar):
+    if scalar:
+        if other is None:
+            return [False] * len(c1.data)
+        if not isinstance(other, str):
+            return None
+        c1.sort_categories()
+        codes = c1.data
+        lo = bisect_left(c1.categories, other)
+        hi = bisect_right(c1.categories, other)
+        if op == 'eq':
+            return list(map(lo.__eq__, codes)) if hi > lo else [False] * len(codes)
+        if op == 'ne':
+            return [k >= 0 and k != lo for k in codes] if hi > lo else [k >= 0 for k in codes]
+        if op == 'gr':
+            return [k >= hi for k in codes]
+        if op == 'ge':
+            return [k >= lo for k in codes]
+        if op == 'ls':
+            return [0 <= k < lo for k in codes]
+        return [0 <= k < hi for k in codes]
+    if not (isinstance(other, Column) and other.kind == 'c'):
+        return None
+    c1.sort_categories()
+    other.sort_categories()
+    codes = c1.data
+    _, (r1, r2) = _common_categories([c1, other])
+    a = codes if r1 is None else [r1[k] for k in codes]
+    b = other.data if r2 is None else [r2[k] for k in other.data]
+    fn = _CMP_OPS[op]
+    return [x >= 0 and y >= 0 and fn(x, y) for x, y in zip(a, b)]
+
+# сравнение столбца с константой по карте зон: блоки, где не подходит ни одна строка или подходят все,
+# не просматриваются; None - карта не помогает (больше половины строк пришлось бы проверять)
+def _zone_compare(zm, c, value, op):
+    states = zm.states(op, value)
+    if states is None:
+        return None
+    n = zm.n
+    block = zm.block
+    if sum(min(block, n - b * block) for b, s in enumerate(states) if s == 2) * 2 > n:
+        return None
+    fn = _CMP_OPS[op]
+    raw = None
+    if isinstance(c, Column) and c.kind in ('q', 'd', 't') and _zone_domain(value) == ('t' if c.kind == 't' else 'n'):
+        raw = (value - _EPOCH) // _US if c.kind == 't' else value
+    res = []
+    for b, s in enumerate(states):
+        lo = b * block
+        hi = min(lo + block, n)
+        if s != 2:
+            res.extend(repeat(s == 1, hi - lo))
+        elif raw is not None and not zm.nulls[b]:
+            res.extend(map(fn, c.data[lo:hi], repeat(raw, hi - lo)))
+        else:
+            res.extend([_cmp_value(a, value, fn) for a in c[lo:hi]])
+    return res
+
+# столбцы без пропусков, которые можно сравнивать напрямую по массивам
+def _comparable_arrays(c1, c2):
+    if not (isinstance(c1, Column) and isinstance(c2, Column)):
+        return False
+    if c1.valid is not None or c2.valid is not None:
+        return False
+    if c1.kind == 't' or c2.kind == 't':
+        return c1.kind == c2.kind
+    return c1.kind in ('q', 'd') and c2.kind in ('q', 'd')
+
+# минимальное число строк, с которого операции выполняются через numpy (если use_numpy не задан)
+NUMPY_MIN_ROWS = 1000
+
+# выбор векторного пути для операции над столбцами
+def _use_numpy(flag, n):
+    if flag is None:
+        return np is not None and n >= NUMPY_MIN_ROWS
+    if flag and np is None:
+        raise Exception('numpy не установлен')
+    return flag
+
+# операнд для numpy: (массив, маска пропусков или None, вид 'q'/'d'/'t') или None, если numpy не подходит
+def _np_operand(c):
+    if isinstance(c, Column) and c.kind in ('q', 'd', 't'):
+        arr = np.frombuffer(c.data, dtype=np.int64 if _typecode(c.data) == 'q' else np.float64)
+        mask = None
+        if c.valid is not None:
+            bits = np.unpackbits(np.frombuffer(bytes(c.valid), dtype=np.uint8), bitorder='little')
+            mask = bits[:len(c)] == 0
+        return arr, mask, c.kind
+    if isinstance(c, (list, Column)):
+        values = c.data if isinstance(c, Column) and c.kind == 'o' else c
+        kind = _values_kind(values)
+        if kind is None:
+            return None
+        try:
+            if kind == 't':
+                data = [(v - _EPOCH) // _US if v is not None else 0 for v in values]
+            else:
+                data = [v if v is not None else 0 for v in values]
+            arr = np.array(data, dtype=np.float64 if kind == 'd' else np.int64)
+        except (OverflowError, TypeError, ValueError):
+            return None
+        mask = np.array([v is None for v in values], dtype=bool)
+        return arr, (mask if mask.any() else None), kind
+    # скаляр
+    kind = _values_kind([c])
+    if kind is None:
+        return None
+    if kind == 't':
+        try:
+            return np.int64((c - _EPOCH) // _US), None, 't'
+        except (OverflowError, TypeError):
+            return None
+    if kind == 'q' and not -2**63 <= c < 2**63:
+        return None
+    return (np.float64(c) if kind == 'd' else np.int64(c)), None, kind
+
+# вид значений списка: 'q' - целые, 'd' - числа, 't' - даты, None - смешанные или другие
+def _values_kind(values):
+    kind = 'q'
+    for v in values:
+        if v is None or isinstance(v, (bool, int)):
+            continue
+        if isinstance(v, float):
+            if kind == 't':
+                return None
+            kind = 'd'
+        elif isinstance(v, datetime) and v.tzinfo is None:
+            if kind == 'd':
+                return None
+            kind = 't'
+        else:
+            return None
+    if kind == 't' and any(v is not None and not isinstance(v, datetime) for v in values):
+        return None
+    return kind
+
+# объединение масок пропусков
+def _np_mask(m1, m2):
+    if m1 is None:
+        return m2
+    if m2 is None:
+        return m1
+    return m1 | m2
+
+# векторная арифметика; None - результат нужно считать обычным циклом
+def _np_arith(a, b, op):
+    if a is None or b is None or op not in ('add', 'sub', 'mul', 'div'):
+        return None
+    x, mx, kx = a
+    y, my, ky = b
+    if kx == 't' or ky == 't':
+        return None
+    if x.size == 0:
+        return []
+    if kx == 'q' and ky == 'q' and op != 'div':
+        # int64 в numpy переполняется молча, а в python - нет
+        bx = max(abs(int(x.max())), abs(int(x.min())))
+        by = max(abs(int(np.max(y))), abs(int(np.min(y))))
+        if (bx * by if op == 'mul' else bx + by) >= 2**63:
+            return None
+    if op == 'div' and not (_np_float_exact(x, kx) and _np_float_exact(y, ky)):
+        # true_divide переводит int64 в float64, а python делит большие целые точно
+        return None
+    mask = _np_mask(mx, my)
+    with np.errstate(all='ignore'):
+        if op == 'add':
+            r = x + y
+        elif op == 'sub':
+            r = x - y
+        elif op == 'mul':
+            r = x * y
+        else:
+            zero = y == 0
+            r = np.true_divide(x, np.where(zero, 1, y))
+            if np.ndim(zero) == 0:
+                zero = np.full(x.shape, bool(zero))
+            mask = _np_mask(mask, zero)
+    if np.ndim(r) == 0:
+        r = np.full(x.shape, r)
+    res = r.tolist()
+    if mask is not None:
+        for i in np.flatnonzero(mask).tolist():
+            res[i] = None
+    return res
+
+_NP_CMP_OPS = {'eq': 'equal', 'gr': 'greater', 'ls': 'less', 'ge': 'greater_equal', 'le': 'less_equal', 'ne': 'not_equal'}
+
+# точно ли значения операнда вида kind переводятся в float64 (целые - только по модулю до 2**53)
+def _np_float_exact(x, kind):
+    if kind != 'q' or np.size(x) == 0:
+        return True
+    return max(abs(int(np.max(x))), abs(int(np.min(x)))) <= 2**53
+
+# векторное сравнение; None - результат нужно считать обычным циклом
+# целые сравниваются с целыми в int64; с дробными numpy сравнивает в float64, поэтому большие целые - циклом
+def _np_compare(a, b, op):
+    if a is None or b is None:
+        return None
+    x, mx, kx = a
+    y, my, ky = b
+    if (kx == 't') != (ky == 't'):
+        return None
+    if kx != ky and not (_np_float_exact(x, kx) and _np_float_exact(y, ky)):
+        return None
+    r = getattr(np, _NP_CMP_OPS[op])(x, y)
+    if np.ndim(r) == 0:
+        r = np.full(np.shape(x) or np.shape(y), bool(r))
+    mask = _np_mask(mx, my)
+    if mask is not None:
+        r &= ~mask
+    return r.tolist()
+
 # фильтрация строк
-def filter_rows(t, bool_list, copy_table=False):
+# view=True - вернуть представление отобранных строк, не меняя таблицу
+def filter_rows(t, bool_list, copy_table=False, view=False):
     try:
-        if len(bool_list) != len(t['rows']):
+        started = time.perf_counter()
+        if len(bool_list) != row_count(t):
             raise Exception('длина списка не совпадает с количеством строк')
         if copy_table:
-            new_rows = [r[:] for r, f in zip(t['rows'], bool_list) if f]
-            new_table = {'cols': t['cols'][:], 'types': t['types'].copy(), 'rows': new_rows}
-            print('фильтрованная копия таблицы:', new_table)
+            new_table = take_rows(t, [i for i, f in enumerate(bool_list) if f])
+            _report('filter_rows', started, len(bool_list), row_count(new_table), (), 'фильтрованная копия таблицы:', new_table)
             return new_table
+        elif view:
+            view_table = make_view(t, [i for i, f in enumerate(bool_list) if f])
+            _report('filter_rows', started, len(bool_list), row_count(view_table), (), 'отфильтрованные строки:', view_table)
+            return view_table
+        elif is_view(t):
+            # у представления сужается только набор номеров
+            sel = t['sel']
+            t['sel'] = array('q', [p for p, f in zip(sel, bool_list) if f])
+            _invalidate_indexes(t)
+            _report('filter_rows', started, len(bool_list), row_count(t), (), 'строки отфильтрованы:', t)
+        elif is_chunked(t):
+            # части заменяются представлениями отобранных строк
+            chunks = []
+            base = 0
+            for c in t['chunks']:
+                n = row_count(c)
+                positions = [i for i, f in enumerate(bool_list[base:base + n]) if f]
+                if len(positions) == n:
+                    chunks.append(c)
+                elif positions:
+                    chunks.append(make_view(c, positions))
+                base += n
+            with _CHUNKS_LOCK:
+                t['chunks'] = chunks
+            _invalidate_indexes(t)
+            _bump_version(t)
+            _report('filter_rows', started, len(bool_list), row_count(t), (), 'строки отфильтрованы:', t)
+        elif is_columnar(t):
+            positions = [i for i, f in enumerate(bool_list) if f]
+            t['columns'] = [c.take(positions) for c in t['columns']]
+            _invalidate_indexes(t)
+            _bump_version(t)
+            _report('filter_rows', started, len(bool_list), row_count(t), (), 'строки отфильтрованы:', t)
         else:
             t['rows'] = [r for r, f in zip(t['rows'], bool_list) if f]
-            print('строки отфильтрованы:', t)
+            _invalidate_indexes(t)
+            _bump_version(t)
+            _report('filter_rows', started, len(bool_list), row_count(t), (), 'строки отфильтрованы:', t)
     except Exception as e:
         print('ошибка при фильтрации строк:', e)
 
 # слияние таблиц
 def merge_tables(t1, t2, by_number=True):
     try:
+        started = time.perf_counter()
         if by_number:
             # слияние по номеру строки
-            max_len = max(len(t1['rows']), len(t2['rows']))
-            new_rows = []
-            for i in range(max_len):
-                row1 = t1['rows'][i] if i < len(t1['rows']) else [None]*len(t1['cols'])
-                row2 = t2['rows'][i] if i < len(t2['rows']) else [None]*len(t2['cols'])
-                merged_row = row1 + row2
-                new_rows.append(merged_row)
-            new_cols = t1['cols'] + t2['cols']
-            new_types = {**t1['types'], **t2['types']}
-            new_table = {'cols': new_cols, 'types': new_types, 'rows': new_rows}
-            print('таблицы слиты по номеру:', new_table)
+            n1 = row_count(t1)
+            n2 = row_count(t2)
+            max_len = max(n1, n2)
+            left = take_rows(t1, [i if i < n1 else -1 for i in range(max_len)], copy_table=False)
+            right = take_rows(t2, [i if i < n2 else -1 for i in range(max_len)], copy_table=False)
+            new_table = _hstack(left, right, range(len(t2['cols'])))
+            _report('merge_tables', started, n1 + n2, max_len, t1['cols'] + t2['cols'], 'таблицы слиты по номеру:', new_table)
             return new_table
         else:
-            # слияние по значению индекса (первый столбец)
-            idx1 = t1['cols'][0]
-            idx2 = t2['cols'][0]
-            dict1 = {r[0]: r for r in t1['rows']}
-            dict2 = {r[0]: r for r in t2['rows']}
-            all_keys = set(dict1.keys()).union(set(dict2.keys()))
-            new_cols = t1['cols'] + [col for col in t2['cols'] if col != idx2]
-            new_types = {**t1['types'], **{k: v for k, v in t2['types'].items() if k != idx2}}
-            new_rows = []
-            for key in all_keys:
-                row1 = dict1.get(key, [None]*len(t1['cols']))
-                row2 = dict2.get(key, [None]*len(t2['cols']))
-                merged_row = row1 + [v for i, v in enumerate(row2) if t2['cols'][i] != idx2]
-                new_rows.append(merged_row)
-            new_table = {'cols': new_cols, 'types': new_types, 'rows': new_rows}
-            print('таблицы слиты по индексу:', new_table)
+            # слияние по значению индекса (первый столбец): полное внешнее соединение
+            new_table = _join(t1, t2, 0, 0, 'outer')
+            _report('merge_tables', started, row_count(t1) + row_count(t2), row_count(new_table), [t1['cols'][0], t2['cols'][0]],
+                    'таблицы слиты по индексу:', new_table)
             return new_table
     except Exception as e:
         print('ошибка при слиянии таблиц:', e)
 
+# размер меньшей таблицы, начиная с которого вместо хэш-соединения используется соединение слиянием
+HASH_JOIN_MAX_ROWS = 5000000
+
+# соединение таблиц по ключевым столбцам
+# on (или left_on/right_on) - имя, номер или список столбцов (по умолчанию первый столбец)
+# how: 'inner', 'left', 'right', 'outer'; method: 'auto', 'hash', 'merge'
+# порядок строк не зависит от способа: строки левой таблицы по порядку, у каждой - пары из правой в её порядке,
+# затем строки правой таблицы без пары (для 'right' и 'outer') в её порядке
+def join_tables(t1, t2, on=None, how='inner', left_on=None, right_on=None, method='auto', suffix='_2'):
+    try:
+        started = time.perf_counter()
+        new_table = _join(t1, t2, on if left_on is None else left_on, on if right_on is None else right_on,
+                          how, method, suffix)
+        _report('join_tables', started, row_count(t1) + row_count(t2), row_count(new_table), new_table['cols'],
+                f'таблицы соединены ({how}):', new_table)
+        return new_table
+    except Exception as e:
+        print('ошибка при соединении таблиц:', e)
+
+def _join(t1, t2, left_on, right_on, how, method='auto', suffix='_2'):
+    if how not in ('inner', 'left', 'right', 'outer'):
+        raise Exception(f'Неизвестный вид соединения: {how}')
+    if method not in ('auto', 'hash', 'merge'):
+        raise Exception(f'Неизвестный способ соединения: {method}')
+    lkeys = _key_columns(t1, left_on)
+    rkeys = _key_columns(t2, right_on)
+    if len(lkeys) != len(rkeys):
+        raise Exception('разное количество ключевых столбцов')
+    codes = _code_keys(t1, t2, lkeys, rkeys)
+    if codes is not None:
+        lvals, rvals = codes
+    else:
+        lvals = _key_values(t1, lkeys)
+        rvals = _key_values(t2, rkeys)
+    if method == 'auto':
+        big = min(len(lvals), len(rvals)) > HASH_JOIN_MAX_ROWS
+        method = 'merge' if big or (_keys_sorted(lvals) and _keys_sorted(rvals)) else 'hash'
+    lpos = rpos = None
+    if method == 'merge':
+        try:
+            lpos, rpos = _merge_join(lvals, rvals, how)
+        except TypeError:
+            # ключи разных типов нельзя упорядочить - остаётся хэш-соединение
+            pass
+    if lpos is None:
+        if codes is not None:
+            lpos, rpos = _hash_join(lvals, rvals, how)
+        else:
+            lpos, rpos = _hash_join(lvals, rvals, how, _prebuilt_hash(t1, lkeys), _prebuilt_hash(t2, rkeys))
+    return _join_result(t1, t2, lkeys, rkeys, lpos, rpos, suffix)
+
+# номера ключевых столбцов
+def _key_columns(t, on):
+    if on is None:
+        return [0]
+    if isinstance(on, (list, tuple)):
+        return [_column_index(t, c) for c in on]
+    return [_column_index(t, on)]
+
+# значения ключа по строкам (кортежи для нескольких столбцов, None - ключ с пропуском)
+def _key_values(t, keys):
+    if len(keys) == 1:
+        return list(column_values(t, keys[0]))
+    return [k if None not in k else None for k in zip(*[column_values(t, i) for i in keys])]
+
+# ключи-коды для соединения по столбцам со словарями: коды обеих таблиц приводятся к общему словарю
+# (он упорядочен, так что годится и для соединения слиянием); None - ключ не из столбцов со словарями
+def _code_keys(t1, t2, lkeys, rkeys):
+    if len(lkeys) != 1:
+        return None
+    c1 = column_values(t1, lkeys[0])
+    c2 = column_values(t2, rkeys[0])
+    if not (isinstance(c1, Column) and isinstance(c2, Column) and c1.kind == 'c' and c2.kind == 'c'):
+        return None
+    c1.sort_categories()
+    c2.sort_categories()
+    _, recodes = _common_categories([c1, c2])
+    keys = []
+    for c, recode in zip((c1, c2), recodes):
+        table = (recode or list(range(len(c.categories))) + [-1])[:-1] + [None]
+        keys.append(list(map(table.__getitem__, c.data)))
+    return keys
+
+# упорядочены ли ключи по неубыванию (пропуски не учитываются)
+def _keys_sorted(vals):
+    prev = None
+    try:
+        for v in vals:
+            if v is None:
+                continue
+            if prev is not None and v < prev:
+                return False
+            prev = v
+    except TypeError:
+        return False
+    return True
+
+# готовый хэш-индекс таблицы по ключевому столбцу, если он уже построен
+def _prebuilt_hash(t, keys):
+    if len(keys) != 1:
+        return None
+    index = t.get('indexes', {}).get((keys[0], 'hash'))
+    if index is None or index.n != row_count(t):
+        return None
+    return index.map
+
+# хэш-соединение: хэш-таблица строится по меньшей таблице, большая просматривается по порядку
+# (порядок строк результата - как у join_tables при любой стороне построения)
+def _hash_join(lvals, rvals, how, lmap=None, rmap=None):
+    keep_left = how in ('left', 'outer')
+    keep_right = how in ('right', 'outer')
+    build_left = len(lvals) < len(rvals)
+    build = lvals if build_left else rvals
+    table = lmap if build_left else rmap
+    if table is None:
+        table = {}
+        for i, k in enumerate(build):
+            if k is None:
+                continue
+            hits = table.get(k)
+            if hits is None:
+                table[k] = [i]
+            else:
+                hits.append(i)
+    lpos = []
+    rpos = []
+    if not build_left:
+        # левая таблица просматривается по порядку: пары сразу в нужном порядке
+        matched = bytearray(len(rvals)) if keep_right else None
+        for i, k in enumerate(lvals):
+            hits = table.get(k) if k is not None else None
+            if hits:
+                lpos.extend([i] * len(hits))
+                rpos.extend(hits)
+                if matched is not None:
+                    for j in hits:
+                        matched[j] = 1
+            elif keep_left:
+                lpos.append(i)
+                rpos.append(-1)
+        rest = [j for j, m in enumerate(matched) if not m] if keep_right else []
+    else:
+        # просматривается правая таблица: пары собираются по строкам левой и выводятся в её порядке
+        pairs = [None] * len(lvals)
+        rest = []
+        for j, k in enumerate(rvals):
+            hits = table.get(k) if k is not None else None
+            if hits:
+                for i in hits:
+                    if pairs[i] is None:
+                        pairs[i] = [j]
+                    else:
+                        pairs[i].append(j)
+            elif keep_right:
+                rest.append(j)
+        for i, group in enumerate(pairs):
+            if group is not None:
+                lpos.extend([i] * len(group))
+                rpos.extend(group)
+            elif keep_left:
+                lpos.append(i)
+                rpos.append(-1)
+    lpos.extend([-1] * len(rest))
+    rpos.extend(rest)
+    return lpos, rpos
+
+# соединение слиянием: обе стороны упорядочиваются по ключу (для упорядоченных данных сортировка линейна),
+# пары затем переставляются в порядок строк результата join_tables
+def _merge_join(lvals, rvals, how):
+    keep_left = how in ('left', 'outer')
+    keep_right = how in ('right', 'outer')
+    lord = sorted((i for i, k in enumerate(lvals) if k is not None), key=lvals.__getitem__)
+    rord = sorted((i for i, k in enumerate(rvals) if k is not None), key=rvals.__getitem__)
+    lpos = []
+    rpos = []
+    i = j = 0
+    nl = len(lord)
+    nr = len(rord)
+    while i < nl and j < nr:
+        a = lvals[lord[i]]
+        b = rvals[rord[j]]
+        if a < b:
+            if keep_left:
+                lpos.append(lord[i])
+                rpos.append(-1)
+            i += 1
+        elif b < a:
+            if keep_right:
+                lpos.append(-1)
+                rpos.append(rord[j])
+            j += 1
+        else:
+            # группы одинаковых ключей с обеих сторон
+            i2 = i + 1
+            while i2 < nl and lvals[lord[i2]] == a:
+                i2 += 1
+            j2 = j + 1
+            while j2 < nr and rvals[rord[j2]] == b:
+                j2 += 1
+            group = rord[j:j2]
+            for x in lord[i:i2]:
+                lpos.extend([x] * len(group))
+                rpos.extend(group)
+            i, j = i2, j2
+    if keep_left:
+        rest = lord[i:] + [k for k, v in enumerate(lvals) if v is None]
+        lpos.extend(rest)
+        rpos.extend([-1] * len(rest))
+    if keep_right:
+        rest = rord[j:] + [k for k, v in enumerate(rvals) if v is None]
+        lpos.extend([-1] * len(rest))
+        rpos.extend(rest)
+    # сортировка устойчива, поэтому пары одной левой строки остаются в порядке правой таблицы
+    order = sorted((p for p, i in enumerate(lpos) if i >= 0), key=lpos.__getitem__)
+    rest = sorted(r for i, r in zip(lpos, rpos) if i < 0)
+    return [lpos[p] for p in order] + [-1] * len(rest), [rpos[p] for p in order] + rest
+
+# сборка результата соединения: столбцы левой таблицы и неключевые столбцы правой
+def _join_result(t1, t2, lkeys, rkeys, lpos, rpos, suffix):
+    keep = [i for i in range(len(t2['cols'])) if i not in rkeys]
+    used = set(t1['cols'])
+    names = []
+    for i, c in enumerate(t2['cols']):
+        if i in keep and c in used:
+            c += suffix
+        names.append(c)
+    left = take_rows(t1, lpos, copy_table=False)
+    right = take_rows(t2, rpos, copy_table=False)
+    right['cols'] = names
+    right['types'] = {n: t2['types'][c] for n, c in zip(names, t2['cols']) if c in t2['types']}
+    new = _hstack(left, right, keep)
+    # для строк только из правой таблицы ключ берётся из неё
+    for lk, rk in zip(lkeys, rkeys):
+        rcol = column_values(t2, rk)
+        target = new['columns'][lk] if is_columnar(new) else None
+        for j, (a, b) in enumerate(zip(lpos, rpos)):
+            if a < 0 <= b:
+                if target is not None:
+                    target[j] = rcol[b]
+                else:
+                    new['rows'][j][lk] = rcol[b]
+    return new
+
+# соединение столбцов двух таблиц одинаковой длины (из правой берутся столбцы keep)
+def _hstack(left, right, keep):
+    right_cols = [right['cols'][i] for i in keep]
+    new_cols = left['cols'] + right_cols
+    new_types = {**left['types'], **{c: right['types'][c] for c in right_cols if c in right['types']}}
+    if is_columnar(left):
+        right = to_columnar(right)
+        columns = left['columns'] + [right['columns'][i] for i in keep]
+        return {'cols': new_cols, 'types': new_types, 'columns': columns}
+    right = to_rows(right)
+    new_rows = [r1 + [r2[i] for i in keep] for r1, r2 in zip(left['rows'], right['rows'])]
+    return {'cols': new_cols, 'types': new_types, 'rows': new_rows}
+
+# приближённый подсчёт различных значений (HyperLogLog, 2^p регистров, ошибка около 1.04/sqrt(2^p))
+# хэш не зависит от процесса, поэтому состояния частей, посчитанных в разных процессах, можно объединять
+class HyperLogLog:
+    __slots__ = ('p', 'registers')
+
+    def __init__(self, p=12, registers=None):
+        self.p = p
+        self.registers = registers if registers is not None else bytearray(1 << p)
+
+    def add(self, v):
+        h = int.from_bytes(hashlib.blake2b(repr(v).encode(), digest_size=8).digest(), 'little')
+        i = h >> (64 - self.p)
+        rest = h & ((1 << (64 - self.p)) - 1)
+        rank = 64 - self.p - rest.bit_length() + 1
+        if rank > self.registers[i]:
+            self.registers[i] = rank
+
+    def merge(self, other):
+        regs = self.registers
+        for i, r in enumerate(other.registers):
+            if r > regs[i]:
+                regs[i] = r
+
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        e = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if e <= 2.5 * m and zeros:
+            # малые количества: линейный подсчёт по пустым регистрам
+            e = m * math.log(m / zeros)
+        return round(e)
+
+    def __reduce__(self):
+        return HyperLogLog, (self.p, self.registers)
+
+# функции агрегации: count, sum, min, max, mean, approx_distinct (столбец '*' для count - все строки)
+AGG_FUNCS = ('count', 'sum', 'min', 'max', 'mean', 'approx_distinct')
+
+# группировка: group_by(t, keys).agg(имя=(столбец, функция), ...)
+# t - таблица или последовательность таблиц (части load_table_iter, результаты параллельной загрузки);
+# каждая часть сворачивается в частичный результат, частичные результаты объединяются
+class GroupBy:
+    def __init__(self, source, keys):
+        self.source = source
+        self.keys = keys if isinstance(keys, (list, tuple)) else [keys]
+
+    def agg(self, *specs, **named):
+        try:
+            started = time.perf_counter()
+            specs = _agg_specs(specs, named)
+            chunks = [self.source] if isinstance(self.source, dict) else self.source
+            result = None
+            rows_in = 0
+            for t in chunks:
+                rows_in += row_count(t)
+                part = partial_agg(t, self.keys, specs)
+                result = part if result is None else merge_partials(result, part)
+            if result is None:
+                raise Exception('нет данных для группировки')
+            new_table = finish_agg(result)
+            _report('group_by', started, rows_in, row_count(new_table), new_table['cols'], 'результат группировки:', new_table)
+            return new_table
+        except Exception as e:
+            print('ошибка при группировке:', e)
+
+# группировка таблицы по столбцам keys (имена или номера)
+def group_by(t, keys):
+    return GroupBy(t, keys)
+
+# разбор описаний агрегатов: (столбец, функция) -> имя 'столбец_функция', либо имя=(столбец, функция)
+def _agg_specs(specs, named):
+    out = [(f"{col}_{fn}" if col != '*' else fn, col, fn) for col, fn in specs]
+    out += [(name, col, fn) for name, (col, fn) in named.items()]
+    if not out:
+        raise Exception('не заданы агрегаты')
+    for name, col, fn in out:
+        if fn not in AGG_FUNCS:
+            raise Exception(f'Неизвестная функция агрегации: {fn}')
+        if col == '*' and fn != 'count':
+            raise Exception(f'Функция {fn} требует столбец')
+    return out
+
+# частичный результат группировки одной таблицы: ключи групп и состояния агрегатов по номеру группы
+# (состояния - простые значения, списки и HyperLogLog, их можно передавать между процессами)
+def partial_agg(t, keys, specs):
+    key_idx = [_column_index(t, k) for k in keys]
+    n = row_count(t)
+    # номер группы для каждой строки (один проход по ключам)
+    groups = {}
+    if len(key_idx) == 1:
+        kv = column_values(t, key_idx[0])
+        gids = [groups.setdefault(k, len(groups)) for k in kv]
+        group_keys = [(k,) for k in groups]
+    else:
+        kvs = [column_values(t, i) for i in key_idx]
+        gids = [groups.setdefault(k, len(groups)) for k in zip(*kvs)]
+        group_keys = list(groups)
+    m = len(group_keys)
+    states = []
+    for name, col, fn in specs:
+        if col == '*':
+            counts = [0] * m
+            for g in gids:
+                counts[g] += 1
+            states.append(counts)
+            continue
+        idx = _column_index(t, col)
+        typ = t['types'].get(t['cols'][idx])
+        if fn in ('sum', 'mean') and typ not in (int, float, 'bool'):
+            raise Exception(f'Столбец {col} не поддерживает функцию {fn}')
+        vals = column_values(t, idx)
+        if isinstance(vals, Column) and vals.kind in 'qd' and vals.valid is None:
+            vals = vals.data
+        states.append(_AGG_KERNELS[fn](gids, vals, m))
+    return {'keys': group_keys, 'key_names': [t['cols'][i] for i in key_idx],
+            'key_types': [t['types'].get(t['cols'][i]) for i in key_idx],
+            'specs': specs, 'types': [_agg_type(t, col, fn) for _, col, fn in specs], 'states': states}
+
+# тип результата агрегата
+def _agg_type(t, col, fn):
+    if fn in ('count', 'approx_distinct'):
+        return int
+    if fn == 'mean':
+        return float
+    typ = t['types'].get(t['cols'][_column_index(t, col)])
+    return int if typ == 'bool' else typ
+
+def _agg_count(gids, vals, m):
+    out = [0] * m
+    for g, v in zip(gids, vals):
+        if v is not None:
+            out[g] += 1
+    return out
+
+def _agg_sum(gids, vals, m):
+    out = [None] * m
+    for g, v in zip(gids, vals):
+        if v is not None:
+            s = out[g]
+            out[g] = v if s is None else s + v
+    return out
+
+def _agg_min(gids, vals, m):
+    out = [None] * m
+    for g, v in zip(gids, vals):
+        if v is not None:
+            s = out[g]
+            if s is None or v < s:
+                out[g] = v
+    return out
+
+def _agg_max(gids, vals, m):
+    out = [None] * m
+    for g, v in zip(gids, vals):
+        if v is not None:
+            s = out[g]
+            if s is None or v > s:
+                out[g] = v
+    return out
+
+# среднее хранится как пара [сумма, количество]
+def _agg_mean(gids, vals, m):
+    out = [[0, 0] for _ in range(m)]
+    for g, v in zip(gids, vals):
+        if v is not None:
+            s = out[g]
+            s[0] += v
+            s[1] += 1
+    return out
+
+def _agg_distinct(gids, vals, m):
+    out = [HyperLogLog() for _ in range(m)]
+    for g, v in zip(gids, vals):
+        if v is not None:
+            out[g].add(v)
+    return out
+
+_AGG_KERNELS = {'count': _agg_count, 'sum': _agg_sum, 'min': _agg_min, 'max': _agg_max,
+                'mean': _agg_mean, 'approx_distinct': _agg_distinct}
+
+# объединение двух состояний одного агрегата
+def _merge_state(fn, a, b):
+    if fn == 'count':
+        return a + b
+    if fn == 'mean':
+        return [a[0] + b[0], a[1] + b[1]]
+    if fn == 'approx_distinct':
+        a.merge(b)
+        return a
+    if a is None:
+        return b
+    if b is None:
+        return a
+    if fn == 'sum':
+        return a + b
+    if fn == 'min':
+        return b if b < a else a
+    return b if b > a else a
+
+# объединение частичных результатов (результат пишется в a)
+def merge_partials(a, b):
+    if a['specs'] != b['specs'] or a['key_names'] != b['key_names']:
+        raise Exception('частичные результаты посчитаны для разных группировок')
+    pos = {k: i for i, k in enumerate(a['keys'])}
+    funcs = [fn for _, _, fn in a['specs']]
+    for j, k in enumerate(b['keys']):
+        i = pos.get(k)
+        if i is None:
+            pos[k] = len(a['keys'])
+            a['keys'].append(k)
+            for sa, sb in zip(a['states'], b['states']):
+                sa.append(sb[j])
+        else:
+            for fn, sa, sb in zip(funcs, a['states'], b['states']):
+                sa[i] = _merge_state(fn, sa[i], sb[j])
+    return a
+
+# итоговая таблица из частичного результата
+def finish_agg(part):
+    columns = [list(c) for c in zip(*part['keys'])] if part['keys'] else [[] for _ in part['key_names']]
+    for (name, col, fn), states in zip(part['specs'], part['states']):
+        if fn == 'mean':
+            columns.append([s / c if c else None for s, c in states])
+        elif fn == 'approx_distinct':
+            columns.append([h.estimate() for h in states])
+        else:
+            columns.append(states)
+    cols = part['key_names'] + [name for name, _, _ in part['specs']]
+    types = dict(zip(cols, part['key_types'] + part['types']))
+    return {'cols': cols, 'types': types, 'rows': [list(r) for r in zip(*columns)]}
+
+# сколько строк сортируется в памяти; при большем количестве отсортированные части выгружаются во временные файлы
+SORT_MEMORY_ROWS = 1000000
+
+# сортировка таблицы по столбцам by (имена или номера)
+# descending - общий флаг или список флагов по столбцам; nulls_last - пропуски в конце (иначе в начале)
+# t - таблица или последовательность таблиц-частей; если строк больше memory_rows, отсортированные куски
+# выгружаются во временные файлы и сливаются, результат - поток таблиц по chunk_size строк
+# (его можно передать в save_table или group_by), иначе - отсортированная таблица
+def sort_table(t, by, descending=False, nulls_last=True, memory_rows=None, chunk_size=100000, tmp_dir=None):
+    try:
+        started = time.perf_counter()
+        by = by if isinstance(by, (list, tuple)) else [by]
+        desc = list(descending) if isinstance(descending, (list, tuple)) else [descending] * len(by)
+        if len(desc) != len(by):
+            raise Exception('количество флагов descending не совпадает с количеством столбцов')
+        limit = memory_rows or SORT_MEMORY_ROWS
+        if isinstance(t, dict) and row_count(t) <= limit:
+            keys = [_column_index(t, c) for c in by]
+            order = _sort_positions([column_values(t, i) for i in keys], row_count(t), desc, nulls_last)
+            new_table = take_rows(t, order)
+            _report('sort_table', started, row_count(t), len(order), [t['cols'][i] for i in keys],
+                    'отсортированная таблица:', new_table)
+            return new_table
+        stream = _external_sort([t] if isinstance(t, dict) else t, by, desc, nulls_last, limit, chunk_size, tmp_dir)
+        _report('sort_table', started, 0, 0, by, 'сортировка с выгрузкой на диск')
+        return stream
+    except Exception as e:
+        print('ошибка при сортировке:', e)
+
+# ключ пропуска: в сочетании с направлением сортировки ставит None в начало или в конец
+def _null_first_flag(desc, nulls_last):
+    return nulls_last != desc
+
+# порядок строк по заранее выбранным столбцам ключей
+# при одинаковом направлении - одна сортировка по кортежу, иначе - устойчивые сортировки от младшего ключа
+def _sort_positions(key_cols, n, desc, nulls_last):
+    order = list(range(n))
+    try:
+        if len(set(desc)) == 1:
+            flag = _null_first_flag(desc[0], nulls_last)
+            if len(key_cols) == 1:
+                vals = key_cols[0]
+                order.sort(key=lambda i: ((vals[i] is None) == flag, vals[i]), reverse=desc[0])
+            else:
+                keys = [tuple(((v is None) == flag, v) for v in r) for r in zip(*key_cols)]
+                order.sort(key=keys.__getitem__, reverse=desc[0])
+            return order
+        for vals, d in reversed(list(zip(key_cols, desc))):
+            flag = _null_first_flag(d, nulls_last)
+            order.sort(key=lambda i: ((vals[i] is None) == flag, vals[i]), reverse=d)
+        return order
+    except TypeError:
+        raise Exception('значения столбца нельзя упорядочить (разные типы)')
+
+# ключ строки для слияния отсортированных кусков (направление задаётся для каждого столбца)
+class _RowKey:
+    __slots__ = ('key',)
+    desc = ()
+
+    def __init__(self, key):
+        self.key = key
+
+    def __lt__(self, other):
+        for a, b, d in zip(self.key, other.key, self.desc):
+            if a != b:
+                return a > b if d else a < b
+        return False
+
+    # равенство нужно heapq.merge, чтобы при равных ключах сохранялся порядок кусков
+    def __eq__(self, other):
+        return self.key == other.key
+
+# внешняя сортировка: куски по limit строк сортируются в памяти и пишутся во временные файлы
+# временные файлы кусков удаляются вместе с потоком (weakref.finalize), даже если его не читали,
+# и сразу при ошибке во время записи кусков
+def _external_sort(chunks, by, desc, nulls_last, limit, chunk_size, tmp_dir):
+    runs = []
+    buf = []
+    head = None
+    try:
+        for t in chunks:
+            if head is None:
+                head = {'cols': t['cols'], 'types': t['types']}
+                keys = [_column_index(t, c) for c in by]
+            elif t['cols'] != head['cols']:
+                raise Exception('части имеют разные колонки')
+            buf.extend(iter_rows(t))
+            while len(buf) >= limit:
+                runs.append(_write_run(buf[:limit], keys, desc, nulls_last, tmp_dir))
+                del buf[:limit]
+        if head is None:
+            raise Exception('нет данных для сортировки')
+        if not runs:
+            order = _sort_positions([[r[i] for r in buf] for i in keys], len(buf), desc, nulls_last)
+            return _sorted_chunks(head, [buf[i] for i in order], chunk_size)
+        if buf:
+            runs.append(_write_run(buf, keys, desc, nulls_last, tmp_dir))
+    except BaseException:
+        _remove_runs(runs)
+        raise
+    del buf
+    stream = _merge_runs(head, runs, keys, desc, nulls_last, chunk_size)
+    weakref.finalize(stream, _remove_runs, runs)
+    return stream
+
+# удаление временных файлов кусков (повторный вызов ничего не делает)
+def _remove_runs(runs):
+    for p in runs:
+        try:
+            os.remove(p)
+        except FileNotFoundError:
+            pass
+    runs.clear()
+
+# запись отсортированного куска пачками (pickle подряд)
+def _write_run(rows, keys, desc, nulls_last, tmp_dir, batch=10000):
+    order = _sort_positions([[r[i] for r in rows] for i in keys], len(rows), desc, nulls_last)
+    fd, path = tempfile.mkstemp(suffix='.run', dir=tmp_dir)
+    with os.fdopen(fd, 'wb') as file:
+        for i in range(0, len(order), batch):
+            pickle.dump([rows[j] for j in order[i:i + batch]], file, pickle.HIGHEST_PROTOCOL)
+    return path
+
+# чтение строк куска
+def _read_run(path):
+    with open(path, 'rb') as file:
+        while True:
+            try:
+                batch = pickle.load(file)
+            except EOFError:
+                return
+            yield from batch
+
+# слияние кусков (heapq, k-way); временные файлы удаляются после чтения, при закрытии или удалении потока
+def _merge_runs(head, runs, keys, desc, nulls_last, chunk_size):
+    key_type = type('_Key', (_RowKey,), {'desc': tuple(desc)})
+    flags = [_null_first_flag(d, nulls_last) for d in desc]
+
+    def row_key(r):
+        return key_type(tuple(((r[i] is None) == f, r[i]) for i, f in zip(keys, flags)))
+
+    try:
+        merged = heapq.merge(*[_read_run(p) for p in runs], key=row_key)
+        yield from _sorted_chunks(head, merged, chunk_size)
+    finally:
+        _remove_runs(runs)
+
+# нарезка потока строк на таблицы по chunk_size строк
+def _sorted_chunks(head, rows, chunk_size):
+    rows = iter(rows)
+    while True:
+        part = list(islice(rows, chunk_size))
+        if not part:
+            return
+        yield {'cols': head['cols'], 'types': head['types'], 'rows': part}
+
+# ленивый запрос: шаги (фильтры, вычисляемые столбцы, выбор столбцов, ограничение) записываются в план
+# и выполняются за один проход при collect(); фильтры и выбор столбцов передаются в чтение файлов
+class Query:
+    def __init__(self, source, sample_size=1000):
+        self.source = source
+        self.sample_size = sample_size
+        self.steps = []
+
+    def _add(self, step):
+        q = Query(self.source, self.sample_size)
+        q.steps = self.steps + [step]
+        return q
+
+    # фильтр col1 op col2 (столбец) или col1 op value (значение)
+    def filter(self, col1, op, col2=None, value=None):
+        if op not in _CMP_OPS:
+            raise Exception(f'Неизвестная операция сравнения: {op}')
+        return self._add(('filter', col1, op, col2, value))
+
+    # вычисляемый столбец name = col1 op col2 (или value)
+    def derive(self, name, col1, op, col2=None, value=None):
+        if op not in ('add', 'sub', 'mul', 'div'):
+            raise Exception(f'Неизвестная арифметическая операция: {op}')
+        return self._add(('derive', name, col1, op, col2, value))
+
+    def select(self, *cols):
+        return self._add(('select', list(cols)))
+
+    def limit(self, n):
+        return self._add(('limit', n))
+
+    # описание оптимизированного плана
+    def explain(self):
+        plan = self._plan()
+        lines = [f"чтение {self._source_name()} столбцы: {', '.join(plan['scan'])}"]
+        for step in plan['pushed']:
+            lines.append('  фильтр при чтении: ' + _step_text(step))
+        for step in plan['steps']:
+            lines.append(_step_text(step))
+        return '\n'.join(lines)
+
+    # выполнение плана
+    def collect(self, columnar=False):
+        try:
+            started = time.perf_counter()
+            plan = self._plan()
+            types = {}
+            widened = set()
+            rows = self._scan(plan, types, widened)
+            names = list(plan['scan'])
+            for step in plan['steps']:
+                rows, names = _apply_step(rows, names, step)
+            rows = list(rows)
+            # типы источника известны только после чтения
+            for step in plan['steps']:
+                if step[0] == 'derive':
+                    name, col1, op, col2, value = step[1:]
+                    t2 = types.get(col2) if col2 is not None else type(value)
+                    types[name] = float if op == 'div' or float in (types.get(col1), t2) else int
+            for c in widened:
+                if c in names and types.get(c) is not None:
+                    i = names.index(c)
+                    for r in rows:
+                        r[i] = _cast_value(r[i], types[c])
+            t = {'cols': names, 'types': {c: types[c] for c in names if c in types}, 'rows': rows}
+            if columnar:
+                t = to_columnar(t)
+            _report('query', started, 0, len(rows), names, 'результат запроса:', t)
+            return t
+        except Exception as e:
+            print('ошибка при выполнении запроса:', e)
+
+    def _source_name(self):
+        if isinstance(self.source, dict):
+            return 'таблицы'
+        return ', '.join(self.source)
+
+    # столбцы источника
+    def _source_cols(self):
+        if isinstance(self.source, dict):
+            return list(self.source['cols'])
+        f = self.source[0]
+        if _file_format(f) == '.csv':
+            with open_file(f, 'r') as file:
+                return next(csv.reader(file))
+        if _file_format(f) == '.tbl':
+            return _tbl_cols(f)
+        if _file_format(f) == '.pkl':
+            with open_file(f, 'rb') as file:
+                return list(pickle.load(file)['cols'])
+        raise Exception(f'Неподдерживаемый формат файла: {f}')
+
+    # оптимизация: слияние фильтров и перенос их в чтение, удаление ненужных вычислений, выбор читаемых столбцов
+    def _plan(self):
+        source = self._source_cols()
+        avail = list(source)
+        for step in self.steps:
+            for c in _step_refs(step):
+                if c not in avail:
+                    raise Exception(f'Столбец {c} не найден')
+            if step[0] == 'derive' and step[1] not in avail:
+                avail.append(step[1])
+            elif step[0] == 'select':
+                avail = list(step[1])
+        pushed = []
+        rest = []
+        derived = set()
+        blocked = False
+        for step in self.steps:
+            if step[0] == 'filter' and not blocked and not set(_step_refs(step)) & derived:
+                pushed.append(step)
+                continue
+            if step[0] == 'limit':
+                blocked = True
+            elif step[0] == 'derive':
+                derived.add(step[1])
+            rest.append(step)
+        needed = set(avail)
+        steps = []
+        for step in reversed(rest):
+            if step[0] == 'derive':
+                if step[1] not in needed:
+                    continue
+                needed.discard(step[1])
+            needed.update(_step_refs(step))
+            steps.append(step)
+        steps.reverse()
+        return {'scan': [c for c in source if c in needed], 'pushed': pushed, 'steps': steps}
+
+    # чтение источника: строки нужных столбцов, прошедшие перенесённые фильтры
+    def _scan(self, plan, types, widened):
+        if isinstance(self.source, dict):
+            return _scan_table(self.source, plan, types)
+        return _scan_files(self.source, plan, types, widened, self.sample_size)
+
+# запрос к файлам
+def scan(*files, sample_size=1000):
+    return Query(files, sample_size)
+
+# запрос к загруженной таблице
+def query(t):
+    return Query(t)
+
+# столбцы, на которые ссылается шаг плана
+def _step_refs(step):
+    if step[0] == 'filter':
+        return [step[1]] + ([step[3]] if step[3] is not None else [])
+    if step[0] == 'derive':
+        return [step[2]] + ([step[4]] if step[4] is not None else [])
+    if step[0] == 'select':
+        return list(step[1])
+    return []
+
+def _step_text(step):
+    if step[0] == 'filter':
+        return f'фильтр {step[1]} {step[2]} ' + (step[3] if step[3] is not None else repr(step[4]))
+    if step[0] == 'derive':
+        return f'столбец {step[1]} = {step[2]} {step[3]} ' + (step[4] if step[4] is not None else repr(step[5]))
+    if step[0] == 'select':
+        return 'выбор ' + ', '.join(step[1])
+    return f'ограничение {step[1]}'
+
+# сравнение двух значений по правилам compare
+def _cmp_value(a, b, fn):
+    if a is None or b is None:
+        return False
+    try:
+        if isinstance(a, datetime) and isinstance(b, datetime):
+            pass
+        elif isinstance(a, (int, float, bool)) and isinstance(b, (int, float, bool)):
+            pass
+        else:
+            a = str(a)
+            b = str(b)
+        return fn(a, b)
+    except:
+        return False
+
+# арифметика над двумя значениями по правилам arith
+def _arith_value(a, b, op):
+    if a is None or b is None:
+        return None
+    try:
+        if op == 'div':
+            return a / b if b != 0 else None
+        return _ARITH_OPS[op](a, b)
+    except:
+        return None
+
+# приведение значения к расширенному типу столбца
+def _cast_value(v, typ):
+    if v is None or typ in (int, 'datetime'):
+        return v
+    if typ == float:
+        return float(v) if isinstance(v, (int, float)) else v
+    if isinstance(v, datetime):
+        return v.strftime(DATETIME_FORMAT)
+    return str(v)
+
+# выполнение одного шага плана над потоком строк
+def _apply_step(rows, names, step):
+    kind = step[0]
+    if kind == 'filter':
+        i = names.index(step[1])
+        fn = _CMP_OPS[step[2]]
+        if step[3] is not None:
+            j = names.index(step[3])
+            return (r for r in rows if _cmp_value(r[i], r[j], fn)), names
+        value = step[4]
+        return (r for r in rows if _cmp_value(r[i], value, fn)), names
+    if kind == 'derive':
+        name, col1, op, col2, value = step[1:]
+        i = names.index(col1)
+        j = names.index(col2) if col2 is not None else None
+        if name in names:
+            k = names.index(name)
+
+            def put(r, v, k=k):
+                r[k] = v
+                return r
+        else:
+            names = names + [name]
+
+            def put(r, v):
+                r.append(v)
+                return r
+        if j is None:
+            return (put(r, _arith_value(r[i], value, op)) for r in rows), names
+        return (put(r, _arith_value(r[i], r[j], op)) for r in rows), names
+    if kind == 'select':
+        idx = [names.index(c) for c in step[1]]
+        return ([r[i] for i in idx] for r in rows), list(step[1])
+    return islice(rows, step[1]), names
+
+# чтение таблицы в памяти: перенесённые фильтры считаются по столбцам, строки собираются только для прошедших
+def _scan_table(t, plan, types):
+    for c in plan['scan']:
+        types[c] = t['types'].get(c)
+    positions = range(row_count(t))
+    for step in plan['pushed']:
+        a = column_values(t, _column_index(t, step[1]))
+        fn = _CMP_OPS[step[2]]
+        if step[3] is not None:
+            b = column_values(t, _column_index(t, step[3]))
+            positions = [i for i in positions if _cmp_value(a[i], b[i], fn)]
+        else:
+            value = step[4]
+            zm = _zone_map(t, _column_index(t, step[1]))
+            states = zm.states(step[2], value) if zm is not None else None
+            if states is not None and isinstance(positions, range):
+                # по карте зон просматриваются только блоки, где подходит часть строк
+                kept = []
+                for b, s in enumerate(states):
+                    block = range(b * zm.block, min((b + 1) * zm.block, zm.n))
+                    if s == 1:
+                        kept.extend(block)
+                    elif s == 2:
+                        kept.extend(i for i in block if _cmp_value(a[i], value, fn))
+                positions = kept
+            elif states is not None:
+                positions = [i for i in positions
+                             if states[i // zm.block] == 1 or states[i // zm.block] == 2 and _cmp_value(a[i], value, fn)]
+            else:
+                positions = [i for i in positions if _cmp_value(a[i], value, fn)]
+    cols = [column_values(t, _column_index(t, c)) for c in plan['scan']]
+    return ([c[i] for c in cols] for i in positions)
+
+# столбцы, которые читает план: выводимые и столбцы перенесённых фильтров
+def _plan_columns(plan):
+    used = list(plan['scan'])
+    for step in plan['pushed']:
+        used.extend(c for c in _step_refs(step) if c not in used)
+    return used
+
+# чтение файлов подряд (из .tbl отображаются только нужные плану столбцы)
+def _scan_files(files, plan, types, widened, sample_size):
+    for f in files:
+        if _file_format(f) == '.csv':
+            yield from _scan_csv(f, plan, types, widened, sample_size)
+        elif _file_format(f) == '.tbl':
+            yield from _scan_table(open_table(f, columns=_plan_columns(plan)), plan, types)
+        elif _file_format(f) == '.pkl':
+            yield from _scan_table(_load_pkl(f), plan, types)
+        else:
+            raise Exception(f'Неподдерживаемый формат файла: {f}')
+
+# чтение csv: сначала конвертируются только столбцы фильтров, остальные нужные - лишь у прошедших строк
+def _scan_csv(f, plan, types, widened, sample_size):
+    with open_file(f, 'r') as file:
+        reader = csv.reader(file)
+        cols = next(reader)
+        idx = {c: i for i, c in enumerate(cols)}
+        used = _plan_columns(plan)
+        sample = list(islice(reader, max(sample_size, 1)))
+        for c in used:
+            if c not in types:
+                i = idx[c]
+                types[c] = auto_type([r[i] for r in sample if i < len(r)])
+
+        def conv(raw, c):
+            i = idx[c]
+            v = raw[i] if i < len(raw) else ''
+            if v == '':
+                return None
+            typ = types[c]
+            try:
+                return _converter(typ)(v)
+            except (ValueError, TypeError):
+                # значение не подходит к типу из выборки - тип расширяется
+                types[c] = widen_type(typ, auto_type([v]))
+                widened.add(c)
+                return _converter(types[c])(v)
+
+        preds = [(step[1], _CMP_OPS[step[2]], step[3], step[4]) for step in plan['pushed']]
+        out = plan['scan']
+        for raw in chain(sample, reader):
+            done = {}
+            ok = True
+            for c1, fn, c2, value in preds:
+                a = done[c1] = conv(raw, c1) if c1 not in done else done[c1]
+                if c2 is not None:
+                    value = done[c2] = conv(raw, c2) if c2 not in done else done[c2]
+                if not _cmp_value(a, value, fn):
+                    ok = False
+                    break
+            if ok:
+                yield [done[c] if c in done else conv(raw, c) for c in out]
+
+# имена столбцов файла .tbl
+def _tbl_cols(f):
+    return _tbl_header_of(f)['cols']
+
 # пример использования
 if __name__ == "__main__":
+    # Режим отладки: результаты операций печатаются, события копятся в счётчиках
+    counters = CounterSink()
+    set_telemetry(counters, debug=True)
+
     # Загрузка файлов (для Google Colab используйте функции загрузки файлов, см. ниже)
     table = load_table('data1.csv', 'data2.pkl')
 
@@ -488,6 +3902,8 @@ if __name__ == "__main__":
 
     # Сохранение таблицы
     save_table(table, 'out.csv', 'out.pkl', 'out.txt', max_rows=100)
+    # Дозапись строк без перезаписи файлов
+    save_table(table, 'out.csv', 'out.pkl', append=True)
 
     # Получение строки по номеру
     get_rows_by_number(table, 0)
@@ -522,6 +3938,14 @@ if __name__ == "__main__":
     if concat_table:
         split1, split2 = split_table(concat_table, 3)
 
+    # Таблица из частей: добавление и разбиение без копирования строк
+    chunked_table = make_chunked(table)
+    for _ in range(3):
+        chunked_table = concat(chunked_table, table)
+    if chunked_table:
+        part1, part2 = split_table(chunked_table, 3)
+        compact(chunked_table)
+
     # Арифметические операции
     add(table, 'age', 'salary')
     sub(table, 'age', 'salary')
@@ -546,6 +3970,10 @@ if __name__ == "__main__":
     merged_table = merge_tables(table, table2, by_number=False)
     print_table(merged_table)
 
+    # Время и объём операций
+    for op, c in counters.counters.items():
+        print(op, c)
+
 # Дополнительно: Загрузка файлов в Google Colab
 
 try:
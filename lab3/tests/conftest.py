@@ -0,0 +1,33 @@
+import importlib.util
+import os
+import sys
+
+import pytest
+
+# lab3/main.py загружается под своим именем, чтобы не пересекаться с lab4/main.py при общем запуске тестов
+_MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'main.py')
+
+
+def _load():
+    if 'lab3_main' in sys.modules:
+        return sys.modules['lab3_main']
+    spec = importlib.util.spec_from_file_location('lab3_main', _MAIN)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules['lab3_main'] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope='session')
+def lab3():
+    return _load()
+
+
+# таблица по строкам: id (0..n-1) и v (id * 2)
+@pytest.fixture
+def make_table(lab3):
+    def make(n, start=0, columnar=False):
+        t = {'cols': ['id', 'v'], 'types': {'id': int, 'v': int},
+             'rows': [[i, i * 2] for i in range(start, start + n)]}
+        return lab3.to_columnar(t) if columnar else t
+    return make
@@ -0,0 +1,60 @@
+import operator
+
+import pytest
+
+_OPS = {'eq': operator.eq, 'ne': operator.ne, 'gr': operator.gt, 'ge': operator.ge,
+        'ls': operator.lt, 'le': operator.le}
+
+
+@pytest.fixture
+def names(lab3):
+    values = ['bob', 'ann', 'cid', 'dan'] * 50 + [None] * 4
+    t = {'cols': ['name', 'n'], 'types': {'name': str, 'n': int}, 'rows': [[v, i] for i, v in enumerate(values)]}
+    return lab3.to_columnar(t)
+
+
+# строка-константа (value=) сравнивается со столбцом со словарём по кодам
+@pytest.mark.parametrize('op', list(_OPS))
+@pytest.mark.parametrize('value', ['bob', 'bz', 'a', 'zz'])
+def test_compare_codes_with_string(lab3, names, monkeypatch, op, value):
+    assert lab3.column_values(names, 0).kind == 'c'
+    calls = []
+    compare_codes = lab3._compare_codes
+    monkeypatch.setattr(lab3, '_compare_codes', lambda *a: calls.append(a) or compare_codes(*a))
+    expected = [v is not None and _OPS[op](v, value) for v in lab3.column_values(names, 0)]
+    assert lab3.compare(names, 'name', None, op, value=value) == expected
+    assert calls
+
+
+# строковый col2 - по-прежнему имя столбца; обёртки eq/gr/... принимают value=
+def test_compare_column_and_value(lab3, names):
+    assert lab3.eq(names, 'name', 'name')[:4] == [True] * 4
+    assert lab3.eq(names, 'name', value='bob')[:4] == [True, False, False, False]
+    assert lab3.gr(names, 'n', value=201) == [i > 201 for i in range(204)]
+    assert lab3.eq(names, 'name', value=5)[:4] == [False] * 4
+
+
+# numpy и обычный путь дают одно и то же для целых больше 2**53
+@pytest.mark.parametrize('columnar', [False, True])
+def test_numpy_big_integers(lab3, columnar):
+    pytest.importorskip('numpy')
+    big = 2 ** 60 + 1
+    t = {'cols': ['a', 'b', 'f'], 'types': {'a': int, 'b': int, 'f': float},
+         'rows': [[big + i, 3, float(2 ** 60)] for i in range(3)] + [[None, 1, 1.0]]}
+    if columnar:
+        t = lab3.to_columnar(t)
+    assert lab3.arith(t, 'a', 'b', 'div', use_numpy=True) == lab3.arith(t, 'a', 'b', 'div', use_numpy=False)
+    assert lab3.compare(t, 'a', 'f', 'gr', use_numpy=True) == [True, True, True, False]
+    assert lab3.compare(t, 'a', None, 'gr', use_numpy=True, value=float(2 ** 60)) == [True, True, True, False]
+    assert lab3.compare(t, 'a', None, 'eq', use_numpy=True, value=big) == [True, False, False, False]
+
+
+# карта зон строится при первом сравнении с константой и только для большой таблицы
+def test_zone_map_built_lazily(lab3):
+    small = {'cols': ['x'], 'types': {'x': int}, 'rows': [[i] for i in range(100)]}
+    lab3.compare(small, 'x', None, 'ls', value=10)
+    assert 'indexes' not in small
+    n = lab3.ZONE_MIN_ROWS
+    big = lab3.to_columnar({'cols': ['x'], 'types': {'x': int}, 'rows': [[i] for i in range(n)]})
+    assert sum(lab3.compare(big, 'x', None, 'ls', value=10)) == 10
+    assert (0, 'zone') in big['indexes']
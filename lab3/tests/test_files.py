@@ -0,0 +1,105 @@
+import gzip
+import os
+import pickle
+
+import pytest
+
+
+def _ids(lab3, f):
+    return [r[0] for r in lab3.iter_rows(lab3.load_table(f))]
+
+
+# первый объект .pkl - сама таблица: файл читается обычным pickle.load
+def test_pkl_first_object_is_table(lab3, make_table, tmp_path):
+    f = str(tmp_path / 't.pkl')
+    lab3.save_table(make_table(5), f)
+    with open(f, 'rb') as file:
+        data = pickle.load(file)
+    assert data['cols'] == ['id', 'v']
+    assert data['rows'] == [[i, i * 2] for i in range(5)]
+
+
+# дозапись в .pkl и .pkl.gz, чтение всех частей одной таблицей
+@pytest.mark.parametrize('name', ['t.pkl', 't.pkl.gz'])
+def test_pkl_append(lab3, make_table, tmp_path, name):
+    f = str(tmp_path / name)
+    lab3.save_table(make_table(5), f)
+    lab3.save_table(make_table(3, 5), f, append=True)
+    lab3.save_table(make_table(2, 8), f, append=True)
+    assert _ids(lab3, f) == list(range(10))
+    opener = gzip.open if name.endswith('.gz') else open
+    with opener(f, 'rb') as file:
+        assert len(pickle.load(file)['rows']) == 5
+
+
+# дозапись другой схемы отклоняется, файл не меняется
+def test_pkl_append_schema_mismatch(lab3, make_table, tmp_path, capsys):
+    f = str(tmp_path / 't.pkl')
+    lab3.save_table(make_table(5), f)
+    size = os.path.getsize(f)
+    lab3.save_table({'cols': ['id', 'w'], 'types': {'id': int, 'w': str}, 'rows': [[1, 'a']]}, f, append=True)
+    assert 'не совпадает' in capsys.readouterr().out
+    assert os.path.getsize(f) == size
+
+
+# оборванная дозапись: неполная последняя часть заменяется новыми данными
+@pytest.mark.parametrize('cut', [1, 20, 200])
+def test_pkl_append_after_torn_tail(lab3, make_table, tmp_path, cut):
+    f = str(tmp_path / 't.pkl')
+    lab3.save_table(make_table(5), f)
+    lab3.save_table(make_table(30, 5), f, append=True)
+    with open(f, 'r+b') as file:
+        file.truncate(os.path.getsize(f) - cut)
+    lab3.save_table(make_table(2, 100), f, append=True)
+    assert _ids(lab3, f) == list(range(5)) + [100, 101]
+
+
+# файл .pkl старого вида (таблицы подряд, без записей о частях) дописывается так же
+def test_pkl_append_legacy(lab3, make_table, tmp_path):
+    f = str(tmp_path / 't.pkl')
+    with open(f, 'wb') as file:
+        pickle.dump(make_table(3), file)
+        pickle.dump(make_table(1, 3), file)
+        file.write(b'\x80\x05torn')
+    lab3.save_table(make_table(2, 4), f, append=True)
+    lab3.save_table(make_table(1, 6), f, append=True)
+    assert _ids(lab3, f) == list(range(7))
+
+
+# csv без перевода строки в конце не дописывается: последняя строка может быть оборвана
+def test_csv_torn_tail_refused(lab3, make_table, tmp_path, capsys):
+    f = str(tmp_path / 't.csv')
+    lab3.save_table(make_table(3), f)
+    with open(f, 'a') as file:
+        file.write('3,')
+    size = os.path.getsize(f)
+    lab3.save_table(make_table(1, 10), f, append=True)
+    assert 'не заканчивается переводом строки' in capsys.readouterr().out
+    assert os.path.getsize(f) == size
+
+
+# load_table не прикладывает карты зон, пока их не попросили
+def test_load_table_without_zones(lab3, make_table, tmp_path):
+    f = str(tmp_path / 't.tbl')
+    lab3.save_table(make_table(100), f)
+    assert 'indexes' not in lab3.load_table(f)
+    assert (0, 'zone') in lab3.load_table(f, zones=True)['indexes']
+
+
+# запрос к .tbl отображает только столбцы вывода и фильтров
+def test_query_tbl_reads_needed_columns(lab3, tmp_path, monkeypatch):
+    f = str(tmp_path / 't.tbl')
+    t = {'cols': ['id', 'name', 'x'], 'types': {'id': int, 'name': str, 'x': float},
+         'rows': [[i, f'n{i % 5}', i * 0.5] for i in range(100)]}
+    lab3.save_table(t, f)
+    seen = []
+    open_table = lab3.open_table
+
+    def spy(f, columns=None, **kwargs):
+        seen.append(columns)
+        return open_table(f, columns=columns, **kwargs)
+
+    monkeypatch.setattr(lab3, 'open_table', spy)
+    r = lab3.Query([f]).filter('id', 'ls', value=3).select('x').collect()
+    assert seen == [['x', 'id']]
+    assert list(lab3.column_values(r, 0)) == [0.0, 0.5, 1.0]
@@ -0,0 +1,44 @@
+import random
+
+import pytest
+
+
+def _expected(left, right, how):
+    lpos, rpos = [], []
+    for i, a in enumerate(left):
+        hits = [j for j, b in enumerate(right) if a is not None and a == b]
+        if hits:
+            lpos += [i] * len(hits)
+            rpos += hits
+        elif how in ('left', 'outer'):
+            lpos.append(i)
+            rpos.append(-1)
+    if how in ('right', 'outer'):
+        for j, b in enumerate(right):
+            if not any(a is not None and a == b for a in left):
+                lpos.append(-1)
+                rpos.append(j)
+    return [lpos, rpos]
+
+
+# хэш-соединение (с любой стороной построения) и слияние дают пары в одном порядке
+@pytest.mark.parametrize('how', ['inner', 'left', 'right', 'outer'])
+def test_join_order_independent_of_method(lab3, how):
+    rnd = random.Random(1)
+    for _ in range(100):
+        left = [rnd.choice([None, 1, 2, 3, 4, 5]) for _ in range(rnd.randint(0, 20))]
+        right = [rnd.choice([None, 1, 2, 3, 4, 6]) for _ in range(rnd.randint(0, 20))]
+        expected = _expected(left, right, how)
+        assert list(lab3._hash_join(left, right, how)) == expected
+        assert list(lab3._merge_join(left, right, how)) == expected
+
+
+# join_tables: одинаковый результат при method='hash' и method='merge'
+def test_join_tables_methods_agree(lab3):
+    t1 = {'cols': ['k', 'a'], 'types': {'k': int, 'a': str}, 'rows': [[3, 'x'], [1, 'y'], [2, 'z'], [1, 'w']]}
+    t2 = {'cols': ['k', 'b'], 'types': {'k': int, 'b': str}, 'rows': [[1, 'p'], [4, 'q'], [1, 'r']]}
+    hashed = lab3.join_tables(t1, t2, on='k', how='outer', method='hash')
+    merged = lab3.join_tables(t1, t2, on='k', how='outer', method='merge')
+    assert hashed['rows'] == merged['rows']
+    assert [r[:3] for r in hashed['rows']] == [[3, 'x', None], [1, 'y', 'p'], [1, 'y', 'r'], [2, 'z', None],
+                                              [1, 'w', 'p'], [1, 'w', 'r'], [4, None, 'q']]
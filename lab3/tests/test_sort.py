@@ -0,0 +1,32 @@
+import gc
+import os
+
+
+def _table(lab3):
+    return {'cols': ['x'], 'types': {'x': int}, 'rows': [[i % 97] for i in range(1000)]}
+
+
+# временные файлы внешней сортировки удаляются, даже если поток так и не прочитали
+def test_external_sort_unread_stream_cleans_up(lab3, tmp_path):
+    stream = lab3.sort_table(_table(lab3), ['x'], memory_rows=100, tmp_dir=str(tmp_path))
+    assert os.listdir(tmp_path)
+    del stream
+    gc.collect()
+    assert os.listdir(tmp_path) == []
+
+
+# и при частичном чтении потока
+def test_external_sort_partial_read_cleans_up(lab3, tmp_path):
+    stream = lab3.sort_table(_table(lab3), ['x'], memory_rows=100, chunk_size=50, tmp_dir=str(tmp_path))
+    next(stream)
+    del stream
+    gc.collect()
+    assert os.listdir(tmp_path) == []
+
+
+# полный поток отсортирован, файлов после него не остаётся
+def test_external_sort_full_read(lab3, tmp_path):
+    stream = lab3.sort_table(_table(lab3), ['x'], memory_rows=100, chunk_size=300, tmp_dir=str(tmp_path))
+    values = [v for part in stream for v in lab3.column_values(part, 0)]
+    assert values == sorted(i % 97 for i in range(1000))
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,68 @@
+import pytest
+
+
+# запись через представление попадает в базовую таблицу (по строкам и по столбцам)
+@pytest.mark.parametrize('columnar', [False, True])
+def test_view_writes_through(lab3, make_table, columnar):
+    t = make_table(6, columnar=columnar)
+    view = lab3.get_rows_by_number(t, 2, 4)
+    lab3.set_values(view, [-1, -1], 'v')
+    assert list(lab3.column_values(t, 1)) == [0, 2, -1, -1, 8, 10]
+
+
+# у представления есть t['rows'], как у таблицы по строкам; у базы по строкам это её же строки
+def test_view_rows_key(lab3, make_table):
+    t = make_table(6)
+    view = lab3.get_rows_by_number(t, 1, 3)
+    assert view['rows'] == [[1, 2], [2, 4]]
+    view['rows'][0][1] = 99
+    assert t['rows'][1] == [1, 99]
+    half = lab3.split_table(lab3.to_columnar(make_table(6)), 4)[1]
+    assert half['rows'] == [[4, 8], [5, 10]]
+    assert lab3.filter_rows(t, [i % 2 == 0 for i in range(6)], view=True)['rows'] == [[0, 0], [2, 4], [4, 8]]
+    with pytest.raises(KeyError):
+        view['missing']
+
+
+# после удаления строк базовой таблицы на месте представление не читается
+@pytest.mark.parametrize('columnar', [False, True])
+def test_view_invalidated_by_filter(lab3, make_table, columnar):
+    t = make_table(6, columnar=columnar)
+    view = lab3.get_rows_by_number(t, 3, 6)
+    lab3.filter_rows(t, [True, False, True, True, True, True])
+    with pytest.raises(Exception, match='представление нужно создать заново'):
+        lab3.column_values(view, 0)
+    fresh = lab3.get_rows_by_number(t, 3, 5)
+    assert list(lab3.column_values(fresh, 0)) == [4, 5]
+
+
+# половины таблицы из частей - представления: запись через них попадает в таблицу
+@pytest.mark.parametrize('columnar', [False, True])
+def test_chunked_split_writes_through(lab3, make_table, columnar):
+    t = lab3.make_chunked(make_table(10, columnar=columnar), make_table(10, 10, columnar=columnar))
+    left, right = lab3.split_table(t, 7)
+    assert list(lab3.column_values(right, 0)) == list(range(7, 20))
+    lab3.set_values(right, [0] * 13, 'v')
+    assert list(lab3.column_values(t, 1)) == [i * 2 for i in range(7)] + [0] * 13
+    part = lab3.get_rows_by_number(t, 3, 5)
+    lab3.set_values(part, [-1, -1], 'id')
+    assert list(lab3.column_values(t, 0))[:6] == [0, 1, 2, -1, -1, 5]
+    assert [r[0] for r in lab3.iter_rows(left)] == [0, 1, 2, -1, -1, 5, 6]
+
+
+# конкатенация половин таблицы из частей снова даёт таблицу из общих частей
+def test_chunked_split_concat(lab3, make_table):
+    t = lab3.make_chunked(make_table(10), make_table(10, 10))
+    left, right = lab3.split_table(t, 5)
+    joined = lab3.concat(left, right)
+    assert lab3.is_chunked(joined)
+    assert [r[0] for r in lab3.iter_rows(joined)] == list(range(20))
+
+
+# фильтрация таблицы из частей на месте делает её представления недействительными
+def test_chunked_view_invalidated_by_filter(lab3, make_table):
+    t = lab3.make_chunked(make_table(10), make_table(10, 10))
+    left, _ = lab3.split_table(t, 5)
+    lab3.filter_rows(t, [i != 0 for i in range(20)])
+    with pytest.raises(Exception, match='представление нужно создать заново'):
+        lab3.column_values(left, 0)
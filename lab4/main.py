@@ -1,16 +1,250 @@
 import csv
 import pickle
+import random
+import time
+from array import array
 from datetime import datetime
 
+# цвета и виды фигур; код фигуры - цвет * 6 + вид, -1 - пустое поле
+WHITE, BLACK = 0, 1
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+PIECE_CHARS = 'PNBRQKpnbrqk'
+PIECE_CODES = {ch: i for i, ch in enumerate(PIECE_CHARS)}
+
+# поля нумеруются как на доске self.board: sq = строка * 8 + столбец, строка 0 - восьмая горизонталь (A8 = 0, H1 = 63)
+FULL = (1 << 64) - 1
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+# ход упакован в число: откуда (6 бит), куда (6 бит), вид фигуры превращения (3 бита), признак (2 бита)
+MOVE_EN_PASSANT = 1 << 15
+MOVE_CASTLE = 2 << 15
+MOVE_DOUBLE = 3 << 15
+PROMOTION_PIECES = {'N': KNIGHT, 'B': BISHOP, 'R': ROOK, 'Q': QUEEN}
+
+# запись для отката хода - одно число: ход (17 бит), фигура (4 бита), взятая фигура + 1 (4 бита),
+# права рокировки (4 бита), поле взятия на проходе + 1 (7 бит), счётчик полуходов (остальные биты)
+UNDO_PIECE, UNDO_CAPTURED, UNDO_CASTLING, UNDO_EP, UNDO_HALFMOVE = 17, 21, 25, 29, 36
+
+# права рокировки битами: белые в короткую и длинную, чёрные в короткую и длинную
+CASTLE_WK, CASTLE_WQ, CASTLE_BK, CASTLE_BQ = 1, 2, 4, 8
+
+# права, которые остаются после хода с поля или на поле (король и ладьи на исходных полях)
+CASTLE_KEEP = [15] * 64
+CASTLE_KEEP[60] = 15 & ~(CASTLE_WK | CASTLE_WQ)
+CASTLE_KEEP[63] = 15 & ~CASTLE_WK
+CASTLE_KEEP[56] = 15 & ~CASTLE_WQ
+CASTLE_KEEP[4] = 15 & ~(CASTLE_BK | CASTLE_BQ)
+CASTLE_KEEP[7] = 15 & ~CASTLE_BK
+CASTLE_KEEP[0] = 15 & ~CASTLE_BQ
+
+# рокировки: право, поле короля, куда идёт король, поля ладьи (откуда, куда), поля, которые должны быть пусты,
+# поля, которые король проходит (не должны быть под боем)
+CASTLINGS = [
+    (CASTLE_WK, 60, 62, 63, 61, (1 << 61) | (1 << 62), (61, 62)),
+    (CASTLE_WQ, 60, 58, 56, 59, (1 << 57) | (1 << 58) | (1 << 59), (59, 58)),
+    (CASTLE_BK, 4, 6, 7, 5, (1 << 5) | (1 << 6), (5, 6)),
+    (CASTLE_BQ, 4, 2, 0, 3, (1 << 1) | (1 << 2) | (1 << 3), (3, 2)),
+]
+# ладья при рокировке по полю, куда идёт король
+CASTLE_ROOK = {62: (63, 61), 58: (56, 59), 6: (7, 5), 2: (0, 3)}
+
+# маски полей для прыгающих фигур
+def _leaper(deltas):
+    table = []
+    for sq in range(64):
+        r, c = divmod(sq, 8)
+        mask = 0
+        for dr, dc in deltas:
+            if 0 <= r + dr < 8 and 0 <= c + dc < 8:
+                mask |= 1 << ((r + dr) * 8 + c + dc)
+        table.append(mask)
+    return table
+
+KNIGHT_ATTACKS = _leaper([(-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)])
+KING_ATTACKS = _leaper([(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)])
+# поля, которые бьёт пешка цвета color с поля sq (белые идут к строке 0)
+PAWN_ATTACKS = [_leaper([(-1, -1), (-1, 1)]), _leaper([(1, -1), (1, 1)])]
+
+# лучи от каждого поля по направлениям (шаг номера поля -> маски)
+ROOK_DIRS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+BISHOP_DIRS = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+
+def _rays(dr, dc):
+    table = []
+    for sq in range(64):
+        r, c = divmod(sq, 8)
+        mask = 0
+        r, c = r + dr, c + dc
+        while 0 <= r < 8 and 0 <= c < 8:
+            mask |= 1 << (r * 8 + c)
+            r, c = r + dr, c + dc
+        table.append(mask)
+    return table
+
+RAYS = {(dr, dc): _rays(dr, dc) for dr, dc in ROOK_DIRS + BISHOP_DIRS}
+
+# значимые для дальнобойной фигуры поля: лучи без последнего поля (крайнее поле не закрывает ничего за собой)
+def _relevant(dirs):
+    table = []
+    for sq in range(64):
+        mask = 0
+        for d in dirs:
+            ray = RAYS[d][sq]
+            if ray:
+                last = ray.bit_length() - 1 if d[0] * 8 + d[1] > 0 else (ray & -ray).bit_length() - 1
+                mask |= ray & ~(1 << last)
+        table.append(mask)
+    return table
+
+ROOK_MASKS = _relevant(ROOK_DIRS)
+BISHOP_MASKS = _relevant(BISHOP_DIRS)
+ROOK_RAYS = [RAYS[(-1, 0)][sq] | RAYS[(1, 0)][sq] | RAYS[(0, -1)][sq] | RAYS[(0, 1)][sq] for sq in range(64)]
+BISHOP_RAYS = [RAYS[(-1, -1)][sq] | RAYS[(-1, 1)][sq] | RAYS[(1, -1)][sq] | RAYS[(1, 1)][sq] for sq in range(64)]
+
+# атаки вдоль лучей с учётом первой занятой клетки на каждом
+def _slide(sq, occ, dirs):
+    attacks = 0
+    for d in dirs:
+        ray = RAYS[d][sq]
+        blockers = ray & occ
+        if blockers:
+            if d[0] * 8 + d[1] > 0:
+                b = (blockers & -blockers).bit_length() - 1
+            else:
+                b = blockers.bit_length() - 1
+            ray ^= RAYS[d][b]
+        attacks |= ray
+    return attacks
+
+# атаки дальнобойных фигур: по каждому полю словарь {занятость значимых полей: атаки},
+# заполняется при первом обращении (не больше 4096 вариантов для ладьи и 512 для слона на поле)
+_ROOK_CACHE = [{} for _ in range(64)]
+_BISHOP_CACHE = [{} for _ in range(64)]
+
+def rook_attacks(sq, occ):
+    key = occ & ROOK_MASKS[sq]
+    cache = _ROOK_CACHE[sq]
+    attacks = cache.get(key)
+    if attacks is None:
+        attacks = cache[key] = _slide(sq, key, ROOK_DIRS)
+    return attacks
+
+def bishop_attacks(sq, occ):
+    key = occ & BISHOP_MASKS[sq]
+    cache = _BISHOP_CACHE[sq]
+    attacks = cache.get(key)
+    if attacks is None:
+        attacks = cache[key] = _slide(sq, key, BISHOP_DIRS)
+    return attacks
+
+# поля строго между двумя полями одной линии (0 - поля не на одной линии)
+def _between():
+    table = [[0] * 64 for _ in range(64)]
+    for a in range(64):
+        for d in ROOK_DIRS + BISHOP_DIRS:
+            mask = 0
+            r, c = divmod(a, 8)
+            r, c = r + d[0], c + d[1]
+            while 0 <= r < 8 and 0 <= c < 8:
+                b = r * 8 + c
+                table[a][b] = mask
+                mask |= 1 << b
+                r, c = r + d[0], c + d[1]
+    return table
+
+BETWEEN = _between()
+
+# ключи Зобриста: по ключу на фигуру на поле, на набор прав рокировки, на вертикаль взятия на проходе
+# (если взять на проходе есть чем) и на ход чёрных;
+# хеш позиции - xor ключей, поэтому при ходе он меняется xor-ом ключей изменившегося, а не пересчитывается
+_zobrist = random.Random(20240101)
+ZOBRIST_PIECES = [_zobrist.getrandbits(64) for _ in range(12 * 64)]
+ZOBRIST_CASTLING = [0] + [_zobrist.getrandbits(64) for _ in range(15)]
+ZOBRIST_EP = [_zobrist.getrandbits(64) for _ in range(8)]
+ZOBRIST_SIDE = _zobrist.getrandbits(64)
+
+# стоимость фигур и таблицы полей для оценки позиции (для белых, поле 0 - A8; для чёрных поле отражается)
+PIECE_VALUES = (100, 320, 330, 500, 900, 0)
+PST = (
+    (0, 0, 0, 0, 0, 0, 0, 0,
+     50, 50, 50, 50, 50, 50, 50, 50,
+     10, 10, 20, 30, 30, 20, 10, 10,
+     5, 5, 10, 25, 25, 10, 5, 5,
+     0, 0, 0, 20, 20, 0, 0, 0,
+     5, -5, -10, 0, 0, -10, -5, 5,
+     5, 10, 10, -20, -20, 10, 10, 5,
+     0, 0, 0, 0, 0, 0, 0, 0),
+    (-50, -40, -30, -30, -30, -30, -40, -50,
+     -40, -20, 0, 0, 0, 0, -20, -40,
+     -30, 0, 10, 15, 15, 10, 0, -30,
+     -30, 5, 15, 20, 20, 15, 5, -30,
+     -30, 0, 15, 20, 20, 15, 0, -30,
+     -30, 5, 10, 15, 15, 10, 5, -30,
+     -40, -20, 0, 5, 5, 0, -20, -40,
+     -50, -40, -30, -30, -30, -30, -40, -50),
+    (-20, -10, -10, -10, -10, -10, -10, -20,
+     -10, 0, 0, 0, 0, 0, 0, -10,
+     -10, 0, 5, 10, 10, 5, 0, -10,
+     -10, 5, 5, 10, 10, 5, 5, -10,
+     -10, 0, 10, 10, 10, 10, 0, -10,
+     -10, 10, 10, 10, 10, 10, 10, -10,
+     -10, 5, 0, 0, 0, 0, 5, -10,
+     -20, -10, -10, -10, -10, -10, -10, -20),
+    (0, 0, 0, 0, 0, 0, 0, 0,
+     5, 10, 10, 10, 10, 10, 10, 5,
+     -5, 0, 0, 0, 0, 0, 0, -5,
+     -5, 0, 0, 0, 0, 0, 0, -5,
+     -5, 0, 0, 0, 0, 0, 0, -5,
+     -5, 0, 0, 0, 0, 0, 0, -5,
+     -5, 0, 0, 0, 0, 0, 0, -5,
+     0, 0, 0, 5, 5, 0, 0, 0),
+    (-20, -10, -10, -5, -5, -10, -10, -20,
+     -10, 0, 0, 0, 0, 0, 0, -10,
+     -10, 0, 5, 5, 5, 5, 0, -10,
+     -5, 0, 5, 5, 5, 5, 0, -5,
+     0, 0, 5, 5, 5, 5, 0, -5,
+     -10, 5, 5, 5, 5, 5, 0, -10,
+     -10, 0, 5, 0, 0, 0, 0, -10,
+     -20, -10, -10, -5, -5, -10, -10, -20),
+    (-30, -40, -40, -50, -50, -40, -40, -30,
+     -30, -40, -40, -50, -50, -40, -40, -30,
+     -30, -40, -40, -50, -50, -40, -40, -30,
+     -30, -40, -40, -50, -50, -40, -40, -30,
+     -20, -30, -30, -40, -40, -30, -30, -20,
+     -10, -20, -20, -20, -20, -20, -20, -10,
+     20, 20, 0, 0, 0, 0, 20, 20,
+     20, 30, 10, 0, 0, 10, 30, 20),
+)
+# вклад фигуры code на поле sq в оценку с точки зрения белых (материал и поле)
+PSQ = [PIECE_VALUES[code % 6] + PST[code % 6][sq] if code < 6 else -PIECE_VALUES[code % 6] - PST[code % 6][sq ^ 56]
+       for code in range(12) for sq in range(64)]
+
+# запись поля вида E2
+def square_name(sq):
+    return 'ABCDEFGH'[sq & 7] + str(8 - (sq >> 3))
+
+# ход в виде e2e4 (с буквой фигуры превращения: e7e8q)
+def move_name(move):
+    promo = move >> 12 & 7
+    return (square_name(move & 63) + square_name(move >> 6 & 63)).lower() + ('nbrq'[promo - 1] if promo else '')
+
 # класс для шахматной доски
+# позиция хранится битовыми досками (число на каждый вид фигуры каждого цвета) и массивом кодов фигур по полям;
+# self.board (строки из символов) обновляется вместе с ними для вывода и сохранения
 class Board:
-    def __init__(self):
+    def __init__(self, fen=None):
         self.board = self.init_board()
         self.move_count = 0
         self.history = []
-        self.current_player = 'white'
-        self.castling_rights = {'white': {'K': True, 'Q': True}, 'black': {'K': True, 'Q': True}}
-        self.en_passant = None  # позиция для взятия на проходе
+        self.hashes = []  # хеши позиций перед каждым ходом из history (для повторений)
+        self.side = WHITE
+        self.castling = CASTLE_WK | CASTLE_WQ | CASTLE_BK | CASTLE_BQ
+        self.ep = -1  # поле для взятия на проходе
+        self.halfmove = 0  # полуходов без взятия и хода пешкой
+        self.fullmove = 1
+        self._load_grid()
+        if fen:
+            self.set_fen(fen)
 
     # инициализация доски
     def init_board(self):
@@ -20,11 +254,140 @@ class Board:
             ['.']*8,
             ['.']*8,
             ['.']*8,
-            ['.']*8,  
+            ['.']*8,
             ['P']*8,
             ['R', 'N', 'B', 'Q', 'K', 'B', 'N', 'R']
         ]
 
+    # битовые доски по self.board
+    def _load_grid(self):
+        self.bb = [0] * 12
+        self.occ = [0, 0]
+        self.squares = [-1] * 64
+        for sq in range(64):
+            ch = self.board[sq >> 3][sq & 7]
+            if ch != '.':
+                code = PIECE_CODES[ch]
+                self.bb[code] |= 1 << sq
+                self.occ[code // 6] |= 1 << sq
+                self.squares[sq] = code
+        self.hash = self.compute_hash()
+        self.score = sum(PSQ[code * 64 + sq] for sq, code in enumerate(self.squares) if code >= 0)
+
+    # хеш позиции целиком (при ходах self.hash обновляется по изменениям)
+    def compute_hash(self):
+        h = ZOBRIST_CASTLING[self.castling]
+        for sq, code in enumerate(self.squares):
+            if code >= 0:
+                h ^= ZOBRIST_PIECES[code * 64 + sq]
+        h ^= self._ep_key()
+        if self.side == BLACK:
+            h ^= ZOBRIST_SIDE
+        return h
+
+    # ключ взятия на проходе в хеше: только если пешка той стороны, что ходит, бьёт поле ep
+    # (иначе одинаковые позиции получали бы разные хеши, и повторения не находились бы)
+    def _ep_key(self):
+        ep = self.ep
+        if ep >= 0 and PAWN_ATTACKS[self.side ^ 1][ep] & self.bb[self.side * 6 + PAWN]:
+            return ZOBRIST_EP[ep & 7]
+        return 0
+
+    # текущий игрок, права рокировки и поле взятия на проходе в прежнем виде
+    @property
+    def current_player(self):
+        return 'white' if self.side == WHITE else 'black'
+
+    @current_player.setter
+    def current_player(self, player):
+        side = WHITE if player == 'white' else BLACK
+        if side != self.side:
+            self.hash ^= ZOBRIST_SIDE ^ self._ep_key()
+            self.side = side
+            self.hash ^= self._ep_key()
+
+    @property
+    def castling_rights(self):
+        c = self.castling
+        return {'white': {'K': bool(c & CASTLE_WK), 'Q': bool(c & CASTLE_WQ)},
+                'black': {'K': bool(c & CASTLE_BK), 'Q': bool(c & CASTLE_BQ)}}
+
+    @castling_rights.setter
+    def castling_rights(self, rights):
+        castling = ((CASTLE_WK if rights['white']['K'] else 0) | (CASTLE_WQ if rights['white']['Q'] else 0)
+                    | (CASTLE_BK if rights['black']['K'] else 0) | (CASTLE_BQ if rights['black']['Q'] else 0))
+        self.hash ^= ZOBRIST_CASTLING[self.castling] ^ ZOBRIST_CASTLING[castling]
+        self.castling = castling
+
+    @property
+    def en_passant(self):
+        return None if self.ep < 0 else (self.ep >> 3, self.ep & 7)
+
+    @en_passant.setter
+    def en_passant(self, pos):
+        self._set_ep(-1 if pos is None else pos[0] * 8 + pos[1])
+
+    # смена поля взятия на проходе вместе с хешем
+    def _set_ep(self, ep):
+        self.hash ^= self._ep_key()
+        self.ep = ep
+        self.hash ^= self._ep_key()
+
+    # позиция из записи FEN
+    def set_fen(self, fen):
+        parts = fen.split()
+        if len(parts) < 4:
+            raise ValueError(f'некорректная запись FEN: {fen}')
+        grid = []
+        for line in parts[0].split('/'):
+            row = []
+            for ch in line:
+                if ch.isdigit():
+                    row.extend(['.'] * int(ch))
+                elif ch in PIECE_CODES:
+                    row.append(ch)
+                else:
+                    raise ValueError(f'некорректная фигура в FEN: {ch}')
+            if len(row) != 8:
+                raise ValueError(f'некорректная строка в FEN: {line}')
+            grid.append(row)
+        if len(grid) != 8:
+            raise ValueError(f'некорректная запись FEN: {fen}')
+        self.board = grid
+        self._load_grid()
+        self.side = WHITE if parts[1] == 'w' else BLACK
+        self.castling = 0
+        for ch, bit in (('K', CASTLE_WK), ('Q', CASTLE_WQ), ('k', CASTLE_BK), ('q', CASTLE_BQ)):
+            if ch in parts[2]:
+                self.castling |= bit
+        self.ep = -1 if parts[3] == '-' else self.square(parts[3])
+        self.halfmove = int(parts[4]) if len(parts) > 4 else 0
+        self.fullmove = int(parts[5]) if len(parts) > 5 else 1
+        self.move_count = 0
+        self.history = []
+        self.hashes = []
+        self.hash = self.compute_hash()
+
+    # запись позиции в FEN
+    def fen(self):
+        lines = []
+        for row in self.board:
+            line = ''
+            empty = 0
+            for ch in row:
+                if ch == '.':
+                    empty += 1
+                    continue
+                if empty:
+                    line += str(empty)
+                    empty = 0
+                line += ch
+            lines.append(line + (str(empty) if empty else ''))
+        castling = ''.join(ch for ch, bit in (('K', CASTLE_WK), ('Q', CASTLE_WQ), ('k', CASTLE_BK), ('q', CASTLE_BQ))
+                           if self.castling & bit) or '-'
+        ep = '-' if self.ep < 0 else square_name(self.ep).lower()
+        return f"{'/'.join(lines)} {'w' if self.side == WHITE else 'b'} {castling} {ep} {self.halfmove} {self.fullmove}"
+
     # вывод доски
     def print_board(self):
         cols = '  A B C D E F G H'
@@ -34,35 +397,25 @@ class Board:
             print(f"{8-i} {row} {8-i}")
         print(cols)
 
-    # перемещение фигуры
-    def move_piece(self, start, end):
+    # перемещение фигуры (promotion - фигура превращения пешки: Q, R, B или N, по умолчанию ферзь)
+    def move_piece(self, start, end, promotion=None):
         s_col, s_row = self.parse_pos(start)
         e_col, e_row = self.parse_pos(end)
+        if not (0 <= s_row < 8 and 0 <= s_col < 8 and 0 <= e_row < 8 and 0 <= e_col < 8):
+            print('Некорректный ход')
+            return False
         piece = self.board[s_row][s_col]
-        target = self.board[e_row][e_col]
 
         if piece == '.':
             print('Нет фигуры на позиции', start)
             return False
 
-        if not self.is_valid_move(piece, s_row, s_col, e_row, e_col):
+        move = self.find_move(s_row * 8 + s_col, e_row * 8 + e_col, promotion)
+        if move is None:
             print('Некорректный ход')
             return False
 
-        # сохранение состояния для отката
-        self.history.append((self.board.copy(), self.castling_rights.copy(), self.en_passant))
-
-        # обработка специальных ходов
-        self.handle_special_moves(piece, s_row, s_col, e_row, e_col)
-
-        # выполнение хода
-        self.board[e_row][e_col] = piece
-        self.board[s_row][s_col] = '.'
-        self.move_count += 1
-
-        # смена игрока
-        self.current_player = 'black' if self.current_player == 'white' else 'white'
-
+        self.make_move(move)
         return True
 
     # разбор позиции
@@ -71,69 +424,362 @@ class Board:
         row = 8 - int(pos[1])
         return col, row
 
-    # базовая проверка хода
+    # номер поля по записи вида E2
+    def square(self, pos):
+        col, row = self.parse_pos(pos)
+        return row * 8 + col
+
+    # допустимый ход с поля на поле (None - такого хода нет или фигура превращения не из Q, R, B, N)
+    def find_move(self, start, end, promotion=None):
+        promo = PROMOTION_PIECES.get((promotion or 'Q').upper())
+        if promo is None:
+            return None
+        for move in self.legal_moves():
+            if move & 63 == start and move >> 6 & 63 == end:
+                if move >> 12 & 7 in (0, promo):
+                    return move
+        return None
+
+    # проверка хода по списку допустимых ходов
     def is_valid_move(self, piece, s_r, s_c, e_r, e_c):
-        # упрощённая проверка: не переходит ли на себя
         if self.current_player == 'white' and piece.islower():
             return False
         if self.current_player == 'black' and piece.isupper():
             return False
-
-        # простая проверка на выход за границы доски
         if not (0 <= e_r < 8 and 0 <= e_c < 8):
             return False
+        return self.find_move(s_r * 8 + s_c, e_r * 8 + e_c) is not None
 
-        # можно добавить больше проверок для каждой фигуры
-        return True
+    # бьёт ли игрок side поле sq при занятости occ
+    def is_attacked(self, sq, side, occ=None):
+        bb = self.bb
+        o = side * 6
+        if occ is None:
+            occ = self.occ[0] | self.occ[1]
+        if PAWN_ATTACKS[side ^ 1][sq] & bb[o + PAWN] or KNIGHT_ATTACKS[sq] & bb[o + KNIGHT] \
+                or KING_ATTACKS[sq] & bb[o + KING]:
+            return True
+        rq = bb[o + ROOK] | bb[o + QUEEN]
+        if rq and rook_attacks(sq, occ) & rq:
+            return True
+        bq = bb[o + BISHOP] | bb[o + QUEEN]
+        return bool(bq and bishop_attacks(sq, occ) & bq)
 
-    # обработка специальных ходов
-    def handle_special_moves(self, piece, s_r, s_c, e_r, e_c):
-        # обработка рокировки
-        if piece.upper() == 'K' and abs(e_c - s_c) == 2:
-            if e_c > s_c:
-                # короткая рокировка
-                self.board[s_r][7] = '.'
-                self.board[s_r][5] = 'R' if piece.isupper() else 'r'
-            else:
-                # длинная рокировка
-                self.board[s_r][0] = '.'
-                self.board[s_r][3] = 'R' if piece.isupper() else 'r'
+    # фигуры игрока side, которые бьют поле sq
+    def attackers(self, sq, side, occ):
+        bb = self.bb
+        o = side * 6
+        return (PAWN_ATTACKS[side ^ 1][sq] & bb[o + PAWN] | KNIGHT_ATTACKS[sq] & bb[o + KNIGHT]
+                | KING_ATTACKS[sq] & bb[o + KING] | rook_attacks(sq, occ) & (bb[o + ROOK] | bb[o + QUEEN])
+                | bishop_attacks(sq, occ) & (bb[o + BISHOP] | bb[o + QUEEN]))
+
+    # под шахом ли текущий игрок
+    def in_check(self):
+        king = self.bb[self.side * 6 + KING]
+        return bool(king) and self.is_attacked(king.bit_length() - 1, self.side ^ 1)
+
+    # оценка позиции для текущего игрока: материал и поля фигур (self.score считается при каждой постановке и снятии)
+    def evaluate(self):
+        return self.score if self.side == WHITE else -self.score
+
+    # все допустимые ходы текущего игрока (упакованные числа)
+    # учитываются шахи, связки, рокировка через битые поля, взятие на проходе и превращения
+    def legal_moves(self):
+        us = self.side
+        them = us ^ 1
+        bb = self.bb
+        own = self.occ[us]
+        opp = self.occ[them]
+        occ = own | opp
+        o = us * 6
+        moves = []
+        append = moves.append
+        king = bb[o + KING]
+        if not king:
+            return moves
+        ksq = king.bit_length() - 1
+        checkers = self.attackers(ksq, them, occ)
+
+        # ходы короля: поле не должно быть под боем, когда король с него ушёл
+        occ_nok = occ ^ king
+        targets = KING_ATTACKS[ksq] & ~own
+        while targets:
+            t = targets & -targets
+            targets ^= t
+            to = t.bit_length() - 1
+            if not self.is_attacked(to, them, occ_nok):
+                append(ksq | to << 6)
+        if checkers & (checkers - 1):
+            # двойной шах: ходит только король
+            return moves
+
+        # при шахе остальные фигуры могут только взять шахующую фигуру или закрыться
+        if checkers:
+            mask = checkers | BETWEEN[ksq][checkers.bit_length() - 1]
+        else:
+            mask = FULL
+        target_mask = ~own & mask
 
-        # обработка взятия на проходе
-        if piece.upper() == 'P':
-            if e_c != s_c and self.board[e_r][e_c] == '.':
-                # пешка взяла на проходе
-                self.board[s_r][e_c] = '.'
+        # связанные фигуры: ходят только вдоль линии связки
+        pins = {}
+        t6 = them * 6
+        snipers = (ROOK_RAYS[ksq] & (bb[t6 + ROOK] | bb[t6 + QUEEN])
+                   | BISHOP_RAYS[ksq] & (bb[t6 + BISHOP] | bb[t6 + QUEEN]))
+        while snipers:
+            s = snipers & -snipers
+            snipers ^= s
+            ssq = s.bit_length() - 1
+            between = BETWEEN[ksq][ssq] & occ
+            if between and not between & (between - 1) and between & own:
+                pins[between.bit_length() - 1] = BETWEEN[ksq][ssq] | s
+
+        # конь, слон, ладья, ферзь
+        for kind in (KNIGHT, BISHOP, ROOK, QUEEN):
+            pieces = bb[o + kind]
+            while pieces:
+                p = pieces & -pieces
+                pieces ^= p
+                f = p.bit_length() - 1
+                if kind == KNIGHT:
+                    if f in pins:
+                        continue
+                    targets = KNIGHT_ATTACKS[f] & target_mask
+                elif kind == BISHOP:
+                    targets = bishop_attacks(f, occ) & target_mask
+                elif kind == ROOK:
+                    targets = rook_attacks(f, occ) & target_mask
+                else:
+                    targets = (rook_attacks(f, occ) | bishop_attacks(f, occ)) & target_mask
+                if f in pins:
+                    targets &= pins[f]
+                while targets:
+                    t = targets & -targets
+                    targets ^= t
+                    append(f | (t.bit_length() - 1) << 6)
+
+        # пешки
+        empty = ~occ
+        step = -8 if us == WHITE else 8
+        start_row = 6 if us == WHITE else 1
+        last_row = 0 if us == WHITE else 7
+        pawns = bb[o + PAWN]
+        while pawns:
+            p = pawns & -pawns
+            pawns ^= p
+            f = p.bit_length() - 1
+            allowed = mask & pins[f] if f in pins else mask
+            to = f + step
+            if empty >> to & 1:
+                if allowed >> to & 1:
+                    if to >> 3 == last_row:
+                        for promo in (QUEEN, ROOK, BISHOP, KNIGHT):
+                            append(f | to << 6 | promo << 12)
+                    else:
+                        append(f | to << 6)
+                to2 = to + step
+                if f >> 3 == start_row and empty >> to2 & 1 and allowed >> to2 & 1:
+                    append(f | to2 << 6 | MOVE_DOUBLE)
+            targets = PAWN_ATTACKS[us][f] & opp & allowed
+            while targets:
+                t = targets & -targets
+                targets ^= t
+                to = t.bit_length() - 1
+                if to >> 3 == last_row:
+                    for promo in (QUEEN, ROOK, BISHOP, KNIGHT):
+                        append(f | to << 6 | promo << 12)
+                else:
+                    append(f | to << 6)
+            ep = self.ep
+            if ep >= 0 and PAWN_ATTACKS[us][f] >> ep & 1:
+                # взятие на проходе убирает сразу две пешки с линий короля: проверяется позиция после хода
+                cap = ep - step
+                after = occ ^ p ^ (1 << cap) | (1 << ep)
+                rq = (bb[t6 + ROOK] | bb[t6 + QUEEN])
+                bq = (bb[t6 + BISHOP] | bb[t6 + QUEEN])
+                if not (rook_attacks(ksq, after) & rq or bishop_attacks(ksq, after) & bq
+                        or KNIGHT_ATTACKS[ksq] & bb[t6 + KNIGHT]
+                        or PAWN_ATTACKS[us][ksq] & bb[t6 + PAWN] & ~(1 << cap)):
+                    append(f | ep << 6 | MOVE_EN_PASSANT)
+
+        # рокировка: не под шахом, поля между королём и ладьёй пусты, король не проходит через битые поля
+        if self.castling and not checkers:
+            for right, k_from, k_to, r_from, _, between, path in CASTLINGS[us * 2:us * 2 + 2]:
+                if self.castling & right and k_from == ksq and not occ & between \
+                        and self.squares[r_from] == o + ROOK \
+                        and not any(self.is_attacked(sq, them, occ) for sq in path):
+                    append(k_from | k_to << 6 | MOVE_CASTLE)
+        return moves
+
+    # постановка фигуры code на пустое поле sq и снятие фигуры с поля
+    def _put(self, sq, code):
+        b = 1 << sq
+        self.bb[code] |= b
+        self.occ[code // 6] |= b
+        self.squares[sq] = code
+        self.hash ^= ZOBRIST_PIECES[code * 64 + sq]
+        self.score += PSQ[code * 64 + sq]
+        self.board[sq >> 3][sq & 7] = PIECE_CHARS[code]
+
+    def _remove(self, sq):
+        code = self.squares[sq]
+        b = 1 << sq
+        self.bb[code] ^= b
+        self.occ[code // 6] ^= b
+        self.squares[sq] = -1
+        self.hash ^= ZOBRIST_PIECES[code * 64 + sq]
+        self.score -= PSQ[code * 64 + sq]
+        self.board[sq >> 3][sq & 7] = '.'
+        return code
+
+    # выполнение допустимого хода (упакованное число из legal_moves)
+    def make_move(self, move):
+        f = move & 63
+        t = move >> 6 & 63
+        piece = self.squares[f]
+        captured = self.squares[t]
+        if move & (3 << 15) == MOVE_EN_PASSANT:
+            captured = BLACK * 6 + PAWN if piece < 6 else WHITE * 6 + PAWN
+
+        # запись для отката: только то, что нельзя восстановить по самому ходу
+        self.history.append(move | piece << UNDO_PIECE | (captured + 1) << UNDO_CAPTURED
+                            | self.castling << UNDO_CASTLING | (self.ep + 1) << UNDO_EP
+                            | self.halfmove << UNDO_HALFMOVE)
+        self.hashes.append(self.hash)
+        # ключ взятия на проходе зависит от пешек и стороны, которая ходит: он снимается до хода и ставится после
+        self.hash ^= self._ep_key()
+
+        if self.squares[t] >= 0:
+            self._remove(t)
+        self._remove(f)
+        promo = move >> 12 & 7
+        self._put(t, piece - piece % 6 + promo if promo else piece)
+
+        # обработка специальных ходов
+        self.handle_special_moves(move, piece)
+
+        self.halfmove = 0 if piece % 6 == PAWN or captured >= 0 else self.halfmove + 1
+        if self.side == BLACK:
+            self.fullmove += 1
+        self.move_count += 1
+
+        # смена игрока
+        self.side ^= 1
+        self.hash ^= ZOBRIST_SIDE ^ self._ep_key()
+
+    # отмена последнего хода по записи из history
+    def unmake_move(self):
+        rec = self.history.pop()
+        move = rec & 0x1FFFF
+        f = move & 63
+        t = move >> 6 & 63
+        piece = rec >> UNDO_PIECE & 15
+        captured = (rec >> UNDO_CAPTURED & 15) - 1
+        flag = move & (3 << 15)
+        self.hashes.pop()
+
+        self.hash ^= self._ep_key()
+        self.side ^= 1
+        self.hash ^= ZOBRIST_SIDE
+        if self.side == BLACK:
+            self.fullmove -= 1
+        self.move_count -= 1
+
+        if flag == MOVE_CASTLE:
+            r_from, r_to = CASTLE_ROOK[t]
+            self._put(r_from, self._remove(r_to))
+        self._remove(t)
+        self._put(f, piece)
+        if flag == MOVE_EN_PASSANT:
+            self._put(t + (8 if piece < 6 else -8), captured)
+        elif captured >= 0:
+            self._put(t, captured)
+
+        castling = rec >> UNDO_CASTLING & 15
+        self.hash ^= ZOBRIST_CASTLING[self.castling] ^ ZOBRIST_CASTLING[castling]
+        self.castling = castling
+        self.ep = (rec >> UNDO_EP & 127) - 1
+        self.hash ^= self._ep_key()
+        self.halfmove = rec >> UNDO_HALFMOVE
+        return move
+
+    # обработка специальных ходов: ладья при рокировке, пешка, взятая на проходе
+    def handle_special_moves(self, move, piece):
+        flag = move & (3 << 15)
+        if flag == MOVE_CASTLE:
+            r_from, r_to = CASTLE_ROOK[move >> 6 & 63]
+            self._put(r_to, self._remove(r_from))
+        elif flag == MOVE_EN_PASSANT:
+            # пешка взяла на проходе
+            self._remove((move >> 6 & 63) + (8 if piece < 6 else -8))
 
         # обновление рокировки и взятия на проходе
-        self.update_castling(piece, s_r, s_c, e_r, e_c)
+        self.update_castling(move, piece)
 
     # обновление прав рокировки и взятия на проходе
-    def update_castling(self, piece, s_r, s_c, e_r, e_c):
-        # удаление прав рокировки, если король или ладья ходят
-        if piece.upper() == 'K':
-            self.castling_rights[self.current_player]['K'] = False
-            self.castling_rights[self.current_player]['Q'] = False
-        if piece.upper() == 'R':
-            if s_c == 0:
-                self.castling_rights[self.current_player]['Q'] = False
-            if s_c == 7:
-                self.castling_rights[self.current_player]['K'] = False
-
-        # установка взятия на проходе
-        if piece.upper() == 'P' and abs(e_r - s_r) == 2:
-            self.en_passant = (e_r + (1 if piece.isupper() else -1), e_c)
+    def update_castling(self, move, piece):
+        # права теряются, если король или ладья ушли с исходного поля или ладью взяли на нём
+        castling = self.castling & CASTLE_KEEP[move & 63] & CASTLE_KEEP[move >> 6 & 63]
+        if castling != self.castling:
+            self.hash ^= ZOBRIST_CASTLING[self.castling] ^ ZOBRIST_CASTLING[castling]
+            self.castling = castling
+
+        # установка взятия на проходе (ключ в хеше ставит make_move после смены игрока)
+        if move & (3 << 15) == MOVE_DOUBLE:
+            self.ep = ((move & 63) + (move >> 6 & 63)) // 2
         else:
-            self.en_passant = None
+            self.ep = -1
+
+    # число позиций на глубине depth полуходов (perft); на последнем уровне считаются ходы, без их выполнения
+    def perft(self, depth):
+        if depth <= 0:
+            return 1
+        moves = self.legal_moves()
+        if depth == 1:
+            return len(moves)
+        nodes = 0
+        for move in moves:
+            self.make_move(move)
+            nodes += self.perft(depth - 1)
+            self.unmake_move()
+        return nodes
+
+    # perft по каждому ходу из текущей позиции: {ход вида e2e4: число позиций}
+    def divide(self, depth):
+        result = {}
+        for move in self.legal_moves():
+            self.make_move(move)
+            result[move_name(move)] = self.perft(depth - 1)
+            self.unmake_move()
+        return result
+
+    # сколько раз текущая позиция встречалась в партии, включая текущую
+    # (после хода пешкой или взятия повторений быть не может, поэтому смотрятся только последние halfmove полуходов)
+    def repetitions(self):
+        count = 1
+        hashes = self.hashes
+        for i in range(len(hashes) - 2, max(len(hashes) - self.halfmove, 0) - 1, -2):
+            if hashes[i] == self.hash:
+                count += 1
+        return count
+
+    # троекратное (или times-кратное) повторение позиции
+    def is_repetition(self, times=3):
+        return self.repetitions() >= times
+
+    # хеши позиций для истории, загруженной из файла: откат всех ходов и повтор их заново
+    def _replay_hashes(self):
+        moves = []
+        while self.history:
+            moves.append(self.unmake_move())
+        for move in reversed(moves):
+            self.make_move(move)
 
     # откат хода
     def undo_move(self):
         if not self.history:
             print('Нет ходов для отката')
             return False
-        self.board, self.castling_rights, self.en_passant = self.history.pop()
-        self.move_count -= 1
-        self.current_player = 'black' if self.current_player == 'white' else 'white'
+        self.unmake_move()
         print('Ход откатан')
         return True
 
@@ -147,7 +793,9 @@ class Board:
                     'history': self.history,
                     'current_player': self.current_player,
                     'castling_rights': self.castling_rights,
-                    'en_passant': self.en_passant
+                    'en_passant': self.en_passant,
+                    'halfmove': self.halfmove,
+                    'fullmove': self.fullmove
                 }, f)
             print('Игра сохранена в', file)
         except Exception as e:
@@ -160,29 +808,358 @@ class Board:
                 data = pickle.load(f)
                 self.board = data['board']
                 self.move_count = data['move_count']
-                self.history = data['history']
+                # в старых сохранениях история - снимки доски, по ним ход не откатить
+                self.history = [h for h in data['history'] if isinstance(h, int)]
+                self.hashes = [0] * len(self.history)
                 self.current_player = data['current_player']
                 self.castling_rights = data['castling_rights']
                 self.en_passant = data['en_passant']
+                self.halfmove = data.get('halfmove', 0)
+                self.fullmove = data.get('fullmove', 1)
+                self._load_grid()
+                self._replay_hashes()
             print('Игра загружена из', file)
         except Exception as e:
             print('Ошибка загрузки:', e)
 
+# виды оценок в таблице позиций: точная, не меньше (отсечение по beta), не больше (все ходы хуже alpha)
+TT_EXACT, TT_LOWER, TT_UPPER = 0, 1, 2
+# размер записи таблицы позиций в байтах: ключ и упакованные данные по 8 байт
+TT_ENTRY_BYTES = 16
+
+# таблица позиций фиксированного размера: хеш позиции -> (глубина, оценка, вид оценки, лучший ход)
+# записи лежат в двух массивах 64-битных чисел (ключи и данные), память задаётся в мегабайтах
+# policy='depth' - корзины из двух записей: первая заменяется только более глубокой (или оставшейся от прошлых
+# поисков) записью, вторая - всегда; policy='always' - по одной записи на корзину, новая всегда вытесняет старую
+class TranspositionTable:
+    def __init__(self, mb=16, policy='depth'):
+        if policy not in ('depth', 'always'):
+            raise ValueError(f'неизвестная политика замены: {policy}')
+        self.policy = policy
+        self.ways = 2 if policy == 'depth' else 1
+        # число корзин - степень двойки, чтобы номер корзины брался маской
+        buckets = max(int(mb * 2 ** 20) // (TT_ENTRY_BYTES * self.ways), 1)
+        self.mask = (1 << buckets.bit_length() - 1) - 1
+        self.size = (self.mask + 1) * self.ways
+        self.keys = array('Q', bytes(8 * self.size))
+        self.data = array('Q', bytes(8 * self.size))
+        self.age = 0
+        self.hits = self.misses = self.stores = self.overwrites = 0
+
+    # данные записи: ход (17 бит), вид оценки (2 бита), глубина (8 бит), возраст (8 бит), оценка со сдвигом (29 бит)
+    @staticmethod
+    def _pack(depth, score, flag, move, age):
+        return move | flag << 17 | depth << 19 | age << 27 | score + (1 << 28) << 35
+
+    # поиск позиции: (глубина, оценка, вид оценки, ход) или None
+    # ключ 0 означает пустую запись, поэтому хеш 0 хранится как 1
+    def probe(self, key):
+        key = key or 1
+        i = (key & self.mask) * self.ways
+        for j in range(i, i + self.ways):
+            if self.keys[j] == key:
+                d = self.data[j]
+                self.hits += 1
+                return d >> 19 & 255, (d >> 35) - (1 << 28), d >> 17 & 3, d & 0x1FFFF
+        self.misses += 1
+        return None
+
+    # запись результата для позиции
+    def store(self, key, depth, score, flag=TT_EXACT, move=0):
+        key = key or 1
+        i = (key & self.mask) * self.ways
+        depth = min(max(depth, 0), 255)
+        data = self._pack(depth, score, flag, move, self.age)
+        keys = self.keys
+        j = i
+        if self.ways == 2 and keys[i + 1] == key:
+            # позиция уже во второй ячейке: запись обновляется там, а не дублируется в первой
+            j = i + 1
+        elif self.ways == 2 and keys[i] != key:
+            old = self.data[i]
+            # запись из первой ячейки вытесняется только более глубокой или оставшейся от прошлых поисков
+            if keys[i] and old >> 19 & 255 > depth and old >> 27 & 255 == self.age:
+                j = i + 1
+        if keys[j] and keys[j] != key:
+            self.overwrites += 1
+        if keys[j] == key and not move:
+            # без нового хода сохраняется найденный раньше
+            data |= self.data[j] & 0x1FFFF
+        keys[j] = key
+        self.data[j] = data
+        self.stores += 1
+
+    # новый поиск: записи прежних поисков становятся первыми кандидатами на замену
+    def new_search(self):
+        self.age = (self.age + 1) & 255
+
+    # очистка таблицы и счётчиков
+    def clear(self):
+        self.keys = array('Q', bytes(8 * self.size))
+        self.data = array('Q', bytes(8 * self.size))
+        self.age = 0
+        self.hits = self.misses = self.stores = self.overwrites = 0
+
+    # число занятых записей
+    def __len__(self):
+        return self.size - self.keys.count(0)
+
+    # счётчики попаданий и промахов
+    def stats(self):
+        probes = self.hits + self.misses
+        return {'size': self.size, 'bytes': self.size * TT_ENTRY_BYTES, 'policy': self.policy, 'hits': self.hits,
+                'misses': self.misses, 'hit_rate': self.hits / probes if probes else 0.0, 'stores': self.stores,
+                'overwrites': self.overwrites}
+
+# оценка мата (мат через n полуходов оценивается как MATE - n) и граница, выше которой оценка означает мат
+MATE = 100000
+MATE_BOUND = MATE - 1000
+INFINITY = MATE + 1
+MAX_PLY = 64
+# полуширина окна вокруг оценки предыдущей итерации
+ASPIRATION = 50
+# как часто (в узлах) проверяются ограничения по времени и узлам
+CHECK_EVERY = 1024
+
+# поиск хода: negamax с альфа-бета отсечением и итеративным углублением, окна вокруг прошлой оценки,
+# поиск взятий в листьях; порядок ходов - ход из таблицы позиций, взятия (ценная жертва, дешёвый нападающий),
+# ходы-убийцы, история удачных тихих ходов
+class Engine:
+    def __init__(self, tt_mb=16, policy='depth'):
+        self.tt = TranspositionTable(tt_mb, policy)
+        self.history = [0] * (12 * 64)
+        self.killers = [[0, 0] for _ in range(MAX_PLY + 1)]
+        self.info = {}
+
+    # лучший ход для позиции board: (ход, оценка для стороны, которая ходит); ход None, если ходов нет
+    # ограничения: depth - глубина, time_limit - секунды, nodes - число узлов (без ограничений - 1 секунда)
+    def search(self, board, depth=None, time_limit=None, nodes=None):
+        if depth is None and time_limit is None and nodes is None:
+            time_limit = 1.0
+        moves = board.legal_moves()
+        if not moves:
+            return None, -MATE if board.in_check() else 0
+        self.started = time.perf_counter()
+        self.deadline = self.started + time_limit if time_limit else None
+        self.node_limit = nodes
+        self.nodes = 0
+        self.stopped = False
+        self.killers = [[0, 0] for _ in range(MAX_PLY + 1)]
+        self.history = [h >> 2 for h in self.history]
+        self.tt.new_search()
+        best, score, done = moves[0], 0, 0
+        for d in range(1, min(depth or MAX_PLY, MAX_PLY) + 1):
+            self.root_best = 0
+            if d >= 3 and abs(score) < MATE_BOUND:
+                alpha, beta = score - ASPIRATION, score + ASPIRATION
+            else:
+                alpha, beta = -INFINITY, INFINITY
+            while True:
+                s = self._search(board, d, alpha, beta, 0)
+                if self.stopped:
+                    break
+                # оценка вне окна: повтор с открытой с этой стороны границей
+                if s <= alpha:
+                    alpha = -INFINITY
+                elif s >= beta:
+                    beta = INFINITY
+                else:
+                    break
+            if self.stopped:
+                break
+            best, score, done = self.root_best or best, s, d
+            elapsed = time.perf_counter() - self.started
+            self.info = {'depth': d, 'score': score, 'move': move_name(best), 'nodes': self.nodes,
+                         'seconds': elapsed, 'nodes_per_sec': self.nodes / elapsed if elapsed else None}
+            if abs(score) >= MATE_BOUND:
+                break
+            # следующая итерация дольше всех предыдущих вместе: не начинать, если на неё не хватит времени
+            if self.deadline and time.perf_counter() > self.started + (self.deadline - self.started) / 2:
+                break
+        elapsed = time.perf_counter() - self.started
+        self.info.update({'depth': done, 'nodes': self.nodes, 'seconds': elapsed,
+                          'nodes_per_sec': self.nodes / elapsed if elapsed else None, 'tt': self.tt.stats()})
+        return best, score
+
+    # лучший ход в виде e2e4 для позиции или записи FEN
+    def best_move(self, position, **limits):
+        board = Board(position) if isinstance(position, str) else position
+        move, _ = self.search(board, **limits)
+        return move_name(move) if move is not None else None
+
+    # проверка ограничений по времени и узлам
+    def _check_limits(self):
+        if self.node_limit and self.nodes >= self.node_limit:
+            self.stopped = True
+        elif self.deadline and time.perf_counter() >= self.deadline:
+            self.stopped = True
+
+    # тихий ход: не взятие и не превращение
+    @staticmethod
+    def _is_quiet(board, move):
+        return board.squares[move >> 6 & 63] < 0 and not move & (7 << 12) and move & (3 << 15) != MOVE_EN_PASSANT
+
+    # порядок ходов: ход из таблицы, взятия по MVV-LVA, превращения, ходы-убийцы, история
+    def _order(self, board, moves, tt_move, ply):
+        squares = board.squares
+        killers = self.killers[ply]
+        history = self.history
+        keyed = []
+        for move in moves:
+            to = move >> 6 & 63
+            victim = squares[to]
+            if move == tt_move:
+                key = 1 << 30
+            elif victim >= 0 or move & (3 << 15) == MOVE_EN_PASSANT:
+                key = (1 << 28) + PIECE_VALUES[victim % 6 if victim >= 0 else PAWN] * 8 - squares[move & 63] % 6
+            elif move & (7 << 12):
+                key = (1 << 27) + (move >> 12 & 7)
+            elif move == killers[0]:
+                key = 1 << 26
+            elif move == killers[1]:
+                key = (1 << 26) - 1
+            else:
+                key = history[squares[move & 63] * 64 + to]
+            keyed.append((key, move))
+        keyed.sort(reverse=True)
+        return [move for _, move in keyed]
+
+    # alpha-beta поиск на глубину depth; оценка для стороны, которая ходит
+    def _search(self, board, depth, alpha, beta, ply):
+        in_check = board.in_check()
+        if in_check:
+            depth += 1
+        if depth <= 0 or ply >= MAX_PLY:
+            return self._quiesce(board, alpha, beta, ply)
+        self.nodes += 1
+        if not self.nodes % CHECK_EVERY:
+            self._check_limits()
+        if self.stopped:
+            return 0
+        if ply and (board.halfmove >= 100 or board.repetitions() >= 2):
+            return 0
+
+        key = board.hash
+        entry = self.tt.probe(key)
+        tt_move = 0
+        if entry:
+            e_depth, e_score, e_flag, tt_move = entry
+            if ply and e_depth >= depth:
+                # оценки мата в таблице хранятся от текущей позиции, а не от корня
+                if e_score >= MATE_BOUND:
+                    e_score -= ply
+                elif e_score <= -MATE_BOUND:
+                    e_score += ply
+                if e_flag == TT_EXACT or e_flag == TT_LOWER and e_score >= beta \
+                        or e_flag == TT_UPPER and e_score <= alpha:
+                    return e_score
+
+        moves = board.legal_moves()
+        if not moves:
+            return -MATE + ply if in_check else 0
+
+        alpha0 = alpha
+        best_score, best_move = -INFINITY, 0
+        for move in self._order(board, moves, tt_move, ply):
+            quiet = self._is_quiet(board, move)
+            piece = board.squares[move & 63]
+            board.make_move(move)
+            s = -self._search(board, depth - 1, -beta, -alpha, ply + 1)
+            board.unmake_move()
+            if self.stopped:
+                return 0
+            if s > best_score:
+                best_score, best_move = s, move
+                if s > alpha:
+                    alpha = s
+                    if not ply:
+                        self.root_best = move
+                    if s >= beta:
+                        if quiet:
+                            killers = self.killers[ply]
+                            if killers[0] != move:
+                                killers[1], killers[0] = killers[0], move
+                            self.history[piece * 64 + (move >> 6 & 63)] += depth * depth
+                        break
+
+        if best_score >= beta:
+            flag = TT_LOWER
+        elif best_score > alpha0:
+            flag = TT_EXACT
+        else:
+            flag = TT_UPPER
+        stored = best_score
+        if stored >= MATE_BOUND:
+            stored += ply
+        elif stored <= -MATE_BOUND:
+            stored -= ply
+        self.tt.store(key, depth, stored, flag, best_move)
+        return best_score
+
+    # поиск только взятий и превращений, пока позиция не станет спокойной
+    def _quiesce(self, board, alpha, beta, ply):
+        self.nodes += 1
+        if not self.nodes % CHECK_EVERY:
+            self._check_limits()
+        if self.stopped:
+            return 0
+        stand = board.evaluate()
+        if stand >= beta or ply >= MAX_PLY:
+            return stand
+        if stand > alpha:
+            alpha = stand
+        squares = board.squares
+        captures = [m for m in board.legal_moves()
+                    if squares[m >> 6 & 63] >= 0 or m & (7 << 12) or m & (3 << 15) == MOVE_EN_PASSANT]
+        for move in self._order(board, captures, 0, ply):
+            board.make_move(move)
+            s = -self._quiesce(board, -beta, -alpha, ply + 1)
+            board.unmake_move()
+            if self.stopped:
+                return 0
+            if s >= beta:
+                return s
+            if s > alpha:
+                alpha = s
+        return alpha
+
 # класс для управления игрой
 class Game:
     def __init__(self):
         self.board = Board()
+        self.engine = None
 
-    # запуск игры
-    def start(self):
+    # запуск игры; computer - цвет, за который играет компьютер ('white' или 'black'), think_time - секунды на ход
+    def start(self, computer=None, think_time=1.0):
+        if computer and self.engine is None:
+            self.engine = Engine()
         while True:
             self.board.print_board()
-            move = input(f"{self.board.current_player} ход (например, E2 E4) или 'exit': ")
+            # конец партии проверяется до выбора, кто ходит: после мата, пата или повторения ходов нет
+            if not self.board.legal_moves():
+                print('Мат' if self.board.in_check() else 'Пат')
+                print('Игра завершена')
+                break
+            if self.board.is_repetition():
+                print('Ничья: позиция повторилась три раза')
+                print('Игра завершена')
+                break
+            if self.board.current_player == computer:
+                move, _ = self.engine.search(self.board, time_limit=think_time)
+                self.board.make_move(move)
+                info = self.engine.info
+                print(f"Ход компьютера: {move_name(move)} (глубина {info['depth']}, оценка {info['score']}, "
+                      f"{info['nodes']} позиций)")
+                continue
+            move = input(f"{self.board.current_player} ход (например, E2 E4, превращение: E7 E8 Q) или 'exit': ")
             if move.lower() == 'exit':
                 print('Игра завершена')
                 break
             elif move.lower() == 'undo':
                 self.board.undo_move()
+                # против компьютера откатывается и его ответ
+                if computer and self.board.current_player == computer:
+                    self.board.undo_move()
                 continue
             elif move.lower().startswith('save'):
                 _, file = move.split()
@@ -193,8 +1170,8 @@ class Game:
                 self.board.load_game(file)
                 continue
             try:
-                start, end = move.split()
-                self.board.move_piece(start, end)
+                start, end, *promotion = move.split()
+                self.board.move_piece(start, end, *promotion)
             except:
                 print('Некорректный ввод')
 
@@ -206,9 +1183,8 @@ class Game:
                 for i in range(0, len(moves), 2):
                     start = moves[i]
                     end = moves[i+1]
-                    player = 'white' if i % 4 == 0 else 'black'
-                    if self.board.move_piece(start, end):
-                        self.board.history.append((player, start, end))
+                    if not self.board.move_piece(start, end):
+                        break
             print('Партия загружена из полной нотации')
         except Exception as e:
             print('Ошибка загрузки полной нотации:', e)
@@ -238,7 +1214,8 @@ if __name__ == "__main__":
     game = Game()
     files = upload_files()
     while True:
-        choice = input("Действия: 1 - играть, 2 - загрузить полную нотацию, 3 - загрузить сокращённую нотацию, 4 - выход: ")
+        choice = input("Действия: 1 - играть, 2 - загрузить полную нотацию, 3 - загрузить сокращённую нотацию, 4 - выход, "
+                       "5 - играть с компьютером: ")
         if choice == '1':
             game.start()
         elif choice == '2':
@@ -256,5 +1233,11 @@ if __name__ == "__main__":
         elif choice == '4':
             print('Выход')
             break
+        elif choice == '5':
+            color = input('Цвет компьютера (white или black): ').strip().lower()
+            if color not in ('white', 'black'):
+                print('Неверный цвет')
+            else:
+                game.start(computer=color)
         else:
             print('Неверный выбор')
@@ -0,0 +1,119 @@
+import argparse
+import json
+import platform
+import sys
+import time
+from datetime import datetime
+
+from main import START_FEN, Board
+
+# опорные позиции и известные числа позиций по глубинам (perft 1, 2, ...)
+POSITIONS = {
+    'start': (START_FEN, [20, 400, 8902, 197281]),
+    # много рокировок, связок и взятий на проходе
+    'kiwipete': ('r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1', [48, 2039, 97862]),
+    # эндшпиль со связками по горизонтали и взятием на проходе
+    'endgame_ep': ('8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1', [14, 191, 2812, 43238]),
+    # превращения со взятием, шах с первого хода
+    'promotions': ('r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1', [6, 264, 9467]),
+    'promotions_check': ('rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8', [44, 1486, 62379]),
+    'underpromotions': ('n1n5/PPPk4/8/8/8/8/4Kppp/5N1N b - - 0 1', [24, 496, 9483]),
+    # взятие на проходе, открывающее шах своему королю по диагонали
+    'ep_discovered_check': ('8/8/1k6/2b5/2pP4/8/5K2/8 b - d3 0 1', [15, 126, 1928, 13931]),
+    'ep_pinned': ('8/5bk1/8/2Pp4/8/1K6/8/8 w - d6 0 1', [8, 104, 736, 9287]),
+    # рокировка через битые поля
+    'castling_attacked': ('r3k2r/8/3Q4/8/8/5q2/8/R3K2R b KQkq - 0 1', [44, 1494, 50509]),
+    'middlegame': ('r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P3/2NP1N2/PPP1QPPP/R4RK1 w - - 0 10', [45, 1765, 75352]),
+}
+
+# допустимое замедление относительно базового прогона (0.2 - на 20%)
+DEFAULT_THRESHOLD = 0.2
+
+# замеры короче этого (в секундах) не сравниваются: на них время зависит больше от шума, чем от кода
+MIN_SECONDS = 0.01
+
+# perft позиции fen на глубину depth: лучшее время из repeat запусков
+def run_perft(fen, depth, repeat=1):
+    board = Board(fen)
+    best = None
+    nodes = 0
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        nodes = board.perft(depth)
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return {'nodes': nodes, 'seconds': best, 'nodes_per_sec': nodes / best if best else None}
+
+# прогон набора позиций до глубины max_depth (не глубже известных чисел)
+def run_suite(names=None, max_depth=3, repeat=1):
+    results = {}
+    for name, (fen, counts) in POSITIONS.items():
+        if names and name not in names:
+            continue
+        for depth, expected in enumerate(counts[:max_depth], 1):
+            key = f'{name}/{depth}'
+            r = run_perft(fen, depth, repeat)
+            r['expected'] = expected
+            r['ok'] = r['nodes'] == expected
+            results[key] = r
+            mark = '' if r['ok'] else f' <- ошибка, ожидалось {expected}'
+            print(f"{key:24} {r['nodes']:10} {r['seconds'] * 1000:10.2f} мс {r['nodes_per_sec'] or 0:12.0f} поз/с{mark}")
+    return {
+        'meta': {'python': platform.python_version(), 'machine': platform.machine(), 'max_depth': max_depth,
+                 'repeat': repeat, 'date': datetime.now().strftime('%Y-%m-%d %H:%M:%S')},
+        'results': results,
+    }
+
+# сохранение результатов в JSON
+def save_results(results, f):
+    with open(f, 'w', encoding='utf-8') as file:
+        json.dump(results, file, ensure_ascii=False, indent=2)
+
+# сравнение с базовым прогоном: список замеров, где скорость упала больше чем на threshold
+def compare_results(current, baseline, threshold=DEFAULT_THRESHOLD):
+    regressions = []
+    for key, r in current['results'].items():
+        base = baseline['results'].get(key)
+        if not base or not base['nodes_per_sec'] or not r['nodes_per_sec'] or base['seconds'] < MIN_SECONDS:
+            continue
+        ratio = r['nodes_per_sec'] / base['nodes_per_sec']
+        mark = ' <- регрессия' if ratio < 1 / (1 + threshold) else ''
+        print(f'{key:24} скорость x{ratio:.2f}{mark}')
+        if mark:
+            regressions.append(key)
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='perft: проверка и замер генерации ходов lab4')
+    parser.add_argument('--depth', type=int, default=3, help='наибольшая глубина')
+    parser.add_argument('--positions', nargs='+', choices=list(POSITIONS), help='только указанные позиции')
+    parser.add_argument('--fen', help='своя позиция вместо набора (без проверки чисел)')
+    parser.add_argument('--divide', action='store_true', help='числа позиций по каждому первому ходу для --fen')
+    parser.add_argument('--repeat', type=int, default=1, help='число запусков каждого замера')
+    parser.add_argument('--out', help='файл для результатов (JSON)')
+    parser.add_argument('--baseline', help='файл базового прогона для сравнения')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help='допустимое замедление')
+    args = parser.parse_args(argv)
+    if args.fen:
+        board = Board(args.fen)
+        if args.divide:
+            counts = board.divide(args.depth)
+            for move, nodes in sorted(counts.items()):
+                print(f'{move}: {nodes}')
+            print('всего:', sum(counts.values()))
+        else:
+            r = run_perft(args.fen, args.depth, args.repeat)
+            print(f"{r['nodes']} позиций, {r['seconds'] * 1000:.2f} мс, {r['nodes_per_sec'] or 0:.0f} поз/с")
+        return 0
+    results = run_suite(args.positions, args.depth, args.repeat)
+    if args.out:
+        save_results(results, args.out)
+    failed = [k for k, r in results['results'].items() if not r['ok']]
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as file:
+            baseline = json.load(file)
+        failed += compare_results(results, baseline, args.threshold)
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,23 @@
+import importlib.util
+import os
+import sys
+
+import pytest
+
+# lab4/main.py загружается под своим именем, чтобы не пересекаться с lab3/main.py при общем запуске тестов
+_MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'main.py')
+
+
+def _load():
+    if 'lab4_main' in sys.modules:
+        return sys.modules['lab4_main']
+    spec = importlib.util.spec_from_file_location('lab4_main', _MAIN)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules['lab4_main'] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope='session')
+def lab4():
+    return _load()
@@ -0,0 +1,77 @@
+import random
+
+import pytest
+
+KIWIPETE = 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1'
+
+
+# число позиций perft на малой глубине
+@pytest.mark.parametrize('fen, depth, nodes', [(None, 3, 8902), (KIWIPETE, 2, 2039),
+                                               ('8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1', 3, 2812)])
+def test_perft(lab4, fen, depth, nodes):
+    assert lab4.Board(fen).perft(depth) == nodes
+
+
+# буква превращения не из Q, R, B, N - недопустимый ход, а не исключение
+def test_find_move_invalid_promotion(lab4):
+    b = lab4.Board('8/P6k/8/8/8/8/8/K7 w - - 0 1')
+    a7, a8 = b.square('A7'), b.square('A8')
+    assert b.find_move(a7, a8, 'x') is None
+    assert b.find_move(a7, a8, 'K') is None
+    assert b.find_move(a7, a8, 'n') is not None
+    assert b.find_move(a7, a8) is not None
+
+
+# хеш, обновляемый при ходах и откатах, совпадает с посчитанным заново
+@pytest.mark.parametrize('fen', [None, KIWIPETE, '4k3/8/8/8/3p4/8/4P3/4K3 w - - 0 1'])
+def test_incremental_hash(lab4, fen):
+    rnd = random.Random(3)
+    b = lab4.Board(fen)
+    start = b.hash
+    for _ in range(40):
+        moves = b.legal_moves()
+        if not moves:
+            break
+        b.make_move(rnd.choice(moves))
+        assert b.hash == b.compute_hash()
+    while b.history:
+        b.unmake_move()
+        assert b.hash == b.compute_hash()
+    assert b.hash == start
+
+
+# поле взятия на проходе входит в хеш, только если взять есть чем
+def test_ep_key_only_when_capturable(lab4):
+    b = lab4.Board()
+    b.move_piece('E2', 'E4')
+    assert ' e3 ' in b.fen()
+    assert b.hash == lab4.Board(b.fen().replace(' e3 ', ' - ')).hash
+    b = lab4.Board('4k3/8/8/8/3p4/8/4P3/4K3 w - - 0 1')
+    b.move_piece('E2', 'E4')
+    assert b.hash != lab4.Board(b.fen().replace(' e3 ', ' - ')).hash
+
+
+# повторение находится и через позицию сразу после хода пешки на два поля
+def test_repetition_after_double_push(lab4):
+    b = lab4.Board()
+    b.move_piece('E2', 'E4')
+    for move in ['G8 F6', 'G1 F3', 'F6 G8', 'F3 G1'] * 2:
+        b.move_piece(*move.split())
+    assert b.repetitions() == 3
+    assert b.is_repetition()
+
+
+# таблица позиций: одна запись на ключ в корзине, ключ 0 не путается с пустой записью
+def test_transposition_table_store(lab4):
+    tt = lab4.TranspositionTable(mb=0.001)
+    k1 = 5
+    k2 = 5 + tt.mask + 1
+    tt.store(k1, 10, 1)
+    tt.store(k2, 3, 2)
+    tt.store(k2, 12, 3)
+    i = (k2 & tt.mask) * tt.ways
+    assert sorted(tt.keys[i:i + 2]) == [k1, k2]
+    assert tt.probe(k2)[:2] == (12, 3)
+    assert tt.probe(k1)[:2] == (10, 1)
+    tt.store(0, 4, 7)
+    assert tt.probe(0)[:2] == (4, 7)
@@ -0,0 +1,48 @@
+import builtins
+
+import pytest
+
+
+@pytest.fixture
+def game(lab4, monkeypatch):
+    prompts = []
+    answers = []
+
+    def fake_input(prompt):
+        prompts.append(prompt)
+        if len(prompts) > 5:
+            raise AssertionError('слишком много запросов хода')
+        return answers.pop(0) if answers else 'exit'
+
+    monkeypatch.setattr(builtins, 'input', fake_input)
+    monkeypatch.setattr(lab4.Board, 'print_board', lambda self: None)
+    g = lab4.Game()
+    g.prompts = prompts
+    g.answers = answers
+    return g
+
+
+# мат ходом компьютера завершает игру без запроса хода
+def test_game_ends_on_engine_mate(lab4, game, capsys):
+    game.board = lab4.Board('6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1')
+    game.start(computer='white', think_time=0.2)
+    assert game.prompts == []
+    assert 'Мат' in capsys.readouterr().out
+
+
+# троекратное повторение завершает игру, даже если ходит компьютер
+def test_game_ends_on_repetition(lab4, game, capsys):
+    for move in ['G1 F3', 'G8 F6', 'F3 G1', 'F6 G8'] * 2:
+        game.board.move_piece(*move.split())
+    game.start(computer='white', think_time=0.1)
+    assert game.prompts == []
+    assert 'Ничья' in capsys.readouterr().out
+
+
+# человека спрашивают только в его ход: после его хода отвечает компьютер
+def test_game_prompts_only_human(game):
+    game.answers.extend(['E2 E4', 'exit'])
+    game.start(computer='black', think_time=0.1)
+    assert len(game.prompts) == 2
+    assert all(p.startswith('white') for p in game.prompts)
+    assert len(game.board.history) == 2